@@ -0,0 +1,124 @@
+# Chess Analysis Cache
+#
+# An optional cache of finished searches on disk, so the results of deep searches in
+# the openings and middlegames our bots keep playing survive restarts and are shared
+# by every game (and every process) using the same file:
+#
+#   cache = AnalysisCache("analysis.cache")
+#   generator = MoveGenerator("hard", cache=cache)
+#
+# The file is a fixed number of 16 byte records (zobrist key, depth, score, best move)
+# behind a small header, so its size is capped when it is created. It is accessed with
+# mmap: opening it reads nothing, and the operating system only pages in the records
+# that are actually looked up. Records are grouped in buckets of BUCKET_SIZE; a new
+# result goes into a free slot or replaces the shallowest one, but never a deeper one.
+#
+# Several processes may write to the file at once without any locks, so a record is
+# stored like an entry of the SharedTranspositionTable: two 64 bit words (key XOR data,
+# data), where the data word packs the score (int32 centipawns), best move and depth. A
+# record read in the middle of another process's write no longer XORs to its key and is
+# treated as a miss (or as a slot of another position), never as a wrong result.
+#
+# The zobrist key does not include the move history, so a cached move does not know
+# about repetitions or the fifty move rule.
+
+import mmap
+import os
+import struct
+
+from ChessHelpers.ChessSharedTable import encode_move, decode_move
+from ChessHelpers.ChessTranspositionTable import to_centipawns, from_centipawns
+
+MAGIC = b"CHESSAC2"
+OLD_MAGICS = (b"CHESSAC1",)  # records without the key check, written by earlier versions
+HEADER = struct.Struct("<8sQ")  # magic, number of records
+RECORD = struct.Struct("<QQ")  # key XOR data, data
+DATA = struct.Struct("<iHBx")  # score in centipawns, move, depth
+MASK_64 = (1 << 64) - 1
+BUCKET_SIZE = 4
+DEFAULT_RECORDS = 1 << 20  # 16 MB
+MIN_DEPTH = 4  # shallower results are cheap to search again, don't spend disk on them
+
+
+class AnalysisCache:
+    def __init__(self, path, records=DEFAULT_RECORDS, min_depth=MIN_DEPTH):
+        if records & (records - 1) or records < BUCKET_SIZE:
+            raise ValueError("number of records must be a power of two")
+        self.path = path
+        self.min_depth = min_depth
+        if not os.path.exists(path) or os.path.getsize(path) < HEADER.size:
+            # a new, zero filled (= empty) file of the final size
+            with open(path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, records))
+                f.truncate(HEADER.size + records * RECORD.size)
+        self.file = open(path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        magic, records = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.close()
+            if magic in OLD_MAGICS:
+                raise ValueError("%s was written by an older version, delete it to start a new cache" % path)
+            raise ValueError("%s is not an analysis cache" % path)
+        self.records = records
+        self.buckets = records // BUCKET_SIZE
+        self.hits = 0
+        self.misses = 0
+
+    def _bucket(self, key):
+        return HEADER.size + (key % self.buckets) * BUCKET_SIZE * RECORD.size
+
+    # the (key, score, move, depth) of a record (depth 0: empty). A torn record gives a
+    # key which matches no probe
+    def _read(self, position):
+        checked, data = RECORD.unpack_from(self.map, position)
+        score, move, depth = DATA.unpack(data.to_bytes(8, "little"))
+        if not depth:
+            return None, score, move, 0
+        return checked ^ data, score, move, depth
+
+    # returns (depth, score, best move) or None
+    def probe(self, key):
+        offset = self._bucket(key)
+        for slot in range(BUCKET_SIZE):
+            stored, score, move, depth = self._read(offset + slot * RECORD.size)
+            if stored == key:
+                self.hits += 1
+                return depth, from_centipawns(score), decode_move(move)
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, score, move):
+        if depth < self.min_depth:
+            return
+        depth = min(depth, 255)
+        offset = self._bucket(key)
+        target = None
+        shallowest = None
+        for slot in range(BUCKET_SIZE):
+            position = offset + slot * RECORD.size
+            stored, _, _, stored_depth = self._read(position)
+            if stored == key or not stored_depth:
+                # the same position (keep the deeper result) or an empty slot
+                if stored == key and stored_depth > depth:
+                    return
+                target = position
+                break
+            if shallowest is None or stored_depth < shallowest[1]:
+                shallowest = (position, stored_depth)
+        if target is None:
+            if shallowest[1] > depth:
+                return  # every slot holds a deeper result
+            target = shallowest[0]
+        data = int.from_bytes(DATA.pack(to_centipawns(score), encode_move(move), depth), "little")
+        RECORD.pack_into(self.map, target, (key ^ data) & MASK_64, data)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
@@ -3,21 +3,162 @@ Contains some utility methods that act as extensions to the chess library
 """
 
 import chess
+import chess.polyglot
 import random
-import pygame  # need to process pygame events to prevent game freeze
-from ChessHelpers.ChessHeuristics import Heuristics
-from interface import gui
+from time import perf_counter
+from ChessHelpers.ChessHeuristics import Heuristics, LeafContext
+from ChessHelpers.ChessMovePicker import MovePicker, STAGE_QUIETS
+from ChessHelpers.ChessLevels import LEVELS
+from ChessHelpers.ChessMateSolver import MateSolver
+from ChessHelpers.ChessTimeManager import TimeManager
+from ChessHelpers.ChessProfiler import SearchProfile, default_mode, MODES
+from ChessHelpers.ChessTranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
 # import timeit  # using to time some moves
 
+MAX_PLY = 64
+
+# the engine only depends on python-chess, so it can be imported by headless workers
+# without pulling in pygame. A UI can install an event hook instead: a function called
+# every few hundred nodes while searching which returns True if the search should quit
+# (the GUI uses it to keep processing window events and notice when it is closed).
+_event_hook = None
+EVENT_INTERVAL = 256
+
+
+def set_event_hook(hook):
+    global _event_hook
+    _event_hook = hook
+
+
+class AnalysisLine:
+    # one root move of an analysis: its score (for the side to move) and principal variation
+    def __init__(self, move, score, pv, depth):
+        self.move = move
+        self.score = score
+        self.pv = pv
+        self.depth = depth
+
+    def __repr__(self):
+        return "AnalysisLine(%s, %s, depth=%d, pv=%s)" % (
+            self.move.uci(), self.score, self.depth, " ".join(m.uci() for m in self.pv))
+
+
 class MoveGenerator():
-    def __init__(self):
+    def __init__(self, level=None, table=None, cache=None):
         self.CHECKMATE = 1000 #check chieu tuong het cơ
         self.STALEMATE = 0 #het nuoc di trong co vua
         # depth:
         #   in case it's counter-intuitive: these are individual moves, not pairs
         self.DEPTH = 1  # for now, 4-5 seems like a good trade-off between looking ahead and taking forever
+        # per move budgets (None = unlimited) and the heuristic used to score leaves,
+        # normally set from a difficulty level (see ChessLevels.py)
+        self.NODE_LIMIT = None
+        self.TIME_LIMIT = None
+        self.EVALUATION = "heuristic_2"
+        # pawns a draw is worth less than an equal position to us (negative: a draw is welcome),
+        # so with contempt > 0 the engine avoids repetitions it could have played on from
+        self.CONTEMPT = 0.0
+        # (remaining seconds, increment, moves to go) of our clock in a timed game, set by
+        # the runner before every move with set_clock. The time manager then decides how
+        # long each move takes (see ChessTimeManager.py). The node budget still applies, the
+        # time budget caps the time manager's, and the depth applies if a level was chosen,
+        # otherwise the clock alone limits the depth. The same goes for the time and node
+        # budgets without a clock (see search_depth)
+        self.clock = None
+        self.LEVEL = None
+        # profile every search ("cprofile" or "sample", see ChessProfiler.py), off unless
+        # switched on with the CHESS_PROFILE environment variable or set_option
+        self.PROFILE = default_mode()
+        self.PROFILE_DIR = None
+        self.last_profile = None
         self.QUIT = False
         self.heuristics = Heuristics()
+        # search data, filled in while searching and kept between the moves of a game
+        # (call new_game() before starting another one):
+        #   table:   transposition table, zobrist hash -> (depth, flag, score, best move)
+        #   killers: two quiet moves per ply which recently caused a cutoff
+        #   history: how often a quiet (from, to) move caused a cutoff, weighted by depth
+        #   pv:      principal variation collected for each ply
+        #   hashes:  zobrist hashes of the game since the last capture or pawn move, then of
+        #            the positions on the current search path (root at root_index)
+        #   expected_key/expected_move: the position we expect after the opponent's reply
+        #            (from the last principal variation) and our planned answer to it
+        # a table passed in (e.g. a SharedTranspositionTable used by several processes)
+        # belongs to the caller and is not cleared by new_game()
+        self.table = table if table is not None else TranspositionTable()
+        self.owns_table = table is None
+        # optional AnalysisCache on disk, checked before searching a move (see ChessAnalysisCache.py)
+        self.cache = cache
+        self.killers = []
+        self.history = {}
+        self.pv = []
+        self.hashes = []
+        self.root_index = 0
+        self.expected_key = None
+        self.expected_move = None
+        self.stats = {}
+        # set when the search has to give up early (time or node budget used up)
+        self.STOPPED = False
+        self.deadline = None
+        self.max_nodes = None
+        if level is not None:
+            self.set_level(level)
+
+    # apply a DifficultyProfile (or the name of one): depth, node budget, time budget and evaluation
+    def set_level(self, level):
+        if isinstance(level, str):
+            level = LEVELS[level.lower()]
+        if not hasattr(self.heuristics, level.evaluation):
+            raise ValueError("unknown evaluation " + level.evaluation)
+        self.LEVEL = level
+        self.DEPTH = level.depth
+        self.NODE_LIMIT = level.nodes
+        self.TIME_LIMIT = level.time
+        self.EVALUATION = level.evaluation
+
+    # change one setting by name, e.g. set_option("profile", "sample") or set_option("depth", 4)
+    def set_option(self, name, value):
+        name = name.lower()
+        if name == "profile":
+            if value is not None and value not in MODES:
+                raise ValueError("unknown profile mode %r" % value)
+            self.PROFILE = value or default_mode()
+        elif name == "profile_dir":
+            self.PROFILE_DIR = value
+        elif name == "evaluation":
+            # a Heuristics method: "heuristic_1", "heuristic_2" or "nnue"
+            if not callable(getattr(self.heuristics, value, None)):
+                raise ValueError("unknown evaluation %r" % value)
+            self.EVALUATION = value
+        elif name == "level":
+            self.set_level(value)
+        elif name == "depth":
+            self.DEPTH = int(value)
+        elif name == "time":
+            self.TIME_LIMIT = None if value is None else float(value)
+        elif name == "nodes":
+            self.NODE_LIMIT = None if value is None else int(value)
+        elif name == "contempt":
+            self.CONTEMPT = float(value)
+        else:
+            raise ValueError("unknown option %r" % name)
+
+    # our clock for the next move (remaining=None for an untimed game)
+    def set_clock(self, remaining, increment=0.0, moves_to_go=None):
+        self.clock = None if remaining is None else (remaining, increment, moves_to_go)
+
+    # forget everything learned in the previous game
+    def new_game(self):
+        if self.owns_table:
+            self.table.clear()
+        self.history = {}
+        self.expected_key = None
+        self.expected_move = None
+        self.QUIT = False
+
+    # score a leaf for the side to move with the configured heuristic
+    def evaluate(self, board, leaf):
+        return getattr(self.heuristics, self.EVALUATION)(board, board.turn == chess.WHITE, leaf)
         
     '''
     Returns a random move from the list of all possible legal moves
@@ -160,121 +301,388 @@ class MoveGenerator():
         # uncomment start/stop and import to time moves
         # start = timeit.default_timer()
 
-        best_move = [None]
-        # changed 'white_to_move' to 'maximize'
-        # it doesn't matter whose turn it is, as long as
-        # we get the max of whichever colors turn it is
+        # the search is written as "negamax": every node scores the position for
+        # the side to move, and a child's score is negated on the way back up
+        # (the best move for me is the one which is worst for my opponent)
         #
         #   (made for some funny games when I was playing white,
         #    before I realized that the AI was trying to maximize
         #    my score instead of its own)
-        maximize = True
-        # need to know if white or black is playing for max/min
-        white = board.turn == chess.WHITE
-
-        # alpha-beta pruning
-        # (https://en.wikipedia.org/wiki/Alpha%E2%80%93beta_pruning#Pseudocode)
-        # Initialize array to hold hold dummy highest and lowest values for pruning
-        #
-        # alpha = "minimum score that the maximizing player is assured of"
-        # beta = "maximum score that the minimizing player is assured of"
-
-        self.find_mini_max_move(board, self.DEPTH, maximize, white, -10000, 10000, best_move)
-        print(self.DEPTH)
+        key = chess.polyglot.zobrist_hash(board)
+        if self.cache is not None:
+            # a result at least as deep as we would search now is as good as searching again
+            entry = self.cache.probe(key)
+            if entry is not None and entry[0] >= self.search_depth() and board.is_legal(entry[2]):
+                # no search: the stats only say where the move came from
+                self.stats = {"nodes": 0, "depth": entry[0], "cached": True}
+                return entry[2]
+
+        if self.clock is not None:
+            moves = list(board.legal_moves)
+            if len(moves) == 1:
+                # the only legal reply, don't spend any time on it
+                return moves[0]
+            lines = self.analyze_timed(board)
+        else:
+            lines = self.analyze(board, multipv=1, depth=self.search_depth(), time=self.TIME_LIMIT,
+                                 nodes=self.NODE_LIMIT)
+        print("depth %d, %d nodes, %.0f%% of interior nodes cut off before quiet moves, "
+              "table hits %.0f%% (%.0f%% from earlier moves)" %
+              (self.stats["depth"], self.stats["nodes"], 100 * self.cutoff_before_quiets_rate(),
+               100 * self.table.hit_rate(), 100 * self.table.reused_rate()))
         if self.QUIT is True:
             return False
 
-        if best_move[0] is None:
+        if not lines:
+            if not any(board.generate_legal_moves()):
+                # checkmate or stalemate: the game is over, there is no move to play
+                return None
             print("Warning: no best move found.")
-            best_move[0] = self.random_move(board)
+            return self.random_move(board)
+
+        if self.cache is not None:
+            self.cache.store(key, lines[0].depth, lines[0].score, lines[0].move)
 
         # stop = timeit.default_timer()
         # print('Time: ', stop - start)
-        return best_move[0]
+        return lines[0].move
 
-    def find_mini_max_move(self, board, depth, maximize, white, alpha, beta, best_move):
-        # keep processing events while the mini max search is going
-        # and allow the user to close the game if a move is in progress
-        try:
-            events = pygame.event.get()
-            for e in events:
-                if e.type == pygame.QUIT:
-                    self.QUIT = True
-            if self.QUIT is True:
-                return 0
-        except Exception:
-            # (if game is being run in terminal, there is no pygame)
+    '''
+    Analysis: the top `multipv` root moves with their scores and principal variations,
+    searched by iterative deepening (depth 1, 2, 3...) so every iteration reuses the
+    transposition table and move ordering of the previous one
+    '''
+
+    def analyze(self, board, multipv=1, depth=None, time=None, nodes=None, profile=None):
+        if profile is None:
+            profile = self.PROFILE
+        if profile:
+            # profile this search and write the results tagged with the position
+            with SearchProfile(profile, board.fen(), self.PROFILE_DIR) as self.last_profile:
+                return self.analyze(board, multipv, depth, time, nodes, profile=False)
+        lines = []
+        for lines in self.analyze_iter(board, multipv, depth, time, nodes):
             pass
+        return lines
+
+    # analysis within the time manager's budgets for our clock (see set_clock),
+    # profiled like analyze
+    def analyze_timed(self, board, profile=None):
+        if profile is None:
+            profile = self.PROFILE
+        if profile:
+            with SearchProfile(profile, board.fen(), self.PROFILE_DIR) as self.last_profile:
+                return self.analyze_timed(board, profile=False)
+        manager = TimeManager(*self.clock)
+        depth = self.search_depth(clock=True)
+        # a time budget (e.g. the server's deadline) caps the hard budget
+        time = manager.hard if self.TIME_LIMIT is None else min(manager.hard, self.TIME_LIMIT)
+        start = perf_counter()
+        lines = []
+        for lines in self.analyze_iter(board, 1, depth, time, self.NODE_LIMIT):
+            if not lines:
+                break
+            if manager.should_stop(lines[0].move, lines[0].score, perf_counter() - start):
+                break
+        return lines
+
+    # the depth of a move's search: a level's depth caps it, without a level a clock or a
+    # time or node budget (e.g. the server's deadline) alone limits it
+    def search_depth(self, clock=False):
+        if self.LEVEL is None and (clock or self.TIME_LIMIT is not None or self.NODE_LIMIT is not None):
+            return MAX_PLY - 1
+        return self.DEPTH
+
+    # same as analyze, but yields the updated lines after every completed depth
+    def analyze_iter(self, board, multipv=1, depth=None, time=None, nodes=None):
+        if depth is None:
+            depth = self.DEPTH if time is None and nodes is None else MAX_PLY - 1
+        depth = min(depth, MAX_PLY - 1)
+
+        # the table and history carry over from earlier moves: the table ages its entries
+        # by generation, and old history counts are halved so recent cutoffs dominate
+        self.table.new_search()
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.history = {index: count // 2 for index, count in self.history.items() if count > 1}
+        self.pv = [[] for _ in range(MAX_PLY + 1)]
+        self.set_history(board)
+        self.stats = {"nodes": 0, "interior": 0, "cutoffs": 0, "cutoffs_before_quiets": 0, "depth": 0,
+                      "predicted": False}
+        self.STOPPED = False
+        self.deadline = None
+        self.max_nodes = None
+
+        start = perf_counter()
+        root_moves = list(MovePicker(board))
+        if not root_moves:
+            # checkmate or stalemate: nothing to analyze (analyze returns no lines)
+            return
+        # if the opponent played the reply we expected, start with the move we had planned
+        root_key = self.hashes[self.root_index]
+        if root_key == self.expected_key and self.expected_move in root_moves:
+            root_moves.remove(self.expected_move)
+            root_moves.insert(0, self.expected_move)
+            self.stats["predicted"] = True
+        for current_depth in range(1, depth + 1):
+            # the first iteration always finishes, so there is always a move to play
+            if current_depth > 1:
+                self.deadline = None if time is None else start + time
+                self.max_nodes = nodes
+
+            lines = self.search_root(board, current_depth, root_moves, multipv)
+            if self.STOPPED or self.QUIT:
+                return
+            self.stats["depth"] = current_depth
+
+            # search the best moves first in the next iteration
+            root_moves = [line.move for line in lines]
+            self.remember_pv(board, lines[0].pv)
+            yield lines[:multipv]
+
+            # don't start another iteration we can't afford to finish
+            if time is not None and perf_counter() - start >= time:
+                return
+            if nodes is not None and self.stats["nodes"] >= nodes:
+                return
+
+    '''
+    Mate search: a forced mate for the side to move in at most max_ply plies (9 = mate
+    in 5), found with proof-number search (see ChessMateSolver.py) instead of alpha-beta.
+    Returns the mating line, or None if there is none (or node_limit ran out first)
+    '''
 
+    def find_mate(self, board, max_ply=9, node_limit=None):
+        return MateSolver(node_limit).find_mate(board, max_ply)
+
+    def search_root(self, board, depth, root_moves, multipv):
+        lines = []
+        best_scores = []
+        for move in root_moves:
+            # only moves that beat the current k-th best score need an exact score,
+            # everything else can be refuted as cheaply as possible
+            alpha = best_scores[multipv - 1] if len(best_scores) >= multipv else -10000
+
+            board.push(move)
+            score = -self.find_mini_max_move(board, depth - 1, 1, -10000, -alpha)
+            board.pop()
+            if self.STOPPED or self.QUIT:
+                break
+
+            lines.append(AnalysisLine(move, score, [move] + self.pv[1], depth))
+            if score > alpha:
+                best_scores.append(score)
+                best_scores.sort(reverse=True)
+
+        lines.sort(key=lambda line: line.score, reverse=True)
+        if lines:
+            self.store(self.hashes[self.root_index], depth, EXACT, lines[0].score, lines[0].move, 0)
+        return lines
+
+    '''
+    Draws by repetition and by the fifty-move rule
+    '''
+
+    # fill the hash stack with the positions a repetition can go back to: a capture or pawn
+    # move can never be undone, so only the positions since the last one (halfmove clock)
+    def set_history(self, board):
+        reversible = board.halfmove_clock
+        history = []
+        undone = []
+        while len(undone) < reversible and board.move_stack:
+            undone.append(board.pop())
+            history.append(chess.polyglot.zobrist_hash(board))
+        for move in reversed(undone):
+            board.push(move)
+        history.reverse()
+        self.root_index = len(history)
+        self.hashes = history + [chess.polyglot.zobrist_hash(board)] + [None] * (MAX_PLY + 1)
+
+    # a position already seen since the last irreversible move is scored as a draw: if
+    # repeating it is good for one side, it can repeat it again, so neither side can win from
+    # it (a single repetition is enough, the search would only find the third one later).
+    # Only every second hash is compared (same side to move), back to the halfmove clock
+    def is_draw(self, board, key, index):
+        if board.halfmove_clock >= 100:
+            # unless the fifty-move rule's last move is checkmate
+            return not board.is_check() or any(board.generate_legal_moves())
+        hashes = self.hashes
+        for i in range(index - 4, max(index - board.halfmove_clock, 0) - 1, -2):
+            if hashes[i] == key:
+                return True
+        return False
+
+    # cheap test before hashing a leaf: to be back in an earlier position, the piece which
+    # just moved must stand on a square that one of its side's reversible moves has left
+    # (also true after 100 reversible moves, for the fifty-move rule)
+    def may_repeat(self, board):
+        clock = board.halfmove_clock
+        if clock >= 100:
+            return True
+        stack = board.move_stack
+        to_square = stack[-1].to_square
+        for i in range(3, min(clock, len(stack)) + 1, 2):
+            if stack[-i].from_square == to_square:
+                return True
+        return False
+
+    # a draw from the side to move's point of view: contempt counts against us, for the opponent
+    def draw_score(self, ply):
+        return -self.CONTEMPT if ply % 2 == 0 else self.CONTEMPT
+
+    # remember where the principal variation expects the game to be after our move
+    # and the opponent's reply, and what we plan to play there
+    def remember_pv(self, board, pv):
+        if len(pv) < 3:
+            self.expected_key = self.expected_move = None
+            return
+        board.push(pv[0])
+        board.push(pv[1])
+        self.expected_key = chess.polyglot.zobrist_hash(board)
+        board.pop()
+        board.pop()
+        self.expected_move = pv[2]
+
+    def find_mini_max_move(self, board, depth, ply, alpha, beta):
+        # keep processing events while the mini max search is going
+        # and allow the user to close the game if a move is in progress
+        # (if the game is being run in the terminal there is no event hook)
+        if _event_hook is not None and self.stats["nodes"] % EVENT_INTERVAL == 0 and _event_hook():
+            self.QUIT = True
+        if self.QUIT is True:
+            return 0
+
+        # out of time or nodes: unwind, the results of this iteration are thrown away
+        if self.deadline is not None and perf_counter() > self.deadline:
+            self.STOPPED = True
+        if self.max_nodes is not None and self.stats["nodes"] >= self.max_nodes:
+            self.STOPPED = True
+        if self.STOPPED:
+            return 0
+
+        self.stats["nodes"] += 1
+        self.pv[ply] = []
+
+        # repetitions and the fifty-move rule: inner nodes need the hash for the table anyway,
+        # a leaf only if it may repeat an earlier position (see may_repeat)
+        key = None
+        if depth > 0 or self.may_repeat(board):
+            key = chess.polyglot.zobrist_hash(board)
+            self.hashes[self.root_index + ply] = key
+            if self.is_draw(board, key, self.root_index + ply):
+                return self.draw_score(ply)
+
+        # mate distance pruning:
+        #   the best we can do from here is to mate on the next ply and the worst is to be
+        #   mated right now, if a shorter mate is already known closer to the root then
+        #   nothing in this subtree can change the result
+        alpha = max(alpha, -self.CHECKMATE + ply)
+        beta = min(beta, self.CHECKMATE - ply - 1)
+        if alpha >= beta:
+            return alpha
+
+        if depth == 0 or ply >= MAX_PLY:
+            # hand over what we already know so the heuristic doesn't regenerate
+            # the legal moves just to check for checkmate and stalemate
+            # (we only need to know if there is at least one legal move)
+            leaf = LeafContext(ply, any(board.generate_legal_moves()), board.is_check())
+            return self.evaluate(board, leaf)
+
+        # transposition table: if we searched this position before at least as deep,
+        # we might already know the answer
+        entry = self.table.probe(key)
+        hash_move = None
+        if entry is not None:
+            entry_depth, flag, score, hash_move = entry
+            if entry_depth >= depth:
+                score = self.score_from_table(score, ply)
+                if flag == EXACT or (flag == LOWER_BOUND and score >= beta) \
+                        or (flag == UPPER_BOUND and score <= alpha):
+                    return score
 
         # I also read that you can increase the efficiency of the pruning by ordering the moves
         #
-        # here I make a new list of legal moves where moves that capture pieces are ordered first
-        # unsorted_legal_moves = list(board.legal_moves)
-        # legal_moves = []
-        # # list the moves that capture a piece first
-        # for m in unsorted_legal_moves:
-        #     if board.piece_at(m.to_square): #m.tosquare là lấy ra câu lênh move.from_uci()
-        #         legal_moves.append(m)
-        # for m in unsorted_legal_moves:
-        #     if not board.piece_at(m.to_square):
-        #         legal_moves.append(m)
-        legal_moves = list(board.legal_moves)
-
-        if depth == 0 or len(legal_moves) == 0:  #  
-            score = self.heuristics.heuristic_2(board, white)
-            return score
-
-        if maximize:
-            max_score = -10000
-            for move in legal_moves:
-                board.push(move)
-                score = self.find_mini_max_move(board, depth - 1, False, white, alpha, beta, best_move)
-
-                if score > max_score:
-                    max_score = score
-
-                    # set the best move (I put it in an argument instead of a global var)
-                    if depth == self.DEPTH:
-                        best_move[0] = move
-
-                # pruning
-                # update "minimum guaranteed score"
-                if max_score > alpha:
-                    alpha = max_score
-
-                # pruning
-                # skip if move is better than best move opponent will allow
-                if max_score >= beta:
-                    board.pop()
-                    break
-
-                board.pop()
-            return max_score
-
+        # the move picker hands out the moves most likely to cause a cutoff first
+        # (hash move, good captures, killers) and only generates the quiet moves if
+        # none of those were good enough
+        picker = MovePicker(board, hash_move, self.killers[ply], self.history)
+        self.stats["interior"] += 1
+
+        original_alpha = alpha
+        max_score = -10000
+        node_best_move = None
+        for move in picker:
+            board.push(move)
+            score = -self.find_mini_max_move(board, depth - 1, ply + 1, -beta, -alpha)
+            board.pop()
+
+            if score > max_score:
+                max_score = score
+                node_best_move = move
+
+            # pruning
+            # update "minimum guaranteed score"
+            if max_score > alpha:
+                alpha = max_score
+                self.pv[ply] = [move] + self.pv[ply + 1]
+
+            # pruning
+            # skip if move is better than best move opponent will allow
+            if alpha >= beta:
+                self.stats["cutoffs"] += 1
+                if picker.stage < STAGE_QUIETS:
+                    self.stats["cutoffs_before_quiets"] += 1
+                if not board.is_capture(move) and not move.promotion:
+                    self.store_killer(move, ply, depth)
+                break
+
+        if self.STOPPED:
+            return 0
+
+        if node_best_move is None:
+            # no legal moves: checkmate or stalemate
+            leaf = LeafContext(ply, False, board.is_check())
+            return self.evaluate(board, leaf)
+
+        if max_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif max_score >= beta:
+            flag = LOWER_BOUND
         else:
-            min_score = 10000
-            for move in legal_moves:
-                board.push(move)
-                score = self.find_mini_max_move(board, depth - 1, True, white, alpha, beta, best_move)
-
-                if score < min_score:
-                    min_score = score
-                    # hehe your best move can't be one of your opponent's moves
-                    # if depth == self.DEPTH:
-                    #    best_move[0] = move
-
-                # pruning: update beta value
-                if min_score < beta:
-                    beta = min_score
-
-                # pruning
-                # skip if worse than the worst score we can be forced to accept
-                if min_score <= alpha:
-                    board.pop()
-                    break
-
-                board.pop()
-            return min_score
-
-    
\ No newline at end of file
+            flag = EXACT
+        self.store(key, depth, flag, max_score, node_best_move, ply)
+        return max_score
+
+    def store(self, key, depth, flag, score, move, ply):
+        self.table.store(key, depth, flag, self.score_to_table(score, ply), move)
+
+    # mate scores are stored relative to the position itself rather than to the root,
+    # so the same entry is correct wherever in the tree we find it again
+    def score_to_table(self, score, ply):
+        if score > self.CHECKMATE - MAX_PLY:
+            return score + ply
+        if score < -self.CHECKMATE + MAX_PLY:
+            return score - ply
+        return score
+
+    def score_from_table(self, score, ply):
+        if score > self.CHECKMATE - MAX_PLY:
+            return score - ply
+        if score < -self.CHECKMATE + MAX_PLY:
+            return score + ply
+        return score
+
+    # remember a quiet move that caused a cutoff so siblings can try it early
+    def store_killer(self, move, ply, depth):
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        index = (move.from_square, move.to_square)
+        self.history[index] = self.history.get(index, 0) + depth * depth
+
+    # fraction of the searched interior nodes (not leaves or table hits) which cut off
+    # before any quiet move had to be generated
+    def cutoff_before_quiets_rate(self):
+        if not self.stats.get("interior"):
+            return 0.0
+        return self.stats["cutoffs_before_quiets"] / self.stats["interior"]
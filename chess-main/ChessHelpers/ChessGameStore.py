@@ -0,0 +1,239 @@
+# Chess Game Store
+#
+# A compact binary store of games with an index of every position in them, to answer
+# "how was this position played before" without scanning any game records:
+#
+#   store = GameStore("games")            # games.games, games.offsets, games.index
+#   for stats in store.explore(board):
+#       print(stats.move, stats.games, stats.white_wins, stats.draws, stats.black_wins)
+#
+# Files (all memory mapped, nothing is read up front):
+#   .games    the games one after the other: result (1 byte), number of moves (2 bytes),
+#             then every move packed in 16 bits (from 6 bits, to 6 bits, promotion 3 bits)
+#   .offsets  where each game starts in .games (8 bytes per game), game n is offsets[n]
+#   .index    one 16 byte entry per position (zobrist key, game, ply, move played there)
+#             sorted by key, so all the games reaching a position are found with a binary
+#             search and are stored next to each other
+#
+# Games are added with import_pgn(). The index is built from sorted runs of at most
+# RUN_SIZE entries merged together, so importing a large archive needs constant memory.
+
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+
+import chess
+import chess.pgn
+import chess.polyglot
+from ChessHelpers.ChessSharedTable import encode_move, decode_move
+
+MAGIC = b"CHESSGS1"
+GAME_HEADER = struct.Struct("<BH")  # result, number of moves
+OFFSET = struct.Struct("<Q")
+ENTRY = struct.Struct("<QIHH")  # zobrist key, game, ply, move (0 after the last move)
+RUN_SIZE = 1 << 20  # index entries sorted in memory at once while importing
+
+# result codes
+UNKNOWN = 0
+WHITE_WINS = 1
+BLACK_WINS = 2
+DRAW = 3
+RESULTS = {"1-0": WHITE_WINS, "0-1": BLACK_WINS, "1/2-1/2": DRAW}
+RESULT_NAMES = {UNKNOWN: "*", WHITE_WINS: "1-0", BLACK_WINS: "0-1", DRAW: "1/2-1/2"}
+
+
+class MoveStats:
+    # how often a move was played in a position and how those games ended
+    def __init__(self, move):
+        self.move = move
+        self.games = 0
+        self.white_wins = 0
+        self.draws = 0
+        self.black_wins = 0
+
+    def __repr__(self):
+        return "MoveStats(%s, games=%d, +%d =%d -%d)" % (
+            self.move.uci(), self.games, self.white_wins, self.draws, self.black_wins)
+
+
+def _map(path):
+    # read only mapping of a file, None for an empty (or missing) file which can't be mapped
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class GameStore:
+    def __init__(self, path):
+        self.path = path
+        self.games = _map(path + ".games")
+        self.offsets = _map(path + ".offsets")
+        self.index = _map(path + ".index")
+        if self.games is not None and self.games[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("%s.games is not a game store" % path)
+        self.count = len(self.offsets) // OFFSET.size if self.offsets else 0
+        self.entries = len(self.index) // ENTRY.size if self.index else 0
+
+    def __len__(self):
+        return self.count
+
+    def _game_offset(self, game):
+        if not 0 <= game < self.count:
+            raise IndexError("game %d not in the store" % game)
+        return OFFSET.unpack_from(self.offsets, game * OFFSET.size)[0]
+
+    def result(self, game):
+        return self.games[self._game_offset(game)]
+
+    def moves(self, game):
+        offset = self._game_offset(game)
+        _, length = GAME_HEADER.unpack_from(self.games, offset)
+        codes = struct.unpack_from("<%dH" % length, self.games, offset + GAME_HEADER.size)
+        return [decode_move(code) for code in codes]
+
+    # the stored game as a python-chess game (for writing it out as PGN)
+    def game(self, game):
+        pgn = chess.pgn.Game()
+        pgn.headers["Result"] = RESULT_NAMES[self.result(game)]
+        node = pgn
+        for move in self.moves(game):
+            node = node.add_variation(move)
+        return pgn
+
+    '''
+    Position index
+    '''
+
+    # position of the first index entry with a key >= key (binary search)
+    def _lower_bound(self, key):
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from("<Q", self.index, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    # every time the position occurred: [(game, ply, move played or None)]
+    def occurrences(self, board):
+        key = board if isinstance(board, int) else chess.polyglot.zobrist_hash(board)
+        found = []
+        position = self._lower_bound(key)
+        while position < self.entries:
+            stored, game, ply, move = ENTRY.unpack_from(self.index, position * ENTRY.size)
+            if stored != key:
+                break
+            found.append((game, ply, decode_move(move)))
+            position += 1
+        return found
+
+    # the moves played in this position, most popular first
+    def explore(self, board):
+        stats = {}
+        for game, _, move in self.occurrences(board):
+            if move is None:
+                continue  # the game ended here
+            move_stats = stats.get(move)
+            if move_stats is None:
+                move_stats = stats[move] = MoveStats(move)
+            move_stats.games += 1
+            result = self.result(game)
+            if result == WHITE_WINS:
+                move_stats.white_wins += 1
+            elif result == BLACK_WINS:
+                move_stats.black_wins += 1
+            elif result == DRAW:
+                move_stats.draws += 1
+        return sorted(stats.values(), key=lambda s: s.games, reverse=True)
+
+    def close(self):
+        for mapping in (self.games, self.offsets, self.index):
+            if mapping is not None:
+                mapping.close()
+        self.games = self.offsets = self.index = None
+
+
+'''
+Import
+'''
+
+
+def _write_run(entries, directory):
+    entries.sort()
+    run = tempfile.TemporaryFile(dir=directory)
+    for entry in entries:
+        run.write(ENTRY.pack(*entry))
+    run.seek(0)
+    return run
+
+
+def _read_entries(handle):
+    while True:
+        data = handle.read(ENTRY.size * 4096)
+        if not data:
+            return
+        yield from ENTRY.iter_unpack(data)
+
+
+# adds every game of the PGN files (open text handles) to the store, returns
+# (games added, games skipped); games which don't start from the normal starting
+# position are skipped, games with an illegal move are kept up to that move
+def import_pgn(path, handles, run_size=RUN_SIZE):
+    directory = os.path.dirname(os.path.abspath(path))
+    games_path, offsets_path, index_path = path + ".games", path + ".offsets", path + ".index"
+    if not os.path.exists(games_path):
+        with open(games_path, "wb") as f:
+            f.write(MAGIC)
+    count = os.path.getsize(offsets_path) // OFFSET.size if os.path.exists(offsets_path) else 0
+
+    added = skipped = 0
+    runs = []
+    entries = []
+    with open(games_path, "ab") as games, open(offsets_path, "ab") as offsets:
+        for handle in handles:
+            while True:
+                pgn = chess.pgn.read_game(handle)
+                if pgn is None:
+                    break
+                moves = list(pgn.mainline_moves())  # up to the first illegal move, if any
+                if "FEN" in pgn.headers or len(moves) > 0xFFFF:
+                    skipped += 1
+                    continue
+                game = count + added
+                board = chess.Board()
+                codes = [encode_move(move) for move in moves]
+                for ply, move in enumerate(moves):
+                    entries.append((chess.polyglot.zobrist_hash(board), game, ply, codes[ply]))
+                    board.push(move)
+                entries.append((chess.polyglot.zobrist_hash(board), game, len(moves), 0))
+
+                offsets.write(OFFSET.pack(games.tell()))
+                games.write(GAME_HEADER.pack(RESULTS.get(pgn.headers.get("Result"), UNKNOWN), len(codes)))
+                games.write(struct.pack("<%dH" % len(codes), *codes))
+                added += 1
+                if len(entries) >= run_size:
+                    runs.append(_write_run(entries, directory))
+                    entries = []
+    if entries:
+        runs.append(_write_run(entries, directory))
+
+    # merge the new runs with the existing index into a new index file
+    if runs:
+        sources = [_read_entries(run) for run in runs]
+        existing = open(index_path, "rb") if os.path.exists(index_path) else None
+        if existing is not None:
+            sources.append(_read_entries(existing))
+        with open(index_path + ".tmp", "wb") as index:
+            for entry in heapq.merge(*sources):
+                index.write(ENTRY.pack(*entry))
+        if existing is not None:
+            existing.close()
+        for run in runs:
+            run.close()
+        os.replace(index_path + ".tmp", index_path)
+    return added, skipped
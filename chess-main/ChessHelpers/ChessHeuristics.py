@@ -2,17 +2,109 @@
 #
 # This file contains the chess heuristics which we have designed
 # and which are used to score our chess positions in ChessEngineHelper.py
+#
+# The weights of heuristic #2 (piece values, center and diagonal scores) start out
+# hand-picked. tune_weights.py fits them to game results and writes a weights file,
+# which is loaded at startup from ChessHelpers/heuristic_weights.json (or the file
+# named by the CHESS_WEIGHTS environment variable) when it exists.
+
+import json
+import os
 
 import chess
 global best_move
 
+WEIGHTS_ENV = "CHESS_WEIGHTS"
+DEFAULT_WEIGHTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "heuristic_weights.json")
+
+# the squares looked at by control_diagonals (the two long diagonals) and control_center
+# (e3, f3, e4, f4: the matrix cells it reads, counted from the top left of the board)
+LONG_DIAGONALS = chess.BB_A1 | chess.BB_B2 | chess.BB_C3 | chess.BB_D4 | chess.BB_E5 | chess.BB_F6 | chess.BB_G7 | \
+    chess.BB_H8 | chess.BB_A8 | chess.BB_B7 | chess.BB_C6 | chess.BB_D5 | chess.BB_E4 | chess.BB_F3 | chess.BB_G2 | chess.BB_H1
+CENTER_SQUARES = chess.BB_E3 | chess.BB_F3 | chess.BB_E4 | chess.BB_F4
+
+# the terms of heuristic #2 as a linear function: score = sum(weight * feature)
+MATERIAL_PIECES = ["q", "r", "b", "n", "p"]
+CENTER_PIECES = ["p", "n", "b", "r", "q", "k"]
+FEATURES = ["material_" + p for p in MATERIAL_PIECES] + ["diagonals"] + ["center_" + p for p in CENTER_PIECES]
+PIECE_TYPES = {"p": chess.PAWN, "n": chess.KNIGHT, "b": chess.BISHOP, "r": chess.ROOK, "q": chess.QUEEN, "k": chess.KING}
+
 
 class Heuristics:
-    def __init__(self):
+    # weights: file to load the weights from, defaults: keep the hand-picked weights
+    def __init__(self, weights=None, defaults=False):
         self.CHECKMATE = 1000
         self.STALEMATE = 0
         self.piece_score = {"k": 0, "q": 10, "r": 5, "b": 3, "n": 3, "p": 1}
         self.mobility_piece_score = {"k": 4, "q": 10, "r": 5, "b": 3, "n": 3, "p": 1}
+        # heuristic #2: points per bishop/queen on a long diagonal and per piece on the center
+        # squares (own pieces count for us, the opponent's against us), and how much both
+        # count against material
+        self.diagonal_score = 3
+        self.center_score = {"p": 1, "n": 2, "b": 2, "r": 2, "q": 3, "k": 2}
+        self.diagonal_divisor = 5
+        self.center_divisor = 4
+        # incremental state of the NNUE evaluation, created the first time it is used
+        self.accumulators = None
+
+        path = weights or os.environ.get(WEIGHTS_ENV) or DEFAULT_WEIGHTS
+        if not defaults and os.path.exists(path):
+            self.load_weights(path)
+
+    '''
+    Weights
+    '''
+
+    def load_weights(self, path):
+        with open(path) as f:
+            weights = json.load(f)
+        self.piece_score.update(weights.get("piece_score", {}))
+        self.center_score.update(weights.get("center_score", {}))
+        self.diagonal_score = weights.get("diagonal_score", self.diagonal_score)
+        self.diagonal_divisor = weights.get("diagonal_divisor", self.diagonal_divisor)
+        self.center_divisor = weights.get("center_divisor", self.center_divisor)
+
+    def save_weights(self, path):
+        with open(path, "w") as f:
+            json.dump({"piece_score": self.piece_score, "center_score": self.center_score,
+                       "diagonal_score": self.diagonal_score, "diagonal_divisor": self.diagonal_divisor,
+                       "center_divisor": self.center_divisor}, f, indent=2)
+
+    # heuristic #2 (without checkmate/stalemate) is sum(weights[i] * features[i]), in the order of FEATURES
+    def features(self, board, white):
+        us = chess.WHITE if white else chess.BLACK
+        values = []
+        for piece in MATERIAL_PIECES:
+            piece_type = PIECE_TYPES[piece]
+            values.append(chess.popcount(board.pieces_mask(piece_type, us)) -
+                          chess.popcount(board.pieces_mask(piece_type, not us)))
+        values.append(chess.popcount(self.diagonal_mask(board, us) & LONG_DIAGONALS) -
+                      chess.popcount(self.diagonal_mask(board, not us) & LONG_DIAGONALS))
+        for piece in CENTER_PIECES:
+            piece_type = PIECE_TYPES[piece]
+            values.append(chess.popcount(board.pieces_mask(piece_type, us) & CENTER_SQUARES) -
+                          chess.popcount(board.pieces_mask(piece_type, not us) & CENTER_SQUARES))
+        return values
+
+    @staticmethod
+    def diagonal_mask(board, color):
+        return board.pieces_mask(chess.BISHOP, color) | board.pieces_mask(chess.QUEEN, color)
+
+    def weight_vector(self):
+        return ([self.piece_score[p] for p in MATERIAL_PIECES] +
+                [self.diagonal_score / self.diagonal_divisor] +
+                [self.center_score[p] / self.center_divisor for p in CENTER_PIECES])
+
+    # set the weights from a vector in the order of FEATURES (as fitted by tune_weights.py)
+    def set_weight_vector(self, vector):
+        vector = [float(value) for value in vector]
+        for piece, value in zip(MATERIAL_PIECES, vector[:5]):
+            self.piece_score[piece] = value
+        self.diagonal_score = vector[5]
+        self.diagonal_divisor = 1
+        for piece, value in zip(CENTER_PIECES, vector[6:]):
+            self.center_score[piece] = value
+        self.center_divisor = 1
 
     """
     Heuristic #1
@@ -20,26 +112,39 @@ class Heuristics:
     scores boards based on piece value set in self.piece_score:
     
         1. each piece is worth +points if it is yours, and -points if it is your opponents
-        2. special case for checkmate (+/- 1000 points)
+        2. special case for checkmate (+/- 1000 points, minus the number of plies to the mate)
         3. special case for stalemate (0 points)
+
+    the search can pass a LeafContext with what it already knows about the position,
+    otherwise we have to generate the legal moves ourselves to find out if the game is over
     """
-    def heuristic_1(self, board, white):
-        # case 1: return +1000 if it is checkmate and we win
-        if board.is_checkmate() and (white and board.turn == chess.BLACK or
-                                     not white and board.turn == chess.WHITE):
-            return self.CHECKMATE
+    def heuristic_1(self, board, white, leaf=None):
+        terminal = self.score_terminal(board, white, leaf)
+        if terminal is not None:
+            return terminal
+
+        # case 4: otherwise return the board score
+        return self.score_material(board, white)
 
-        # case 2: return -1000 if it is checkmate and we lose
-        if board.is_checkmate() and (not white and board.turn == chess.BLACK or
-                                     white and board.turn == chess.WHITE):
-            return -self.CHECKMATE
+    # returns the checkmate/stalemate score, or None if the game goes on
+    def score_terminal(self, board, white, leaf=None):
+        if leaf is None:
+            leaf = LeafContext(0, any(board.generate_legal_moves()), board.is_check())
+
+        if leaf.has_moves:
+            return None
 
         # case 3: return 0 if it is a stalemate
-        if board.is_stalemate():
+        if not leaf.in_check:
             return self.STALEMATE
 
-        # case 4: otherwise return the board score
-        return self.score_material(board, white)
+        # case 1 and 2: the side to move is checkmated
+        #   faster mates score higher and slower losses score less badly,
+        #   so the search prefers a mate in 1 over a mate in 4 and delays being mated
+        score = self.CHECKMATE - leaf.ply
+        if white == (board.turn == chess.WHITE):
+            return -score
+        return score
 
     def score_material(self, board, white):
         chess_board = MakeMatrix().convert_to_matrix(board)
@@ -75,17 +180,26 @@ class Heuristics:
         1. scores boards based on number of pieces
         2. scores boards based on control of center squares
         3. scores boards based on diagonal control
+
+    like the material, the center and diagonal scores are ours minus the opponent's, so
+    a position scores exactly the negative for the other side (the search relies on it:
+    it scores every leaf for the side to move)
         
     """
-    def heuristic_2(self, board, white):
+    def heuristic_2(self, board, white, leaf=None):
+        # checkmate and stalemate scores are exact, don't blur the mate distance
+        terminal = self.score_terminal(board, white, leaf)
+        if terminal is not None:
+            return terminal
+
         # generate the initial score with heuristic #1
-        score = self.heuristic_1(board, white)
+        score = self.score_material(board, white)
 
         # then, complement the score with our additional heuristics!
         # dividing by some constant because it seems likely that position is
         #   at least somewhat less valuable than pieces
-        score += self.control_diagonals(board, white) / 5
-        score += self.control_center(board, white) / 4
+        score += self.control_diagonals(board, white) / self.diagonal_divisor
+        score += self.control_center(board, white) / self.center_divisor
         return score
 
     # function to score board based on control of diagonals
@@ -109,16 +223,15 @@ class Heuristics:
         white_diagonal = [chess_board[0][7], chess_board[1][6], chess_board[2][5], chess_board[3][4],
                           chess_board[4][3], chess_board[5][2], chess_board[6][1], chess_board[7][0]]
 
-        for cell in black_diagonal:
+        # points for our figures on the diagonals, minus points for the opponent's
+        own = "w" if white else "b"
+        for cell in black_diagonal + white_diagonal:
             for figure in diagonal_figures:
                 if figure == cell[1]:
-                    if (cell[0] == "w" and white) or (cell[0] == "b" and not white):
-                        diagonal_heuristics += 3
-        for cell in white_diagonal:
-            for figure in diagonal_figures:
-                if figure == cell[1]:
-                    if (cell[0] == "w" and white) or (cell[0] == "b" and not white):
-                        diagonal_heuristics += 3
+                    if cell[0] == own:
+                        diagonal_heuristics += self.diagonal_score
+                    else:
+                        diagonal_heuristics -= self.diagonal_score
 
         return diagonal_heuristics
 
@@ -150,21 +263,14 @@ class Heuristics:
         # Set control center heuristics to 0
         ccHeuristic = 0
 
-        # Give points for each piece in central square (pawn or knight)
-
+        # Give points for each of our pieces in a central square, and take them
+        # away for each of the opponent's
+        own = "w" if white else "b"
         for square in central_squares:
-            if square[1] == "p":
-                ccHeuristic += 1
-            elif square[1] == "n":
-                ccHeuristic += 2
-            elif square[1] == "b":
-                ccHeuristic += 2
-            elif square[1] == "r":
-                ccHeuristic += 2
-            elif square[1] == "q":
-                ccHeuristic += 3
-            elif square[1] == "k":
-                ccHeuristic += 2
+            if square[0] == own:
+                ccHeuristic += self.center_score.get(square[1], 0)
+            else:
+                ccHeuristic -= self.center_score.get(square[1], 0)
 
         # Give points for white pawns in controlling positions
         if white:
@@ -186,6 +292,27 @@ class Heuristics:
 
         return ccHeuristic
 
+    """
+    NNUE
+
+    scores boards with the small neural network in ChessNNUE.py (needs numpy and a
+    weights file). The network's accumulators follow the board through the search and
+    are updated from the moves played instead of being recomputed for every leaf.
+    """
+    def nnue(self, board, white, leaf=None):
+        terminal = self.score_terminal(board, white, leaf)
+        if terminal is not None:
+            return terminal
+
+        if self.accumulators is None:
+            # imported here so the other heuristics work without numpy
+            from ChessHelpers.ChessNNUE import Accumulators, load_network
+            self.accumulators = Accumulators(load_network())
+        score = self.accumulators.evaluate(board)
+        if white != (board.turn == chess.WHITE):
+            score = -score
+        return score
+
     """
     Heuristic #3
 
@@ -194,6 +321,10 @@ class Heuristics:
         1. scores boards based on number of pieces
         2. scores boards based on control of center squares
         3. scores boards based on diagonal control
+
+    like the material, the center and diagonal scores are ours minus the opponent's, so
+    a position scores exactly the negative for the other side (the search relies on it:
+    it scores every leaf for the side to move)
         4. scores boards based on number of legal moves
         5. scores boards based on piece mobility
 
@@ -416,6 +547,17 @@ class Heuristics:
     #     return score
 
 
+class LeafContext:
+    # what the search already knows about a leaf, so the heuristics don't have to regenerate it
+    #   ply:       distance from the root of the search (used for mate distance)
+    #   has_moves: whether the side to move has any legal move
+    #   in_check:  whether the side to move is in check
+    def __init__(self, ply, has_moves, in_check):
+        self.ply = ply
+        self.has_moves = has_moves
+        self.in_check = in_check
+
+
 class MakeMatrix:
 
     def __init__(self):
@@ -0,0 +1,30 @@
+# Chess Levels
+#
+# Difficulty levels for our move generator. Each level bounds the work done per move
+# with a maximum depth, a node budget and a time budget (whichever runs out first ends
+# the search), and picks which heuristic scores the leaves. Because the budgets are
+# enforced inside the search, the CPU cost of one move is predictable for every level,
+# no matter how complicated the position is.
+#
+# Run calibrate_levels.py to measure the average nodes, time and relative strength of
+# each level after changing these numbers.
+
+
+class DifficultyProfile:
+    def __init__(self, name, depth, nodes, time, evaluation):
+        self.name = name
+        self.depth = depth            # maximum search depth (individual moves, not pairs)
+        self.nodes = nodes            # node budget per move (None = unlimited)
+        self.time = time              # time budget per move in seconds (None = unlimited)
+        self.evaluation = evaluation  # name of the Heuristics method used to score leaves
+
+    def __repr__(self):
+        return "DifficultyProfile(%s, depth=%s, nodes=%s, time=%s, evaluation=%s)" % (
+            self.name, self.depth, self.nodes, self.time, self.evaluation)
+
+
+EASY = DifficultyProfile("Easy", depth=2, nodes=300, time=0.25, evaluation="heuristic_1")
+MEDIUM = DifficultyProfile("Medium", depth=3, nodes=3000, time=1.0, evaluation="heuristic_2")
+HARD = DifficultyProfile("Hard", depth=5, nodes=30000, time=5.0, evaluation="heuristic_2")
+
+LEVELS = {"easy": EASY, "medium": MEDIUM, "hard": HARD}
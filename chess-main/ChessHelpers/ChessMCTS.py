@@ -0,0 +1,301 @@
+# Chess MCTS
+#
+# A Monte Carlo Tree Search move generator, an alternative to MoveGenerator.mini_max_move
+# with the same contract (a function taking a chess.Board and returning a chess.Move):
+#
+#   mcts = MCTSGenerator(playouts=2000)
+#   play_chess(board, black=mcts.mcts_move)
+#
+# Instead of searching every move to a fixed depth, the tree grows one position per
+# playout where the results so far look most promising (PUCT: the average value of a
+# move plus a bonus for moves with a high prior which were tried less often). A new
+# position is scored with a heuristic from ChessHeuristics.py, optionally after a short
+# random playout, squashed to a value between -1 (lost) and 1 (won) for the side to move.
+#
+# The tree is kept between moves: when mcts_move is called again after our move and the
+# opponent's reply, the search continues from that grandchild of the old root.
+#
+# With workers > 1 the leaves are scored by a pool of worker processes. The tree stays in
+# this process: a batch of leaves is selected at once, and every position on the way to a
+# selected leaf gets a "virtual loss" until its result is back, so the next selection in
+# the same batch prefers other lines instead of picking the same leaf again.
+#
+# Searches stop after `playouts` playouts or `time` seconds, whichever comes first. In a
+# timed game (set_clock) the time per move is the time manager's soft budget instead.
+
+import math
+import random
+import concurrent.futures
+from time import perf_counter
+
+import chess
+from ChessHelpers import ChessEngineHelper
+from ChessHelpers.ChessHeuristics import Heuristics
+from ChessHelpers.ChessMovePicker import PIECE_VALUES
+from ChessHelpers.ChessTimeManager import TimeManager
+
+C_PUCT = 1.5
+VALUE_SCALE = 4.0  # pawns: a score of 4 pawns is a value of tanh(1) = 0.76
+LEAVES_PER_WORKER = 8  # leaves sent to a worker at once
+VIRTUAL_LOSS = 1
+EVENT_INTERVAL = 16  # batches between calls of the UI's event hook
+
+_worker_heuristics = None
+
+
+class Node:
+    __slots__ = ("move", "parent", "children", "prior", "visits", "value", "virtual", "terminal")
+
+    def __init__(self, move, parent, prior):
+        self.move = move
+        self.parent = parent
+        self.children = None  # None until expanded
+        self.prior = prior
+        self.visits = 0
+        self.value = 0.0  # sum of the results, for the side which played `move`
+        self.virtual = 0  # playouts on their way through this node
+        self.terminal = None  # the value of a finished game, for the side to move
+
+    # PUCT score of a child, seen from this node's side to move
+    def select(self):
+        total = math.sqrt(self.visits + self.virtual + 1)
+        best = None
+        best_score = -math.inf
+        for child in self.children:
+            visits = child.visits + child.virtual
+            # a playout in progress counts as a loss until it comes back
+            average = (child.value - child.virtual * VIRTUAL_LOSS) / visits if visits else 0.0
+            score = average + C_PUCT * child.prior * total / (1 + visits)
+            if score > best_score:
+                best_score = score
+                best = child
+        return best
+
+    def expand(self, board):
+        moves = list(board.legal_moves)
+        if not moves:
+            # checkmated (a loss for the side to move) or stalemated
+            self.terminal = -1.0 if board.is_check() else 0.0
+            self.children = []
+            return
+        if board.is_insufficient_material() or board.halfmove_clock >= 100 or board.is_repetition(3):
+            self.terminal = 0.0
+            self.children = []
+            return
+        # captures and promotions first: priors grow with the value of what is taken
+        weights = []
+        for move in moves:
+            weight = 1.0
+            victim = board.piece_type_at(move.to_square)
+            if victim is not None:
+                weight += PIECE_VALUES[victim]
+            if move.promotion:
+                weight += PIECE_VALUES[move.promotion]
+            weights.append(weight)
+        total = sum(weights)
+        self.children = [Node(move, self, weight / total) for move, weight in zip(moves, weights)]
+
+
+'''
+Leaf evaluation (in this process, or in the worker processes)
+'''
+
+
+# value in -1..1 for the side to move, after `rollout` random moves
+def evaluate_leaf(board, heuristics, evaluation, rollout):
+    sign = 1
+    for _ in range(rollout):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        board.push(random.choice(moves))
+        sign = -sign
+    white = board.turn == chess.WHITE
+    score = getattr(heuristics, evaluation)(board, white)
+    return sign * math.tanh(score / VALUE_SCALE)
+
+
+def evaluate_worker(fens, evaluation, rollout):
+    """ Scores a batch of leaves in a worker process """
+    global _worker_heuristics
+    if _worker_heuristics is None:
+        _worker_heuristics = Heuristics()
+    return [evaluate_leaf(chess.Board(fen), _worker_heuristics, evaluation, rollout) for fen in fens]
+
+
+class MCTSGenerator:
+    def __init__(self, playouts=1000, time=None, workers=1, rollout=0, evaluation="heuristic_2"):
+        # search budgets (None = no limit, at least one of them should be set)
+        self.PLAYOUTS = playouts
+        self.TIME_LIMIT = time
+        # worker processes scoring the leaves (1 = score them in this process)
+        self.WORKERS = workers
+        # random moves played from a leaf before it is scored (0 = score the leaf itself)
+        self.ROLLOUT = rollout
+        self.EVALUATION = evaluation
+        # (remaining seconds, increment, moves to go) in a timed game, see set_clock
+        self.clock = None
+        self.QUIT = False
+        self.heuristics = Heuristics()
+        self.pool = None
+        # the tree of the last search: its root and the moves which lead to it
+        self.root = None
+        self.root_moves = None
+        self.root_fen = None
+        self.stats = {}
+
+    # same option names as MoveGenerator.set_option where they mean the same thing
+    def set_option(self, name, value):
+        name = name.lower()
+        if name == "playouts":
+            self.PLAYOUTS = None if value is None else int(value)
+        elif name == "time":
+            self.TIME_LIMIT = None if value is None else float(value)
+        elif name == "workers":
+            self.close()
+            self.WORKERS = int(value)
+        elif name == "rollout":
+            self.ROLLOUT = int(value)
+        elif name == "evaluation":
+            if not callable(getattr(self.heuristics, value, None)):
+                raise ValueError("unknown evaluation %r" % value)
+            self.EVALUATION = value
+        else:
+            raise ValueError("unknown option %r" % name)
+
+    # our clock for the next move (remaining=None for an untimed game)
+    def set_clock(self, remaining, increment=0.0, moves_to_go=None):
+        self.clock = None if remaining is None else (remaining, increment, moves_to_go)
+
+    def new_game(self):
+        self.root = None
+        self.QUIT = False
+
+    # shut the worker processes down
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def mcts_move(self, board):
+        if self.clock is not None:
+            moves = list(board.legal_moves)
+            if len(moves) == 1:
+                # the only legal reply, don't spend any time on it
+                return moves[0]
+            children = self.analyze(board, time=TimeManager(*self.clock).soft)
+        else:
+            children = self.analyze(board)
+        if self.QUIT is True:
+            return False
+        if not children:
+            # checkmate or stalemate: there is no move to play (same as MoveGenerator.mini_max_move)
+            return None
+        best = children[0]
+        print("%d playouts (%d reused), %.0f playouts/s, %s visited %d times, value %.2f" %
+              (self.stats["playouts"], self.stats["reused"], self.stats["rate"],
+               best.move.uci(), best.visits, best.value / max(best.visits, 1)))
+        return best.move
+
+    '''
+    Anytime search: grows the tree until the budget is used up and returns the root's
+    children, most visited first (their visits and values say how sure the search is)
+    '''
+
+    def analyze(self, board, playouts=None, time=None):
+        playouts = self.PLAYOUTS if playouts is None and time is None else playouts
+        time = self.TIME_LIMIT if time is None else time
+        root = self.find_root(board)
+        reused = root.visits
+        if root.children is None:
+            root.expand(board)
+
+        start = perf_counter()
+        done = batches = 0
+        batch = 1 if self.WORKERS <= 1 else self.WORKERS * LEAVES_PER_WORKER
+        while root.children:
+            if playouts is not None and done >= playouts:
+                break
+            if time is not None and perf_counter() - start >= time:
+                break
+            # keep a UI responsive (see ChessEngineHelper.set_event_hook)
+            hook = ChessEngineHelper._event_hook
+            if hook is not None and batches % EVENT_INTERVAL == 0 and hook():
+                self.QUIT = True
+                break
+            size = batch if playouts is None else min(batch, playouts - done)
+            done += self.playout_batch(board, root, size)
+            batches += 1
+
+        elapsed = perf_counter() - start
+        self.stats = {"playouts": done, "reused": reused, "seconds": elapsed,
+                      "rate": done / elapsed if elapsed > 0 else 0.0}
+        return sorted(root.children, key=lambda child: child.visits, reverse=True)
+
+    # the node of the board's position: the old root's grandchild (or any descendant)
+    # if the board continues the game of the last search, a new root otherwise
+    def find_root(self, board):
+        node = None
+        stack = board.move_stack
+        if (self.root is not None and len(stack) >= len(self.root_moves) and
+                stack[:len(self.root_moves)] == self.root_moves and board.root().fen() == self.root_fen):
+            node = self.root
+            for move in stack[len(self.root_moves):]:
+                node = next((child for child in node.children or () if child.move == move), None)
+                if node is None:
+                    break
+        if node is None:
+            node = Node(None, None, 1.0)
+            self.root_fen = board.root().fen()
+        node.parent = None  # let the rest of the old tree go
+        self.root = node
+        self.root_moves = list(stack)
+        return node
+
+    # selects `size` leaves, scores them and backs the values up, returns the playouts done
+    def playout_batch(self, board, root, size):
+        pending = []  # (leaf, position) waiting for a value
+        for _ in range(size):
+            node = root
+            depth = 0
+            node.virtual += 1
+            while node.children:
+                node = node.select()
+                board.push(node.move)
+                depth += 1
+                node.virtual += 1
+            if node.children is None:
+                node.expand(board)
+            if node.terminal is not None:
+                self.backup(node, node.terminal)
+            else:
+                pending.append((node, board.fen() if self.WORKERS > 1 else board.copy(stack=False)))
+            for _ in range(depth):
+                board.pop()
+
+        if pending:
+            if self.WORKERS > 1:
+                values = self.evaluate_in_workers([position for _, position in pending])
+            else:
+                values = [evaluate_leaf(position, self.heuristics, self.EVALUATION, self.ROLLOUT)
+                          for _, position in pending]
+            for (node, _), value in zip(pending, values):
+                self.backup(node, value)
+        return size
+
+    def evaluate_in_workers(self, fens):
+        if self.pool is None:
+            self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.WORKERS)
+        chunk = max(1, (len(fens) + self.WORKERS - 1) // self.WORKERS)
+        futures = [self.pool.submit(evaluate_worker, fens[i:i + chunk], self.EVALUATION, self.ROLLOUT)
+                   for i in range(0, len(fens), chunk)]
+        return [value for future in futures for value in future.result()]
+
+    # `value` is for the side to move at `node`, every node stores it for the side which moved there
+    def backup(self, node, value):
+        while node is not None:
+            value = -value
+            node.visits += 1
+            node.value += value
+            node.virtual -= 1
+            node = node.parent
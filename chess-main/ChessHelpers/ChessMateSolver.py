@@ -0,0 +1,197 @@
+# Chess Mate Solver
+#
+# Finds forced mates with depth-first proof-number search (df-pn) instead of alpha-beta.
+# A mate search only cares whether the side to move (the attacker) can force mate, not
+# by how much a position is better, so it only follows checks for the attacker and every
+# reply for the defender, and always expands the position which is cheapest to settle:
+#
+#   proof number:    how many positions still have to be shown to be mates before the
+#                    current one is proven (an attacker node needs one good check, a
+#                    defender node needs every reply answered)
+#   disproof number: the same for showing there is no mate
+#
+# With few checks and few replies to a check these numbers grow slowly along forcing
+# lines, so the search goes deep quickly where alpha-beta would look at every move.
+#
+# The numbers are kept in the solver's own table, keyed by (zobrist hash, plies left),
+# so a position reached again is not searched again, and as the plies left go down at
+# every move the search can't run in circles. Mates are searched in 1, then 2, 3...
+# moves, so the line found is the shortest mate within max_ply plies.
+#
+#   line = find_mate(board, max_ply=9)  # mate in 5 or less, None if there is none
+#
+# Repetitions and the fifty-move rule are not taken into account.
+
+import chess
+import chess.polyglot
+
+INFINITY = 10 ** 9
+TABLE_SIZE = 1 << 20  # entries kept before unsolved positions are dropped
+
+
+class MateSolver:
+    def __init__(self, node_limit=None, table_size=TABLE_SIZE):
+        self.node_limit = node_limit
+        self.table_size = table_size
+        # (zobrist hash, plies left) -> (phi, delta), seen from the side to move there:
+        # phi is the number which is 0 when the side to move reaches its goal (mate for
+        # the attacker, escaping for the defender), delta the one which is 0 when it fails
+        self.table = {}
+        self.children = {}  # zobrist hash -> (moves, zobrist hashes after them)
+        self.nodes = 0
+        self.aborted = False
+        self.attacker = None
+
+    # the shortest mating line (a list of moves) of at most max_ply plies, or None
+    # if there is no mate that short or the node limit ran out first
+    def find_mate(self, board, max_ply):
+        self.attacker = board.turn
+        key = chess.polyglot.zobrist_hash(board)
+        for plies in range(1, max_ply + 1, 2):
+            self.mid(board, key, plies, INFINITY, INFINITY)
+            if self.aborted:
+                return None
+            if self.table[(key, plies)][0] == 0:
+                return self.line(board, key, plies)
+        return None
+
+    # "multiple iterative deepening": searches the position until its phi or delta
+    # reaches the threshold, always going into the child with the smallest delta
+    def mid(self, board, key, plies, phi_limit, delta_limit):
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            self.aborted = True
+            return
+
+        if plies <= 0:
+            self.store(key, plies, self.terminal(board))
+            return
+        moves, keys = self.expand(board, key)
+        if not moves:
+            self.store(key, plies, self.terminal(board))
+            return
+
+        while True:
+            # phi is the best child's delta, delta the sum of the children's phi
+            phi = best_delta = second_delta = INFINITY
+            delta = 0
+            best = best_phi = None
+            for index, child in enumerate(keys):
+                child_phi, child_delta = self.table.get((child, plies - 1), (1, 1))
+                delta = min(delta + child_phi, INFINITY)
+                if child_delta < best_delta:
+                    second_delta = best_delta
+                    best_delta = child_delta
+                    best = index
+                    best_phi = child_phi
+                elif child_delta < second_delta:
+                    second_delta = child_delta
+            phi = best_delta
+            if phi >= phi_limit or delta >= delta_limit or self.aborted:
+                break
+            # stay in the best child until it is no longer the best one
+            board.push(moves[best])
+            self.mid(board, keys[best], plies - 1, delta_limit - delta + best_phi, min(phi_limit, second_delta + 1))
+            board.pop()
+        self.store(key, plies, (phi, delta))
+
+    # checks for the attacker, every reply for the defender
+    def moves(self, board):
+        if board.turn == self.attacker:
+            return [move for move in board.legal_moves if board.gives_check(move)]
+        return list(board.legal_moves)
+
+    # the moves of a position and the zobrist hashes after them. df-pn comes back to the
+    # same positions again and again, so they are generated only once
+    def expand(self, board, key):
+        children = self.children.get(key)
+        if children is None:
+            moves = self.moves(board)
+            keys = []
+            for move in moves:
+                board.push(move)
+                keys.append(chess.polyglot.zobrist_hash(board))
+                board.pop()
+            if len(self.children) >= self.table_size:
+                self.children = {}
+            children = self.children[key] = (moves, keys)
+        return children
+
+    # (phi, delta) of a position without moves to search
+    def terminal(self, board):
+        if board.turn == self.attacker:
+            # no checks left, or out of plies: no mate here
+            return INFINITY, 0
+        if board.is_checkmate():
+            return INFINITY, 0
+        # stalemate, or the defender is still alive when the plies run out
+        return 0, INFINITY
+
+    def store(self, key, plies, value):
+        if len(self.table) >= self.table_size:
+            # keep what is solved, drop the rest
+            self.table = {entry: old for entry, old in self.table.items() if 0 in old}
+        self.table[(key, plies)] = value
+
+    # has the table a mate from this position in at most `plies` plies?
+    def proven(self, key, plies, attacker_to_move):
+        for distance in range(plies % 2, plies + 1, 2):
+            entry = self.table.get((key, distance))
+            if entry is not None and entry[0 if attacker_to_move else 1] == 0:
+                return True
+        return False
+
+    # plies to mate along the proof in the table, with the attacker taking the quickest
+    # mate and the defender the reply which holds out the longest (the table only says
+    # "mate within n plies", and a position is often proven for more plies than it needs)
+    def distance(self, board, key, plies, distances):
+        known = distances.get((key, plies))
+        if known is not None:
+            return known
+        attacker_to_move = board.turn == self.attacker
+        if not attacker_to_move and board.is_checkmate():
+            return 0
+        result = INFINITY if attacker_to_move else 0
+        if plies > 0:
+            moves, keys = self.expand(board, key)
+            for move, child in zip(moves, keys):
+                if attacker_to_move and not self.proven(child, plies - 1, False):
+                    continue
+                board.push(move)
+                child_distance = 1 + self.distance(board, child, plies - 1, distances)
+                board.pop()
+                result = min(result, child_distance) if attacker_to_move else max(result, child_distance)
+        else:
+            result = INFINITY
+        distances[(key, plies)] = min(result, INFINITY)
+        return distances[(key, plies)]
+
+    # the mating line, following the distances
+    def line(self, board, key, plies):
+        line = []
+        distances = {}
+        while plies > 0 and not board.is_checkmate():
+            attacker_to_move = board.turn == self.attacker
+            choice = None
+            moves, keys = self.expand(board, key)
+            for move, child in zip(moves, keys):
+                board.push(move)
+                distance = self.distance(board, child, plies - 1, distances)
+                board.pop()
+                if distance >= INFINITY:
+                    continue
+                if choice is None or (distance < choice[0] if attacker_to_move else distance > choice[0]):
+                    choice = (distance, move, child)
+            if choice is None:
+                break
+            _, move, key = choice
+            board.push(move)
+            line.append(move)
+            plies -= 1
+        for _ in line:
+            board.pop()
+        return line
+
+
+def find_mate(board, max_ply=9, node_limit=None):
+    return MateSolver(node_limit).find_mate(board, max_ply)
@@ -0,0 +1,99 @@
+# Chess Move Picker
+#
+# Alpha-beta prunes the most when the best move is searched first, and most cutoffs come
+# from the first capture (or the move that was best last time). So instead of building
+# list(board.legal_moves) at every node, the MovePicker hands out moves in stages and only
+# generates a stage once the previous ones failed to produce a cutoff:
+#
+#   1. the hash move (best move found for this position earlier)
+#   2. winning captures and promotions, most valuable victim first
+#   3. killer moves (quiet moves that caused a cutoff in a sibling node)
+#   4. the remaining quiet moves, ordered by the history table
+#   5. losing captures
+#
+# At a cut node we usually never reach stage 4, so the quiet moves are never generated.
+
+import chess
+
+STAGE_HASH = 0
+STAGE_GOOD_CAPTURES = 1
+STAGE_KILLERS = 2
+STAGE_QUIETS = 3
+STAGE_BAD_CAPTURES = 4
+
+PIECE_VALUES = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 10, chess.KING: 0}
+
+
+class MovePicker:
+    def __init__(self, board, hash_move=None, killers=(), history=None):
+        self.board = board
+        self.hash_move = hash_move
+        self.killers = killers
+        self.history = history
+        # the stage of the move that was handed out last
+        self.stage = STAGE_HASH
+
+    def __iter__(self):
+        board = self.board
+        searched = set()
+
+        # stage 1: hash move
+        self.stage = STAGE_HASH
+        hash_move = self.hash_move
+        if hash_move is not None and board.is_legal(hash_move):
+            searched.add(hash_move)
+            yield hash_move
+
+        # stage 2: winning captures (victim worth at least the attacker, or undefended)
+        # plus promotions, losing captures are kept for the very end
+        self.stage = STAGE_GOOD_CAPTURES
+        good = []
+        bad = []
+        for move in board.generate_legal_captures():
+            if move in searched:
+                continue
+            victim = PIECE_VALUES[chess.PAWN] if board.is_en_passant(move) \
+                else PIECE_VALUES[board.piece_type_at(move.to_square)]
+            attacker = PIECE_VALUES[board.piece_type_at(move.from_square)]
+            # MVV-LVA: most valuable victim first, then least valuable attacker
+            key = victim * 16 - attacker
+            if move.promotion:
+                key += PIECE_VALUES[move.promotion] * 16
+            if victim >= attacker or move.promotion or not board.is_attacked_by(not board.turn, move.to_square):
+                good.append((key, move))
+            else:
+                bad.append((key, move))
+        # quiet promotions are searched with the good captures
+        own_pawns = board.pawns & board.occupied_co[board.turn]
+        for move in board.generate_legal_moves(own_pawns, chess.BB_BACKRANKS & ~board.occupied):
+            if move not in searched:
+                good.append((PIECE_VALUES[move.promotion] * 16, move))
+
+        good.sort(key=lambda item: item[0], reverse=True)
+        for _, move in good:
+            searched.add(move)
+            yield move
+
+        # stage 3: killer moves
+        self.stage = STAGE_KILLERS
+        for move in self.killers:
+            if move is not None and move not in searched and not board.is_capture(move) \
+                    and board.is_legal(move):
+                searched.add(move)
+                yield move
+
+        # stage 4: all other quiet moves, only generated now that nothing above cut off
+        self.stage = STAGE_QUIETS
+        quiets = [move for move in board.generate_legal_moves(chess.BB_ALL, ~board.occupied_co[not board.turn])
+                  if move not in searched and not board.is_en_passant(move)]
+        if self.history:
+            history = self.history
+            quiets.sort(key=lambda m: history.get((m.from_square, m.to_square), 0), reverse=True)
+        for move in quiets:
+            yield move
+
+        # stage 5: captures which probably lose material
+        self.stage = STAGE_BAD_CAPTURES
+        bad.sort(key=lambda item: item[0], reverse=True)
+        for _, move in bad:
+            yield move
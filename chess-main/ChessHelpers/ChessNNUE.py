@@ -0,0 +1,244 @@
+# Chess NNUE
+#
+# A small "efficiently updatable" neural network evaluation, used by
+# Heuristics.nnue (select it with move_generator.set_option("evaluation", "nnue")).
+# Needs numpy.
+#
+# Input features are (king square, piece, square) from the point of view of each side:
+# for every piece other than the kings, "my king is on g1 and there is an enemy knight
+# on f6". The first layer adds up one weight row per active feature into an accumulator
+# of ACCUMULATOR values per side. A move only changes a few features, so instead of
+# adding up ~30 rows again for every position the search keeps a stack of accumulators
+# and updates the top one with the rows of the pieces that moved (a king move changes
+# every feature of its side, then only that side is rebuilt). The accumulators are
+# followed by three tiny dense layers:
+#
+#   [side to move, other side] accumulators (int16) -> clip 0..127
+#   -> 32 (int8 weights) -> clip 0..127 -> 32 (int8 weights) -> clip 0..127 -> 1 (int8 weights)
+#
+# Dense layer outputs are divided by 64 (a shift) to stay in range, and the final output
+# by OUTPUT_SCALE to get a score in pawns like the other heuristics.
+#
+# The weights are read from an .npz file (CHESS_NNUE, default ChessHelpers/nnue.npz).
+# material_network() builds a network which only counts material, useful as a starting
+# point for training and for benchmarks (see benchmark_nnue.py).
+
+import os
+
+import numpy as np
+import chess
+
+NNUE_ENV = "CHESS_NNUE"
+DEFAULT_NETWORK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nnue.npz")
+
+ACCUMULATOR = 128
+HIDDEN = 32
+PIECES = [chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN]
+INPUTS = 64 * len(PIECES) * 2 * 64  # king square x (piece type, mine/theirs) x square
+SHIFT = 6  # dense layers divide by 64
+OUTPUT_SCALE = 64
+REBASE_PLIES = 16  # how far back the accumulators are rebuilt when they lost track of the board
+
+
+# index of the first layer row for a piece, seen from one side: squares are mirrored
+# for black so both sides see the board from their own first rank
+def feature(perspective, king, piece_type, color, square):
+    if perspective == chess.BLACK:
+        king ^= 56
+        square ^= 56
+    piece = (piece_type - 1) * 2 + (color != perspective)
+    return (king * len(PIECES) * 2 + piece) * 64 + square
+
+
+def active_features(board, perspective):
+    king = board.king(perspective)
+    features = []
+    for piece_type in PIECES:
+        for color in (chess.WHITE, chess.BLACK):
+            for square in chess.scan_forward(board.pieces_mask(piece_type, color)):
+                features.append(feature(perspective, king, piece_type, color, square))
+    return features
+
+
+class Network:
+    def __init__(self, ft_weight, ft_bias, l1_weight, l1_bias, l2_weight, l2_bias, out_weight, out_bias):
+        # quantized weights as stored, plus int32 copies of the dense layers to compute with
+        self.ft_weight = ft_weight.astype(np.int16)  # INPUTS x ACCUMULATOR
+        self.ft_bias = ft_bias.astype(np.int16)
+        self.l1_weight = l1_weight.astype(np.int8)  # HIDDEN x 2 * ACCUMULATOR
+        self.l2_weight = l2_weight.astype(np.int8)  # HIDDEN x HIDDEN
+        self.out_weight = out_weight.astype(np.int8)  # HIDDEN
+        self.l1_bias = l1_bias.astype(np.int32)
+        self.l2_bias = l2_bias.astype(np.int32)
+        self.out_bias = int(out_bias)
+        self.l1 = self.l1_weight.astype(np.int32)
+        self.l2 = self.l2_weight.astype(np.int32)
+        self.out = self.out_weight.astype(np.int32)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(*(data[name] for name in ("ft_weight", "ft_bias", "l1_weight", "l1_bias",
+                                                 "l2_weight", "l2_bias", "out_weight", "out_bias")))
+
+    def save(self, path):
+        np.savez_compressed(path, ft_weight=self.ft_weight, ft_bias=self.ft_bias,
+                            l1_weight=self.l1_weight, l1_bias=self.l1_bias,
+                            l2_weight=self.l2_weight, l2_bias=self.l2_bias,
+                            out_weight=self.out_weight, out_bias=np.int32(self.out_bias))
+
+    # accumulator of one side, added up from scratch
+    def refresh(self, board, perspective):
+        return self.ft_bias + self.ft_weight[active_features(board, perspective)].sum(axis=0, dtype=np.int16)
+
+    # score in pawns for the side to move from the two accumulators
+    def forward(self, ours, theirs):
+        x = np.clip(np.concatenate((ours, theirs)), 0, 127).astype(np.int32)
+        x = np.clip((self.l1 @ x + self.l1_bias) >> SHIFT, 0, 127)
+        x = np.clip((self.l2 @ x + self.l2_bias) >> SHIFT, 0, 127)
+        return (int(self.out @ x) + self.out_bias) / OUTPUT_SCALE
+
+    # evaluation without any incremental state (for testing and benchmarks)
+    def evaluate_full(self, board):
+        white, black = self.refresh(board, chess.WHITE), self.refresh(board, chess.BLACK)
+        return self.forward(white, black) if board.turn == chess.WHITE else self.forward(black, white)
+
+
+class Accumulators:
+    # follows a board through the search: a stack with the (white, black) accumulators
+    # for every move played since `base`, updated from the move instead of recomputed.
+    # It catches up with the board on every evaluation (pushing and popping the moves
+    # that differ), so the search does not have to tell it about its moves.
+    def __init__(self, network):
+        self.network = network
+        self.board = None
+        self.base = 0  # length of the move stack when the accumulators were rebuilt
+        self.base_move = None  # the last move of the move stack at that time
+        self.moves = []
+        self.stack = []
+        self.refreshes = 0
+        self.updates = 0
+
+    # rebuilds the accumulators REBASE_PLIES moves before the board's position (about where
+    # the search started, the first evaluation is usually at a leaf) and plays the moves
+    # from there, so the positions next to this one only need updates
+    def reset(self, board):
+        self.board = board
+        self.base = max(0, len(board.move_stack) - REBASE_PLIES)
+        self.base_move = board.move_stack[self.base - 1] if self.base else None
+        missing = [board.pop() for _ in range(len(board.move_stack) - self.base)]
+        self.moves = []
+        self.stack = [(self.network.refresh(board, chess.WHITE), self.network.refresh(board, chess.BLACK))]
+        self.refreshes += 2
+        for move in reversed(missing):
+            self.stack.append(self.update(board, move, self.stack[-1]))
+            self.moves.append(move)
+            board.push(move)
+
+    def evaluate(self, board):
+        self.sync(board)
+        white, black = self.stack[-1]
+        return self.network.forward(white, black) if board.turn == chess.WHITE else self.network.forward(black, white)
+
+    def sync(self, board):
+        stack = board.move_stack
+        if (board is not self.board or len(stack) < self.base or
+                (self.base and stack[self.base - 1] is not self.base_move)):
+            self.reset(board)
+            return
+        # keep the moves both have in common, undo the rest and play the board's moves
+        played = stack[self.base:]
+        common = 0
+        while common < len(self.moves) and common < len(played) and self.moves[common] == played[common]:
+            common += 1
+        del self.moves[common:]
+        del self.stack[common + 1:]
+        if common == len(played):
+            return
+        # take the missing moves back and play them again, updating from each move
+        missing = [board.pop() for _ in range(len(played) - common)]
+        for move in reversed(missing):
+            self.stack.append(self.update(board, move, self.stack[-1]))
+            self.moves.append(move)
+            board.push(move)
+
+    # accumulators after `move` in `position`, from the accumulators before it
+    def update(self, position, move, accumulators):
+        weight = self.network.ft_weight
+        mover = position.turn
+        piece = position.piece_at(move.from_square)
+        removed = [(piece.piece_type, mover, move.from_square)]
+        added = [(move.promotion or piece.piece_type, mover, move.to_square)]
+        if position.is_en_passant(move):
+            captured_square = move.to_square + (-8 if mover == chess.WHITE else 8)
+            removed.append((chess.PAWN, not mover, captured_square))
+        elif position.is_castling(move):
+            # the rook moves too (in Chess960 notation the king "captures" its own rook)
+            rank = move.from_square & 56
+            king_side = chess.square_file(move.to_square) > chess.square_file(move.from_square)
+            rook_from = move.to_square if position.piece_type_at(move.to_square) == chess.ROOK else \
+                rank + (7 if king_side else 0)
+            rook_to = rank + (5 if king_side else 3)
+            removed.append((chess.ROOK, mover, rook_from))
+            added.append((chess.ROOK, mover, rook_to))
+        else:
+            captured = position.piece_at(move.to_square)
+            if captured is not None:
+                removed.append((captured.piece_type, captured.color, move.to_square))
+
+        result = []
+        for perspective in (chess.WHITE, chess.BLACK):
+            if piece.piece_type == chess.KING and perspective == mover:
+                # every feature of this side depends on its king square: rebuild it
+                after = position.copy(stack=False)
+                after.push(move)
+                result.append(self.network.refresh(after, perspective))
+                self.refreshes += 1
+                continue
+            king = position.king(perspective)
+            accumulator = accumulators[perspective == chess.BLACK].copy()
+            for piece_type, color, square in removed:
+                if piece_type != chess.KING:
+                    accumulator -= weight[feature(perspective, king, piece_type, color, square)]
+            for piece_type, color, square in added:
+                if piece_type != chess.KING:
+                    accumulator += weight[feature(perspective, king, piece_type, color, square)]
+            result.append(accumulator)
+            self.updates += 1
+        return result[0], result[1]
+
+
+def load_network(path=None):
+    path = path or os.environ.get(NNUE_ENV) or DEFAULT_NETWORK
+    if not os.path.exists(path):
+        raise FileNotFoundError("no NNUE weights at %s (see ChessNNUE.py, benchmark_nnue.py writes a "
+                                "material-only network)" % path)
+    return Network.load(path)
+
+
+# a network which only counts material with the given piece values (in pawns): the first
+# accumulator value of each side is 64 + (my material - their material), the dense
+# layers pass (ours - theirs) / 2 through and everything else is zero
+def material_network(piece_score=None):
+    piece_score = piece_score or {"q": 10, "r": 5, "b": 3, "n": 3, "p": 1}
+    values = {chess.PAWN: "p", chess.KNIGHT: "n", chess.BISHOP: "b", chess.ROOK: "r", chess.QUEEN: "q"}
+    ft_weight = np.zeros((INPUTS, ACCUMULATOR), dtype=np.int16)
+    for king in range(64):
+        for piece_type in PIECES:
+            value = int(round(piece_score[values[piece_type]]))
+            for mine in (0, 1):
+                start = (king * len(PIECES) * 2 + (piece_type - 1) * 2 + mine) * 64
+                ft_weight[start:start + 64, 0] = value if mine == 0 else -value
+    ft_bias = np.zeros(ACCUMULATOR, dtype=np.int16)
+    ft_bias[0] = 64
+    l1_weight = np.zeros((HIDDEN, 2 * ACCUMULATOR), dtype=np.int8)
+    l1_weight[0, 0] = 32
+    l1_weight[0, ACCUMULATOR] = -32
+    l1_bias = np.zeros(HIDDEN, dtype=np.int32)
+    l1_bias[0] = 64 << SHIFT
+    l2_weight = np.zeros((HIDDEN, HIDDEN), dtype=np.int8)
+    l2_weight[0, 0] = 64
+    l2_bias = np.zeros(HIDDEN, dtype=np.int32)
+    out_weight = np.zeros(HIDDEN, dtype=np.int8)
+    out_weight[0] = 64
+    return Network(ft_weight, ft_bias, l1_weight, l1_bias, l2_weight, l2_bias, out_weight, -64 * 64)
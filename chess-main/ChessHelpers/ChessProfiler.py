@@ -0,0 +1,207 @@
+# Chess Profiler
+#
+# Profiles single searches on demand, to find out why a move was slow without
+# changing (or redeploying) the engine. Profiling is switched on
+#
+#   - for every search of a process with the environment variable CHESS_PROFILE=cprofile
+#     or CHESS_PROFILE=sample (files go to CHESS_PROFILE_DIR, default "profiles"),
+#   - for one generator with move_generator.set_option("profile", "sample"),
+#   - for one search with move_generator.analyze(board, profile="cprofile"),
+#   - for one server game with {"cmd": "setoption", "game": 1, "name": "profile", "value": "sample"}.
+#
+# "cprofile" runs the deterministic profiler and writes a .pstats file (open it with
+# pstats, snakeviz or gprof2dot). "sample" looks at the search's call stack every
+# millisecond from a second thread, which slows the search down much less, and writes
+# the stacks in the collapsed format read by flamegraph.pl and speedscope (.folded).
+# Both write a .txt summary with the position (FEN) and how the time was split between
+# the evaluation terms, move generation, push/pop and the rest of the search. All file
+# names start with the time (to the microsecond, and a counter of the profiles written by
+# the process, so quick searches never overwrite each other's files) and the FEN of the
+# searched position.
+
+import cProfile
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_ENV = "CHESS_PROFILE"
+PROFILE_DIR_ENV = "CHESS_PROFILE_DIR"
+DEFAULT_DIR = "profiles"
+MODES = ("cprofile", "sample")
+SAMPLE_INTERVAL = 0.001  # seconds
+
+_profile_numbers = itertools.count(1)
+
+# where the time of a search goes, by the functions on the stack. A sample counts for
+# the first term in this list with a function on the stack, so e.g. a legal move check
+# made inside score_material counts as score_material. A function is named by its name
+# alone or, when the name is too common (like __iter__), by "file:name".
+TERMS = [
+    ("score_material", {"score_material"}),
+    ("control_center", {"control_center"}),
+    ("control_diagonals", {"control_diagonals"}),
+    ("evaluation (other)", {"heuristic_1", "heuristic_2", "score_terminal", "evaluate"}),
+    ("push/pop", {"push", "pop"}),
+    ("zobrist hash", {"zobrist_hash"}),
+    ("move generation", {"generate_legal_moves", "generate_pseudo_legal_moves", "generate_legal_captures",
+                         "generate_castling_moves", "is_check", "is_legal", "is_capture", "gives_check"}),
+    # the rest of the MovePicker's work: sorting the captures, killers and quiet moves
+    ("move ordering", {"ChessMovePicker.py:__init__", "ChessMovePicker.py:__iter__"}),
+]
+SEARCH = "search (other)"
+
+
+# the profiling mode from the environment (None when profiling is off)
+def default_mode():
+    mode = os.environ.get(PROFILE_ENV, "").strip().lower()
+    return mode if mode in MODES else None
+
+
+def default_directory():
+    return os.environ.get(PROFILE_DIR_ENV, DEFAULT_DIR)
+
+
+# the names a function can be listed under in TERMS
+def function_names(filename, name):
+    return name, "%s:%s" % (os.path.basename(filename), name)
+
+
+def term_of(names):
+    for term, functions in TERMS:
+        if not functions.isdisjoint(names):
+            return term
+    return SEARCH
+
+
+class Sampler:
+    # samples the call stack of one thread from a background thread
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()  # stack (outermost first) -> number of samples
+        self.thread_id = None
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.thread_id = threading.get_ident()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+    def run(self):
+        while self.running:
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((os.path.basename(code.co_filename), code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+
+class SearchProfile:
+    # context manager around one search:
+    #
+    #   with SearchProfile("sample", board.fen()) as profile:
+    #       ... search ...
+    #   print(profile.terms, profile.files)
+    def __init__(self, mode, fen, directory=None):
+        if mode not in MODES:
+            raise ValueError("unknown profile mode %r (use one of %s)" % (mode, ", ".join(MODES)))
+        self.mode = mode
+        self.fen = fen
+        self.directory = directory or default_directory()
+        self.profiler = None
+        self.elapsed = 0.0
+        self.terms = {}  # term -> seconds
+        self.files = []
+        self.start = None
+        self.stamp = None  # time and number of the profile, shared by all its files
+
+    def __enter__(self):
+        self.profiler = cProfile.Profile() if self.mode == "cprofile" else Sampler()
+        self.start = time.perf_counter()
+        if self.mode == "cprofile":
+            self.profiler.enable()
+        else:
+            self.profiler.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.mode == "cprofile":
+            self.profiler.disable()
+        else:
+            self.profiler.stop()
+        self.elapsed = time.perf_counter() - self.start
+        self.write()
+        return False
+
+    def file_name(self, extension):
+        # the FEN without characters which are not allowed in file names
+        tag = self.fen.replace("/", "-").replace(" ", "_")
+        return os.path.join(self.directory, "%s-%s-%s.%s" % (self.stamp, self.mode, tag, extension))
+
+    def write(self):
+        os.makedirs(self.directory, exist_ok=True)
+        now = time.time()
+        self.stamp = "%s.%06d-%d" % (time.strftime("%Y%m%d-%H%M%S", time.localtime(now)),
+                                     int(now % 1 * 1e6), next(_profile_numbers))
+        if self.mode == "cprofile":
+            path = self.file_name("pstats")
+            self.profiler.dump_stats(path)
+            self.files.append(path)
+            self.terms = self.cprofile_terms(pstats.Stats(path))
+        else:
+            path = self.file_name("folded")
+            with open(path, "w") as f:
+                for stack, count in self.profiler.samples.most_common():
+                    f.write("%s %d\n" % (";".join("%s:%s" % frame for frame in stack), count))
+            self.files.append(path)
+            self.terms = self.sample_terms()
+
+        path = self.file_name("txt")
+        with open(path, "w") as f:
+            f.write("fen: %s\nmode: %s\nsearch time: %.3fs\n\n" % (self.fen, self.mode, self.elapsed))
+            f.write(self.summary())
+        self.files.append(path)
+        print("profile written to %s" % self.files[0])
+
+    # the sampled time of every term (each sample counted once)
+    def sample_terms(self):
+        counts = Counter()
+        for stack, count in self.profiler.samples.items():
+            counts[term_of({key for frame in stack for key in function_names(*frame)})] += count
+        total = sum(counts.values())
+        return {term: self.elapsed * count / total for term, count in counts.items()} if total else {}
+
+    # cProfile has no call stacks, so a term is the cumulative time of its functions
+    # (the time of a function called from several terms is counted in each of them)
+    def cprofile_terms(self, stats):
+        terms = Counter()
+        for (filename, _, name), (_, _, _, cumulative, callers) in stats.stats.items():
+            for term, functions in TERMS:
+                if not functions.isdisjoint(function_names(filename, name)) and not any(
+                        not functions.isdisjoint(function_names(caller[0], caller[2])) for caller in callers):
+                    terms[term] += cumulative
+        # the evaluation functions call the individual terms, keep only the rest of their time
+        other = "evaluation (other)"
+        if other in terms:
+            terms[other] = max(0.0, terms[other] - sum(terms[term] for term, _ in TERMS[:3]))
+        terms[SEARCH] = max(0.0, self.elapsed - sum(terms.values()))
+        return dict(terms)
+
+    def summary(self):
+        lines = ["%-20s %8s %6s" % ("term", "seconds", "share")]
+        for term, seconds in sorted(self.terms.items(), key=lambda item: item[1], reverse=True):
+            lines.append("%-20s %8.3f %5.1f%%" % (term, seconds, 100 * seconds / max(self.elapsed, 1e-9)))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,423 @@
+# Chess Server
+#
+# This file contains a headless asyncio game server which can host many human-vs-bot
+# games at once. Every game is a chess.Board held in memory, and whenever it is the
+# bot's turn the position is handed to a bounded pool of worker processes which run
+# our MoveGenerator search. Clients talk to the server over a local TCP socket using
+# one JSON object per line:
+#
+#   -> {"cmd": "new", "engine": "black", "clock": 300, "increment": 2}
+#   <- {"event": "created", "game": 1, "fen": "..."}
+#   -> {"cmd": "move", "game": 1, "move": "e2e4"}
+#   <- {"event": "move", "game": 1, "move": "e7e5", "latency": 0.41, "depth": 5, ...}
+#   -> {"cmd": "cancel", "game": 1}
+#   -> {"cmd": "setoption", "game": 1, "name": "profile", "value": "sample"}
+#   -> {"cmd": "metrics"}
+#
+# Searches are scheduled "earliest deadline first": each request gets a deadline of
+# (time it was queued + the game's per-move budget), and the budget shrinks as the
+# bot's clock runs down, so games in time trouble jump the queue while every other
+# game still gets served eventually. What is left of the budget when a worker picks the
+# request up is also the search's time limit, so the move is ready by its deadline.
+#
+# All workers attach to one SharedTranspositionTable, so games in the same opening
+# reuse the positions another worker has already searched.
+#
+# A search which fails in its worker is queued again (up to MAX_ATTEMPTS times in all,
+# on a new pool if the worker process died), after that the game is aborted: the client gets {"event": "aborted", ...} and the game
+# is closed, instead of waiting forever for a bot move that never comes.
+
+import asyncio
+import concurrent.futures
+import heapq
+import itertools
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+
+import chess
+from ChessHelpers.ChessEngineHelper import MoveGenerator
+from ChessHelpers.ChessProfiler import MODES as PROFILE_MODES
+from ChessHelpers.ChessSharedTable import SharedTranspositionTable
+from ChessHelpers.ChessTimeManager import TimeManager
+
+MAX_ATTEMPTS = 3  # searches of one bot move before the game is aborted
+
+# per-process move generator, created lazily the first time a worker gets a search
+_worker_generator = None
+_worker_table = None
+_worker_game = None  # the game of the worker's last search
+
+
+def init_worker(table_name):
+    """ Attaches a new worker process to the server's shared transposition table """
+    global _worker_table
+    if table_name is not None:
+        _worker_table = SharedTranspositionTable(name=table_name)
+
+
+def search_worker(fen, moves, profile=None, clock=None, budget=None, game_id=None):
+    """ Runs one search in a worker process and returns (uci move, search seconds, depth) """
+    global _worker_generator, _worker_game
+    if _worker_generator is None:
+        _worker_generator = MoveGenerator(table=_worker_table)
+    if game_id != _worker_game:
+        # killers, history and the expected reply of another game don't help here
+        # (the shared table is kept, it belongs to the server)
+        _worker_generator.new_game()
+        _worker_game = game_id
+    # the worker serves many games, so the game's profiling option, the time left until
+    # the request's deadline and the bot's (remaining, increment) clock are set for every search
+    _worker_generator.set_option("profile", profile)
+    _worker_generator.set_option("time", budget)
+    _worker_generator.set_clock(*(clock or (None,)))
+
+    # rebuild the game from its start position so the move stack is intact
+    board = chess.Board(fen)
+    for uci in moves:
+        board.push_uci(uci)
+
+    # (an only move is played without a search, its depth is 0)
+    _worker_generator.stats = {}
+    start = time.perf_counter()
+    move = _worker_generator.mini_max_move(board)
+    return move.uci(), time.perf_counter() - start, _worker_generator.stats.get("depth", 0)
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class ServerMetrics:
+    def __init__(self, window=1000):
+        # only keep the most recent samples so percentiles follow the current load
+        self.search_latency = deque(maxlen=window)
+        self.queue_wait = deque(maxlen=window)
+        self.searches = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.failed = 0  # searches which raised (or whose worker died)
+
+    def snapshot(self, queue_depth, in_flight, games):
+        return {
+            "games": games,
+            "queue_depth": queue_depth,
+            "in_flight": in_flight,
+            "searches": self.searches,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "search_latency": {
+                "p50": percentile(self.search_latency, 50),
+                "p90": percentile(self.search_latency, 90),
+                "p99": percentile(self.search_latency, 99),
+            },
+            "queue_wait": {
+                "p50": percentile(self.queue_wait, 50),
+                "p90": percentile(self.queue_wait, 90),
+                "p99": percentile(self.queue_wait, 99),
+            },
+        }
+
+
+class GameSession:
+    def __init__(self, game_id, board, engine_color, clock, increment, send):
+        self.game_id = game_id
+        self.board = board
+        self.start_fen = board.fen()
+        self.engine_color = engine_color
+        # the bot's remaining time in seconds (None means untimed)
+        self.clock = clock
+        self.increment = increment
+        # coroutine function used to stream events back to the owner of the game
+        self.send = send
+        self.job = None
+        self.closed = False
+        # profile the bot's searches in this game ("cprofile" or "sample", see ChessProfiler.py)
+        self.profile = None
+
+    def engine_to_move(self):
+        return not self.closed and self.board.outcome() is None and self.board.turn == self.engine_color
+
+    def move_budget(self, default_budget):
+        # the time manager's soft budget for the bot's clock (see ChessTimeManager.py),
+        # untimed games just get the server default
+        if self.clock is None:
+            return default_budget
+        return min(default_budget, TimeManager(self.clock, self.increment).soft)
+
+
+class SearchJob:
+    def __init__(self, session, deadline, queued_at, attempt=1):
+        self.session = session
+        self.deadline = deadline
+        self.queued_at = queued_at
+        self.attempt = attempt  # 1 for the first search of the move, 2 for its first retry...
+        self.queued = True
+        self.cancelled = False
+
+
+class GameServer:
+    def __init__(self, workers=None, max_pending=256, default_budget=10.0, shared_table=True):
+        self.workers = workers or os.cpu_count() or 1
+        self.shared_table = shared_table
+        self.table = None
+        self.max_pending = max_pending
+        self.default_budget = default_budget
+        self.games = {}
+        self.metrics = ServerMetrics()
+        self.pool = None
+        self._ids = itertools.count(1)
+        self._seq = itertools.count()
+        self._queue = []  # heap of (deadline, seq, job)
+        self._pending = 0  # queued jobs that are not cancelled
+        self._in_flight = 0
+        self._wakeup = None
+        self._dispatchers = []
+
+    async def start(self):
+        if self.shared_table:
+            self.table = SharedTranspositionTable(create=True)
+        self.pool = self._new_pool()
+        self._wakeup = asyncio.Condition()
+        # one dispatcher per worker process keeps exactly `workers` searches running
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+
+    def _new_pool(self):
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers, initializer=init_worker,
+            initargs=(self.table.name if self.table else None,))
+
+    async def stop(self):
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        self.pool.shutdown(cancel_futures=True)
+        if self.table is not None:
+            self.table.close()
+            self.table = None
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        await self.start()
+        server = await asyncio.start_server(self.handle_client, host, port)
+        async with server:
+            try:
+                await server.serve_forever()
+            finally:
+                await self.stop()
+
+    '''
+    Game management
+    '''
+
+    async def new_game(self, send, fen=chess.STARTING_FEN, engine="black", clock=None, increment=0):
+        board = chess.Board(fen)
+        engine_color = chess.WHITE if engine == "white" else chess.BLACK
+        session = GameSession(next(self._ids), board, engine_color, clock, increment, send)
+        self.games[session.game_id] = session
+        await send({"event": "created", "game": session.game_id, "fen": board.fen()})
+        if session.engine_to_move():
+            await self._submit(session)
+        return session
+
+    async def play_move(self, game_id, uci):
+        session = self.games[game_id]
+        if session.job is not None or session.engine_to_move():
+            raise ValueError("it is not your turn")
+        move = chess.Move.from_uci(uci)
+        if move not in session.board.legal_moves:
+            raise ValueError("illegal move " + uci)
+        session.board.push(move)
+        await self._after_move(session)
+
+    async def cancel(self, game_id):
+        session = self.games.pop(game_id, None)
+        if session is None:
+            return False
+        session.closed = True
+        # a queued job is dropped lazily by the dispatcher, a running one has its result ignored
+        job = session.job
+        if job is not None and not job.cancelled:
+            job.cancelled = True
+            if job.queued:
+                self._pending -= 1
+            self.metrics.cancelled += 1
+        session.job = None
+        async with self._wakeup:
+            self._wakeup.notify_all()
+        return True
+
+    async def _after_move(self, session, wait=True):
+        outcome = session.board.outcome()
+        if outcome is not None:
+            await session.send({"event": "gameover", "game": session.game_id, "result": outcome.result()})
+            self.games.pop(session.game_id, None)
+            session.closed = True
+        elif session.engine_to_move():
+            await self._submit(session, wait)
+
+    '''
+    Scheduling
+    '''
+
+    async def _submit(self, session, wait=True, attempt=1):
+        async with self._wakeup:
+            # backpressure: the caller (and so the client connection) waits until there is room,
+            # dispatchers never wait here or they could all block on a full queue
+            if wait:
+                await self._wakeup.wait_for(lambda: self._pending < self.max_pending or session.closed)
+            if session.closed:
+                return
+            now = time.monotonic()
+            job = SearchJob(session, now + session.move_budget(self.default_budget), now, attempt)
+            session.job = job
+            heapq.heappush(self._queue, (job.deadline, next(self._seq), job))
+            self._pending += 1
+            self._wakeup.notify_all()
+
+    async def _next_job(self):
+        async with self._wakeup:
+            while True:
+                while self._queue and self._queue[0][2].cancelled:
+                    heapq.heappop(self._queue)
+                if self._queue:
+                    job = heapq.heappop(self._queue)[2]
+                    job.queued = False
+                    self._pending -= 1
+                    self._in_flight += 1
+                    self._wakeup.notify_all()
+                    return job
+                await self._wakeup.wait()
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._next_job()
+            session = job.session
+            started = time.monotonic()
+            self.metrics.queue_wait.append(started - job.queued_at)
+            moves = [m.uci() for m in session.board.move_stack]
+            # the bot's clock has been running since the job was queued
+            clock = None
+            if session.clock is not None:
+                clock = (session.clock - (started - job.queued_at), session.increment)
+            # search for what is left of the budget after waiting in the queue
+            budget = max(0.0, job.deadline - started)
+            pool = self.pool
+            try:
+                uci, search_time, depth = await loop.run_in_executor(
+                    pool, search_worker, session.start_fen, moves, session.profile, clock,
+                    budget, session.game_id)
+            except Exception as e:
+                self._in_flight -= 1
+                self.metrics.failed += 1
+                if isinstance(e, BrokenProcessPool) and pool is self.pool:
+                    # a worker process died and took the pool with it (the other dispatchers
+                    # waiting on the same pool find it replaced already)
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    self.pool = self._new_pool()
+                if not job.cancelled and not session.closed:
+                    session.job = None
+                    await self._search_failed(job, e)
+                continue
+            self._in_flight -= 1
+            self.metrics.searches += 1
+            self.metrics.search_latency.append(search_time)
+            if job.cancelled or session.closed:
+                continue
+
+            session.job = None
+            if session.clock is not None:
+                session.clock += session.increment - (time.monotonic() - job.queued_at)
+            session.board.push_uci(uci)
+            await session.send({"event": "move", "game": session.game_id, "move": uci,
+                                "latency": search_time, "depth": depth, "clock": session.clock,
+                                "fen": session.board.fen()})
+            await self._after_move(session, wait=False)
+
+    # the bot is still to move after a failed search: search again, or give the game up
+    async def _search_failed(self, job, error):
+        session = job.session
+        await session.send({"event": "error", "game": session.game_id, "error": repr(error),
+                            "attempt": job.attempt})
+        if job.attempt < MAX_ATTEMPTS:
+            await self._submit(session, wait=False, attempt=job.attempt + 1)
+            return
+        self.games.pop(session.game_id, None)
+        session.closed = True
+        await session.send({"event": "aborted", "game": session.game_id,
+                            "reason": "the search failed %d times" % job.attempt})
+
+    def snapshot(self):
+        return self.metrics.snapshot(self._pending, self._in_flight, len(self.games))
+
+    '''
+    Client connections
+    '''
+
+    async def handle_client(self, reader, writer):
+        owned = set()
+
+        async def send(message):
+            writer.write((json.dumps(message) + "\n").encode())
+            # slow readers hold up their own games instead of growing our buffers
+            await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    await self._handle_request(request, send, owned)
+                except (ValueError, KeyError) as e:
+                    self.metrics.rejected += 1
+                    await send({"event": "error", "error": str(e)})
+        except ConnectionError:
+            pass
+        finally:
+            # a disconnected client abandons all of its games
+            for game_id in owned:
+                await self.cancel(game_id)
+            writer.close()
+
+    async def _handle_request(self, request, send, owned):
+        cmd = request["cmd"]
+        if cmd == "new":
+            session = await self.new_game(send, fen=request.get("fen", chess.STARTING_FEN),
+                                          engine=request.get("engine", "black"),
+                                          clock=request.get("clock"), increment=request.get("increment", 0))
+            owned.add(session.game_id)
+        elif cmd == "move":
+            game_id = request["game"]
+            if game_id not in owned:
+                raise KeyError("unknown game %s" % game_id)
+            await self.play_move(game_id, request["move"])
+        elif cmd == "cancel":
+            game_id = request["game"]
+            if game_id in owned and await self.cancel(game_id):
+                owned.discard(game_id)
+                await send({"event": "cancelled", "game": game_id})
+        elif cmd == "setoption":
+            game_id = request["game"]
+            if game_id not in owned:
+                raise KeyError("unknown game %s" % game_id)
+            if request["name"] != "profile":
+                raise ValueError("unknown option " + str(request["name"]))
+            value = request.get("value")
+            if value is not None and value not in PROFILE_MODES:
+                raise ValueError("unknown profile mode " + str(value))
+            self.games[game_id].profile = value
+            await send({"event": "option", "game": game_id, "name": "profile", "value": value})
+        elif cmd == "metrics":
+            await send({"event": "metrics", **self.snapshot()})
+        else:
+            raise ValueError("unknown command " + str(cmd))
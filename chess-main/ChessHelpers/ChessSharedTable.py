@@ -0,0 +1,134 @@
+# Chess Shared Table
+#
+# A transposition table in shared memory, so every search worker process on the host
+# reads and writes the same results. Concurrent games in the same opening (or several
+# workers searching the same position) then reuse each other's work instead of every
+# process filling its own private table.
+#
+# It has the same interface as TranspositionTable (probe, store, new_search, clear) so
+# a MoveGenerator can use either one:
+#
+#   table = SharedTranspositionTable(create=True)          # in the parent process
+#   table = SharedTranspositionTable(name=table.name)      # in a worker process
+#   generator = MoveGenerator(table=table)
+#
+# Every entry is 16 bytes, two 64 bit words: (key XOR data, data). The data word packs
+# the score (int32 centipawns, as TranspositionTable rounds them too), depth, bound
+# flag, best move and generation. There are no locks:
+# a writer stores the two words one after the other, so a reader can see half of a new
+# entry and half of an old one. XOR-ing the two words then no longer gives the key that
+# was probed and the entry is treated as a miss, so a torn write can never return the
+# wrong score for a position. The first entry of the block is a header which holds the
+# generation counter shared by all processes.
+
+import struct
+from multiprocessing import shared_memory
+
+import chess
+from ChessHelpers.ChessTranspositionTable import DEFAULT_SIZE, to_centipawns, from_centipawns
+
+ENTRY_BYTES = 16
+MASK_64 = (1 << 64) - 1
+
+# data word: score in centipawns as int32 in the low 32 bits, then
+#   depth 7 bits | flag 2 bits | move 15 bits (from 6, to 6, promotion 3) | generation 8 bits
+_DATA = struct.Struct("<iI")
+MAX_DEPTH = 127
+
+
+def encode_move(move):
+    if move is None:
+        return 0  # a1a1 is never a legal move
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def decode_move(code):
+    if code == 0:
+        return None
+    return chess.Move(code & 63, code >> 6 & 63, code >> 12 or None)
+
+
+class SharedTranspositionTable:
+    def __init__(self, name=None, size=DEFAULT_SIZE, create=False):
+        if create:
+            if size & (size - 1):
+                raise ValueError("transposition table size must be a power of two")
+            # one extra entry at the front for the header, the new block is zero filled
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=(size + 1) * ENTRY_BYTES)
+        else:
+            if name is None:
+                raise ValueError("name of the shared table to attach to is required")
+            self.shm = shared_memory.SharedMemory(name=name)
+            size = self.shm.size // ENTRY_BYTES - 1
+            size = 1 << (size.bit_length() - 1)  # the block may be rounded up to a page
+        self.owner = create
+        self.name = self.shm.name
+        self.size = size
+        self.mask = size - 1
+        self.words = self.shm.buf.cast("Q")
+        # statistics are kept per process
+        self.probes = 0
+        self.hits = 0
+        self.reused_hits = 0
+        self.generation = self.words[0] & 0xFF
+
+    # a new search from any process advances the shared generation, so older entries
+    # become the first to be replaced (a lost update between two processes is harmless)
+    def new_search(self):
+        self.generation = (self.words[0] + 1) & 0xFF
+        self.words[0] = self.generation
+        self.probes = 0
+        self.hits = 0
+        self.reused_hits = 0
+
+    # clears the table for every process attached to it
+    def clear(self):
+        self.shm.buf[:] = bytes(len(self.shm.buf))
+        self.generation = 0
+
+    def _read(self, key):
+        index = ((key & self.mask) + 1) * 2
+        data = self.words[index + 1]
+        if self.words[index] ^ data != key:
+            return None  # empty, another position, or a write in progress
+        return data
+
+    # returns (depth, flag, score, move) or None
+    def probe(self, key):
+        self.probes += 1
+        data = self._read(key)
+        if data is None:
+            return None
+        self.hits += 1
+        score, meta = _DATA.unpack(data.to_bytes(8, "little"))
+        if meta >> 24 != self.generation:
+            self.reused_hits += 1
+        return meta & 127, meta >> 7 & 3, from_centipawns(score), decode_move(meta >> 9 & 0x7FFF)
+
+    def store(self, key, depth, flag, score, move):
+        index = ((key & self.mask) + 1) * 2
+        old = self.words[index + 1]
+        if old:
+            old_meta = old >> 32
+            old_key = self.words[index] ^ old
+            # depth preferred replacement, but anything from an older search may go
+            if old_key != key and old_meta >> 24 == self.generation and depth < (old_meta & 127):
+                return
+        meta = min(depth, MAX_DEPTH) | flag << 7 | encode_move(move) << 9 | self.generation << 24
+        data = int.from_bytes(_DATA.pack(to_centipawns(score), meta), "little")
+        # two separate writes, a reader in between sees a mismatching XOR and misses
+        self.words[index] = (key ^ data) & MASK_64
+        self.words[index + 1] = data
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def reused_rate(self):
+        return self.reused_hits / self.probes if self.probes else 0.0
+
+    # detach this process (the owner also frees the memory)
+    def close(self):
+        self.words.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
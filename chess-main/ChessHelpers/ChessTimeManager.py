@@ -0,0 +1,127 @@
+# Chess Time Manager
+#
+# Decides how long the engine thinks about a move in a game with a clock. The runner
+# (GUI, server, blitz_match.py) tells the engine its remaining time and increment before
+# every move with set_clock, and the engine turns that into two budgets:
+#
+#   soft: what a move should normally take, about remaining / MOVES_LEFT plus most of the
+#         increment. It is checked between iterations of the iterative deepening search.
+#   hard: what a move may never exceed (a share of the remaining time), enforced inside
+#         the search like the level time budgets.
+#
+# Between iterations the soft budget is scaled by how the search is going:
+#
+#   - the best move changed in the last iteration: the position is unclear, think longer
+#   - the score dropped compared to the previous iteration: something went wrong, think longer
+#   - the best move stayed the same for several iterations: it is probably right, stop sooner
+#
+# and a new iteration is only started if it is likely to finish within the budget (every
+# iteration takes a few times longer than the previous one). A move with a single legal
+# reply is played without searching.
+#
+# GameClock is the chess clock used by the runners: remaining time per side, the
+# increment added after every move, and which side ran out of time.
+
+from time import perf_counter
+
+import chess
+
+MOVE_OVERHEAD = 0.05  # seconds lost per move outside the search (process start, GUI, network)
+MOVES_LEFT = 30  # the remaining time is spread over this many moves when there are no moves to go
+HARD_SHARE = 0.3  # a single move never uses more than this share of the remaining time
+HARD_FACTOR = 4  # or more than this many soft budgets
+MIN_BUDGET = 0.01
+SCORE_DROP = 0.5  # pawns: a drop this large between iterations extends the budget
+STABLE_ITERATIONS = 3  # iterations with the same best move before the budget shrinks
+NEXT_ITERATION = 0.5  # start another iteration only before this share of the budget is used
+
+
+class TimeManager:
+    def __init__(self, remaining, increment=0.0, moves_to_go=None):
+        available = max(0.0, remaining - MOVE_OVERHEAD)
+        moves = moves_to_go if moves_to_go else MOVES_LEFT
+        # with moves to go, the last move before the time control may use everything left
+        self.hard = max(MIN_BUDGET, min(available * (1.0 if moves == 1 else HARD_SHARE),
+                                        (available / moves + increment) * HARD_FACTOR))
+        self.soft = max(MIN_BUDGET, min(self.hard, available / moves + increment * 0.75))
+        self.best_move = None
+        self.best_score = None
+        self.stable = 0
+        self.factor = 1.0
+
+    # called after every completed iteration with its best move and score, returns
+    # True if the search should stop instead of starting the next iteration
+    def should_stop(self, move, score, elapsed):
+        factor = 1.0
+        if self.best_move is not None and move != self.best_move:
+            self.stable = 0
+            factor *= 1.5
+        else:
+            self.stable += 1
+        if self.best_score is not None and score < self.best_score - SCORE_DROP:
+            factor *= 2.0
+        if self.stable >= STABLE_ITERATIONS:
+            factor *= 0.5
+        self.best_move = move
+        self.best_score = score
+        self.factor = factor
+        return elapsed >= self.budget() * NEXT_ITERATION
+
+    # the soft budget after the adjustments of the last iteration
+    def budget(self):
+        return min(self.hard, self.soft * self.factor)
+
+
+class GameClock:
+    def __init__(self, initial, increment=0.0):
+        self.remaining = {chess.WHITE: float(initial), chess.BLACK: float(initial)}
+        self.increment = float(increment)
+        self.running = None  # the side whose clock is running
+        self.started = None
+        self.flagged = None  # the side which ran out of time
+
+    def start(self, color):
+        self.running = color
+        self.started = perf_counter()
+
+    # remaining seconds of a side, counting the running move
+    def left(self, color):
+        remaining = self.remaining[color]
+        if color == self.running:
+            remaining -= perf_counter() - self.started
+        return remaining
+
+    # the running side finished its move: charge the time, add the increment
+    # (not if the flag fell first), returns the seconds the move took
+    def press(self):
+        color = self.running
+        elapsed = perf_counter() - self.started
+        self.remaining[color] -= elapsed
+        if self.remaining[color] <= 0:
+            self.remaining[color] = 0.0
+            self.flagged = color
+        else:
+            self.remaining[color] += self.increment
+        self.running = None
+        return elapsed
+
+    # checks the running side's flag without stopping its clock
+    def check_flag(self):
+        if self.running is not None and self.left(self.running) <= 0:
+            self.flagged = self.running
+        return self.flagged
+
+    @staticmethod
+    def format(seconds):
+        seconds = max(0.0, seconds)
+        if seconds < 20:
+            return "%d:%04.1f" % (seconds // 60, seconds % 60)
+        return "%d:%02d" % (seconds // 60, seconds % 60)
+
+
+# tells a move generator function's engine the remaining time before its move, if the
+# engine has a time manager (the move generators are bound methods, e.g. mini_max_move)
+def set_engine_clock(player, remaining, increment, moves_to_go=None):
+    engine = getattr(player, "__self__", None)
+    if hasattr(engine, "set_clock"):
+        engine.set_clock(remaining, increment, moves_to_go)
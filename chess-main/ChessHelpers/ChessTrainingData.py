@@ -0,0 +1,197 @@
+# Chess Training Data
+#
+# A compact binary file of training positions written by selfplay.py: every position of
+# a self-play game with the engine's score, its best move and how the game ended, for
+# tuning or training evaluations on millions of positions.
+#
+#   writer = TrainingDataWriter("selfplay.data")
+#   writer.append_game(records)          # packed with pack_record, once the result is known
+#   writer.close()
+#
+#   data = load_records("selfplay.data")  # numpy structured array, memory mapped
+#   data["score"].mean(), decode_board(data[0])
+#
+# The file is a 16 byte header followed by fixed size 40 byte records:
+#
+#   board     32 bytes, a nibble per square (a1, b1, ... h8, low nibble first): 0 empty,
+#             1-6 white pawn to king, 9-14 black pawn to king
+#   turn      1 byte, 1 = white to move
+#   castling  1 byte, bits 1/2/4/8 = white king side, white queen side, black king side, black queen side
+#   ep        1 byte, en passant square or 64 for none
+#   score     int16, search score in centipawns for the side to move, mates are +-(MATE - plies)
+#   move      uint16, best move packed like the shared table (see ChessSharedTable.encode_move)
+#   result    int8, the game's result for the side to move: 1 won, 0 drawn, -1 lost
+#
+# The halfmove clock and move number are not stored. Records are only appended: a game's
+# records are written together once it is finished, through a buffered file which is
+# flushed and fsynced every SYNC_EVERY records. A crash can only lose the last records
+# or leave a partial one at the end, which is cut off when the file is opened again.
+#
+# Writing only needs python-chess, reading the file as an array needs numpy.
+
+import os
+import struct
+from time import perf_counter
+
+import chess
+from ChessHelpers.ChessSharedTable import encode_move, decode_move
+
+MAGIC = b"CHESSTD1"
+HEADER = struct.Struct("<8sQ")  # magic, record size
+RECORD = struct.Struct("<32sBBBhHb")  # board, turn, castling, ep, score, move, result
+MATE = 32000  # centipawns of a mate on the board, mate in n plies is MATE - n
+CHECKMATE = 1000  # MoveGenerator.CHECKMATE
+MAX_PLY = 64  # ChessEngineHelper.MAX_PLY
+SYNC_EVERY = 4096  # records
+SYNC_INTERVAL = 10.0  # seconds, at least once this often while games are coming in
+BUFFER_SIZE = 1 << 20
+
+CASTLING = [(chess.BB_H1, 1), (chess.BB_A1, 2), (chess.BB_H8, 4), (chess.BB_A8, 8)]
+RESULTS = {"1-0": 1, "0-1": -1, "1/2-1/2": 0}
+
+# numpy dtype of a record, the same layout as RECORD (no alignment padding)
+DTYPE = [("board", "u1", (32,)), ("turn", "u1"), ("castling", "u1"), ("ep", "u1"),
+         ("score", "<i2"), ("move", "<u2"), ("result", "i1")]
+
+
+'''
+Packing
+'''
+
+
+def pack_board(board):
+    nibbles = bytearray(32)
+    for square, piece in board.piece_map().items():
+        code = piece.piece_type | (0 if piece.color == chess.WHITE else 8)
+        nibbles[square >> 1] |= code << (4 * (square & 1))
+    return bytes(nibbles)
+
+
+# search score in pawns (CHECKMATE - plies for mates) to int16 centipawns
+def pack_score(score):
+    if abs(score) > CHECKMATE - MAX_PLY:
+        plies = int(round(CHECKMATE - abs(score)))
+        return MATE - plies if score > 0 else -MATE + plies
+    return max(-MATE + MAX_PLY + 1, min(MATE - MAX_PLY - 1, int(round(score * 100))))
+
+
+# one record; the result (for white: 1, 0 or -1) is usually filled in by with_result
+# after the game is over
+def pack_record(board, score, move, result=0):
+    castling = 0
+    for mask, bit in CASTLING:
+        if board.castling_rights & mask:
+            castling |= bit
+    ep = 64 if board.ep_square is None else board.ep_square
+    result = result if board.turn == chess.WHITE else -result
+    return RECORD.pack(pack_board(board), int(board.turn), castling, ep, pack_score(score),
+                       encode_move(move), result)
+
+
+# a packed record with the game's result (for white) filled in
+def with_result(record, result):
+    turn = record[32]
+    return record[:-1] + struct.pack("b", result if turn else -result)
+
+
+'''
+Unpacking (works on packed bytes and on rows of the numpy array)
+'''
+
+
+def decode_board(record):
+    if isinstance(record, (bytes, bytearray)):
+        nibbles, turn, castling, ep, _, _, _ = RECORD.unpack(record)
+    else:
+        nibbles, turn, castling, ep = bytes(record["board"]), record["turn"], record["castling"], record["ep"]
+    board = chess.Board(None)
+    for square in range(64):
+        code = nibbles[square >> 1] >> (4 * (square & 1)) & 15
+        if code:
+            board.set_piece_at(square, chess.Piece(code & 7, chess.WHITE if code < 8 else chess.BLACK))
+    board.turn = bool(turn)
+    rights = 0
+    for mask, bit in CASTLING:
+        if castling & bit:
+            rights |= mask
+    board.castling_rights = rights
+    board.ep_square = None if ep == 64 else int(ep)
+    return board
+
+
+def decode_score(score):
+    if abs(score) > MATE - MAX_PLY:
+        plies = MATE - abs(score)
+        return CHECKMATE - plies if score > 0 else -CHECKMATE + plies
+    return score / 100
+
+
+def decode_best_move(record):
+    move = RECORD.unpack(record)[5] if isinstance(record, (bytes, bytearray)) else record["move"]
+    return decode_move(int(move))
+
+
+'''
+Files
+'''
+
+
+def count_records(path):
+    if not os.path.exists(path):
+        return 0
+    return max(0, os.path.getsize(path) - HEADER.size) // RECORD.size
+
+
+# the records of a file as a read only numpy structured array, memory mapped so it can
+# be larger than RAM (a partial record at the end is ignored)
+def load_records(path):
+    import numpy as np
+    with open(path, "rb") as f:
+        magic, size = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or size != RECORD.size:
+        raise ValueError("%s is not a training data file" % path)
+    count = count_records(path)
+    if count == 0:
+        return np.zeros(0, dtype=DTYPE)
+    return np.memmap(path, dtype=DTYPE, mode="r", offset=HEADER.size, shape=(count,))
+
+
+class TrainingDataWriter:
+    def __init__(self, path, sync_every=SYNC_EVERY):
+        self.path = path
+        self.sync_every = sync_every
+        if not os.path.exists(path) or os.path.getsize(path) < HEADER.size:
+            with open(path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, RECORD.size))
+        else:
+            with open(path, "r+b") as f:
+                magic, size = HEADER.unpack(f.read(HEADER.size))
+                if magic != MAGIC or size != RECORD.size:
+                    raise ValueError("%s is not a training data file" % path)
+                # drop a record that was only partly written before a crash
+                f.truncate(HEADER.size + count_records(path) * RECORD.size)
+        self.file = open(path, "ab", buffering=BUFFER_SIZE)
+        self.records = count_records(path)
+        self.unsynced = 0
+        self.last_sync = perf_counter()
+
+    def append_game(self, records):
+        for record in records:
+            self.file.write(record)
+        self.records += len(records)
+        self.unsynced += len(records)
+        if self.unsynced >= self.sync_every or perf_counter() - self.last_sync >= SYNC_INTERVAL:
+            self.sync()
+
+    # make everything appended so far durable
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = perf_counter()
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
@@ -0,0 +1,79 @@
+# Chess Transposition Table
+#
+# A fixed size table of search results, indexed by the zobrist hash of the position.
+# It is kept by the MoveGenerator for a whole game, so the search for the next move
+# starts with everything learned while searching the previous ones.
+#
+# Instead of clearing the table between moves every entry remembers the "generation"
+# (search number) that stored it. When two positions compete for a slot, entries from
+# older searches are replaced first, then shallower ones, so the table never fills up
+# with stale results while deep recent results survive.
+#
+# Scores are kept in centipawns (see to_centipawns), the resolution the packed entries
+# of the SharedTranspositionTable can hold, so both tables return identical scores.
+
+DEFAULT_SIZE = 1 << 18  # entries, must be a power of two
+
+# entry flags: is the stored score exact, or only a bound?
+EXACT = 0
+LOWER_BOUND = 1  # the search failed high, the real score is at least this
+UPPER_BOUND = 2  # the search failed low, the real score is at most this
+
+SCORE_SCALE = 100  # stored scores are in 1/100 pawn
+
+
+def to_centipawns(score):
+    return int(round(score * SCORE_SCALE))
+
+
+def from_centipawns(centipawns):
+    return centipawns / SCORE_SCALE
+
+
+class TranspositionTable:
+    def __init__(self, size=DEFAULT_SIZE):
+        if size & (size - 1):
+            raise ValueError("transposition table size must be a power of two")
+        self.size = size
+        self.mask = size - 1
+        self.entries = [None] * size  # (key, depth, flag, score, move, generation)
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.reused_hits = 0  # hits on entries stored by an earlier search
+
+    # call at the start of every search
+    def new_search(self):
+        self.generation = (self.generation + 1) & 0xFF
+        self.probes = 0
+        self.hits = 0
+        self.reused_hits = 0
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.generation = 0
+
+    # returns (depth, flag, score, move) or None
+    def probe(self, key):
+        self.probes += 1
+        entry = self.entries[key & self.mask]
+        if entry is None or entry[0] != key:
+            return None
+        self.hits += 1
+        if entry[5] != self.generation:
+            self.reused_hits += 1
+        return entry[1], entry[2], entry[3], entry[4]
+
+    def store(self, key, depth, flag, score, move):
+        index = key & self.mask
+        old = self.entries[index]
+        # depth preferred replacement, but anything from an older search may go
+        if old is None or old[0] == key or old[5] != self.generation or depth >= old[1]:
+            self.entries[index] = (key, depth, flag, from_centipawns(to_centipawns(score)), move, self.generation)
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    # fraction of the probes answered by entries from earlier moves of the game
+    def reused_rate(self):
+        return self.reused_hits / self.probes if self.probes else 0.0
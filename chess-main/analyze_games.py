@@ -0,0 +1,334 @@
+# Chess Program
+#
+# Annotates game archives with engine evaluations, without loading them into memory:
+#
+# > python analyze_games.py games.pgn annotated.pgn --depth 4 --workers 4
+# > python analyze_games.py chess_moves.txt evals.jsonl --format jsonl --time 0.5
+# > python analyze_games.py positions.epd evals.epd
+#
+# Games are read one at a time from a PGN (or positions from an EPD file), every
+# position is sent to a pool of worker processes running our MoveGenerator (or only the
+# static heuristic with --depth 0), and the annotated games are written in input order
+# as soon as all their positions are done. Only a bounded window of games is in flight,
+# so memory stays constant however large the input is.
+#
+# Positions repeat a lot between games (openings above all), so results are remembered
+# by zobrist hash (up to --cache results) and a repeated position is never searched twice.
+#
+# Progress is checkpointed next to the output file (<output>.checkpoint): an interrupted
+# run started again with the same arguments continues after the last finished game.
+
+import os
+import sys
+import json
+import argparse
+import concurrent.futures
+from collections import OrderedDict, deque
+from time import perf_counter
+
+import chess
+import chess.pgn
+import chess.polyglot
+from ChessHelpers.ChessEngineHelper import MoveGenerator, MAX_PLY
+from ChessHelpers.ChessHeuristics import LeafContext
+
+CHECKMATE = 1000  # MoveGenerator.CHECKMATE
+CHECKPOINT_EVERY = 20  # games
+REPORT_EVERY = 5.0  # seconds
+
+_generator = None
+
+
+def init_worker(level, depth, time):
+    global _generator
+    _generator = MoveGenerator(level)
+    _generator.DEPTH = depth
+    _generator.TIME_LIMIT = time
+    _generator.NODE_LIMIT = None
+
+
+def evaluate_position(fen):
+    """ Runs in a worker: returns (score for white, best move, pv, depth, busy seconds) """
+    start = perf_counter()
+    board = chess.Board(fen)
+    white = 1 if board.turn == chess.WHITE else -1
+    if _generator.DEPTH == 0:
+        leaf = LeafContext(0, any(board.generate_legal_moves()), board.is_check())
+        return white * _generator.evaluate(board, leaf), None, [], 0, perf_counter() - start
+
+    lines = _generator.analyze(board, 1, depth=_generator.DEPTH, time=_generator.TIME_LIMIT)
+    if not lines:
+        # no legal moves: checkmated or stalemate
+        score = -_generator.CHECKMATE if board.is_check() else _generator.STALEMATE
+        return white * score, None, [], 0, perf_counter() - start
+    line = lines[0]
+    return (white * line.score, line.move.uci(), [m.uci() for m in line.pv], line.depth,
+            perf_counter() - start)
+
+
+# mate scores are CHECKMATE - plies to mate, returns moves to mate (negative: black mates)
+def mate_in(score):
+    distance = CHECKMATE - abs(score)
+    if distance > MAX_PLY:
+        return None
+    moves = (int(round(distance)) + 1) // 2
+    return moves if score > 0 else -moves
+
+
+'''
+Readers: yield (game, file offset after the game) one at a time, a game is
+(headers, [(fen, move played or None)], pgn game object or None). A PGN game lists
+every position of its mainline, the final one (with no move) included
+'''
+
+
+def read_pgn(handle):
+    while True:
+        game = chess.pgn.read_game(handle)
+        if game is None:
+            return
+        board = game.board()
+        positions = []
+        for move in game.mainline_moves():
+            positions.append((board.fen(), move))
+            board.push(move)
+        positions.append((board.fen(), None))
+        yield (dict(game.headers), positions, game), handle.tell()
+
+
+def read_epd(handle):
+    while True:
+        line = handle.readline()
+        if not line:
+            return
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        board, operations = chess.Board.from_epd(line)
+        yield (operations, [(board.fen(), None)], None), handle.tell()
+
+
+'''
+Writers: one output record per game
+'''
+
+
+def format_eval(score):
+    mate = mate_in(score)
+    if mate is not None:
+        return "#%d" % mate
+    return "%.2f" % score
+
+
+def pgn_comment(node, comment):
+    node.comment = (node.comment + " " + comment).strip()
+
+
+# results[i] is the evaluation of the position before the i-th move (the last one is of the
+# final position). PGN readers take the [%eval] after a move for the position the move leads
+# to, so a move gets the next position's evaluation, plus "best" when the engine would have
+# played another move. The starting position's evaluation goes in the game comment
+def write_pgn(out, game, results):
+    _, _, pgn_game = game
+    node = pgn_game
+    score, _, _, depth, _ = results[0]
+    pgn_comment(node, "[%%eval %s] d%d" % (format_eval(score), depth))
+    for before, after in zip(results, results[1:]):
+        node = node.variations[0]
+        score, _, _, depth, _ = after
+        comment = "[%%eval %s] d%d" % (format_eval(score), depth)
+        best = before[1]
+        if best is not None and best != node.move.uci():
+            comment += " best %s" % best
+        pgn_comment(node, comment)
+    out.write(str(pgn_game) + "\n\n")
+
+
+def write_epd(out, game, results):
+    operations, positions, _ = game
+    board = chess.Board(positions[0][0])
+    score, best, _, depth, _ = results[0]
+    operations = dict(operations)
+    white = 1 if board.turn == chess.WHITE else -1
+    # ce is from the side to move's point of view, in centipawns
+    operations["ce"] = int(round(white * score * 100))
+    operations["acd"] = depth
+    mate = mate_in(score)
+    if mate is not None:
+        operations["dm"] = abs(mate)
+    if best is not None:
+        operations["bm"] = [chess.Move.from_uci(best)]
+    out.write(board.epd(**operations) + "\n")
+
+
+def write_jsonl(out, game, results, index):
+    headers, positions, _ = game
+    record = {"game": index, "headers": headers if game[2] is not None else {}, "positions": []}
+    for (fen, move), (score, best, pv, depth, _) in zip(positions, results):
+        record["positions"].append({
+            "fen": fen, "move": move.uci() if move else None,
+            "eval": score, "mate": mate_in(score), "best": best, "pv": pv, "depth": depth})
+    out.write(json.dumps(record) + "\n")
+
+
+'''
+Checkpoints: how many games are finished, where the input continues and how long the
+output is, written atomically so a crash never leaves a half written checkpoint
+'''
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_checkpoint(path, games, input_offset, output_size):
+    with open(path + ".tmp", "w") as f:
+        json.dump({"games": games, "input_offset": input_offset, "output_size": output_size}, f)
+    os.replace(path + ".tmp", path)
+
+
+class ResultCache:
+    # most recently used results by zobrist hash, bounded so memory stays constant
+    def __init__(self, size):
+        self.size = size
+        self.results = OrderedDict()
+
+    def get(self, key):
+        result = self.results.get(key)
+        if result is not None:
+            self.results.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self.results[key] = result
+        self.results.move_to_end(key)
+        if len(self.results) > self.size:
+            self.results.popitem(last=False)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Annotate PGN/EPD files with engine evaluations")
+    parser.add_argument("input", help="PGN (or movetext like chess_moves.txt) or EPD file")
+    parser.add_argument("output")
+    parser.add_argument("--format", choices=["pgn", "epd", "jsonl"],
+                        help="output format (default: same as the input, jsonl for other inputs)")
+    parser.add_argument("--level", default="medium", help="difficulty level for the heuristic")
+    parser.add_argument("--depth", type=int, default=3, help="search depth, 0 = static evaluation only")
+    parser.add_argument("--time", type=float, default=None, help="seconds per position (overrides depth)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--window", type=int, default=64, help="games in flight at most")
+    parser.add_argument("--cache", type=int, default=100000, help="positions remembered for deduplication")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    epd_input = args.input.lower().endswith(".epd")
+    output_format = args.format or ("epd" if epd_input else "pgn" if args.output.lower().endswith(".pgn") else "jsonl")
+    if output_format == "pgn" and epd_input or output_format == "epd" and not epd_input:
+        sys.exit("%s output needs %s input" % (output_format, output_format))
+    depth = args.depth if args.time is None else MAX_PLY - 1
+
+    checkpoint_path = args.output + ".checkpoint"
+    checkpoint = None if args.restart else load_checkpoint(checkpoint_path)
+    handle = open(args.input, encoding="utf-8-sig", errors="replace")
+    out = open(args.output, "r+" if checkpoint and os.path.exists(args.output) else "w", encoding="utf-8")
+    games_done = 0
+    if checkpoint:
+        # continue where the last run stopped: drop output written after the checkpoint
+        games_done = checkpoint["games"]
+        handle.seek(checkpoint["input_offset"])
+        out.truncate(checkpoint["output_size"])
+        out.seek(checkpoint["output_size"])
+        print("resuming after %d games" % games_done, file=sys.stderr)
+
+    reader = read_epd(handle) if epd_input else read_pgn(handle)
+    cache = ResultCache(args.cache)
+    waiting = {}  # zobrist key -> future of a position being searched
+    window = deque()  # games in input order: (index, game, offset, [future or result])
+    counts = {"positions": 0, "searched": 0, "duplicates": 0, "busy": 0.0}
+    start = last_report = perf_counter()
+
+    def submit(pool, fen):
+        key = chess.polyglot.zobrist_hash(chess.Board(fen))
+        result = cache.get(key)
+        future = result if result is not None else waiting.get(key)
+        if future is not None:
+            counts["duplicates"] += 1
+        else:
+            future = pool.submit(evaluate_position, fen)
+            waiting[key] = future
+            future.key = key
+            counts["searched"] += 1
+        return future
+
+    def resolve(item):
+        if not isinstance(item, concurrent.futures.Future):
+            return item
+        result = item.result()
+        if waiting.get(item.key) is item:
+            del waiting[item.key]
+            cache.put(item.key, result)
+            counts["busy"] += result[4]
+        return result
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                                initargs=(args.level, depth, args.time)) as pool:
+        index = games_done
+        finished = False
+        while not finished or window:
+            # keep the window full
+            while not finished and len(window) < args.window:
+                try:
+                    game, offset = next(reader)
+                except StopIteration:
+                    finished = True
+                    break
+                window.append((index, game, offset, [submit(pool, fen) for fen, _ in game[1]]))
+                index += 1
+            if not window:
+                break
+
+            # write the oldest game once all its positions are done
+            game_index, game, offset, items = window.popleft()
+            results = [resolve(item) for item in items]
+            if output_format == "pgn":
+                write_pgn(out, game, results)
+            elif output_format == "epd":
+                write_epd(out, game, results)
+            else:
+                write_jsonl(out, game, results, game_index)
+            counts["positions"] += len(results)
+            games_done += 1
+            if games_done % CHECKPOINT_EVERY == 0:
+                out.flush()
+                save_checkpoint(checkpoint_path, games_done, offset, out.tell())
+
+            now = perf_counter()
+            if now - last_report > REPORT_EVERY:
+                last_report = now
+                report(games_done, counts, now - start, args.workers)
+
+    out.close()
+    handle.close()
+    report(games_done, counts, perf_counter() - start, args.workers)
+    # the whole input is done, a new run starts from scratch
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+
+def report(games, counts, elapsed, workers):
+    # utilization: the share of the workers' time spent searching
+    print("%d games, %d positions (%d searched, %d duplicates), %.1f positions/s, worker utilization %.0f%%" %
+          (games, counts["positions"], counts["searched"], counts["duplicates"],
+           counts["positions"] / max(elapsed, 1e-9), 100 * counts["busy"] / max(elapsed * workers, 1e-9)),
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
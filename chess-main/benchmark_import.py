@@ -0,0 +1,50 @@
+# Chess Program
+#
+# Measures the cold start time of a worker process: how long a fresh python
+# interpreter takes to import the engine, compared to an empty interpreter.
+# The engine must import without pygame (no window, works on headless servers).
+#
+# > python benchmark_import.py [runs]
+#
+
+import sys
+import subprocess
+from time import perf_counter
+
+MODULES = [
+    "ChessHelpers.ChessEngineHelper",
+    "ChessHelpers.ChessServer",
+    "interface.gui",
+]
+
+
+def cold_start(code, runs):
+    times = []
+    for _ in range(runs):
+        start = perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, stdout=subprocess.DEVNULL)
+        times.append(perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    baseline = cold_start("pass", runs)
+    print("%-34s %7.1f ms" % ("python (no imports)", baseline * 1000))
+    for module in MODULES:
+        try:
+            median = cold_start("import " + module, runs)
+        except subprocess.CalledProcessError as e:
+            print("%-34s failed (%s)" % (module, e))
+            continue
+        # also report whether the import dragged pygame in
+        check = "import sys, %s; sys.exit(2 if 'pygame' in sys.modules else 0)" % module
+        uses_pygame = subprocess.run([sys.executable, "-c", check], stdout=subprocess.DEVNULL).returncode == 2
+        print("%-34s %7.1f ms  (+%.1f ms)%s" % (module, median * 1000, (median - baseline) * 1000,
+                                              "  imports pygame" if uses_pygame else ""))
+
+
+if __name__ == '__main__':
+    main()
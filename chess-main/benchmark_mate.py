@@ -0,0 +1,57 @@
+# Chess Program
+#
+# Compares the mate solver (ChessHelpers/ChessMateSolver.py, proof-number search over
+# checks) with the alpha-beta search of MoveGenerator.analyze at the same depth, on
+# mate puzzles. Alpha-beta gets at most `time` seconds per puzzle.
+#
+# > python benchmark_mate.py [time]
+#
+
+import sys
+from time import perf_counter
+
+import chess
+from ChessHelpers.ChessEngineHelper import MoveGenerator, MAX_PLY
+from ChessHelpers.ChessMateSolver import MateSolver
+
+# (FEN, plies of the mate)
+PUZZLES = [
+    ("r2qkb1r/pp2nppp/3p4/2pNN1B1/2BnP3/3P4/PPP2PPP/R2bK2R w KQkq - 1 1", 3),
+    ("5rk1/1p1q2bp/p2pN1p1/2pP2Bn/2P3P1/1P6/P4QKP/5R2 w - - 1 1", 3),
+    ("r1b1kb1r/pppp1ppp/5q2/4n3/3KP3/2N3PN/PPP4P/R1BQ1B1R b kq - 0 1", 5),
+    ("6rk/p1pb1p1p/2pp1P2/2b1n2Q/4PR2/3B4/PPP1K2P/RNB3q1 w - - 0 1", 5),
+    ("r2qrb2/p1pn1Qp1/1p4Nk/4PR2/3n4/7N/P5PP/R6K w - - 1 1", 5),
+    ("1q1r3k/6pp/8/4N3/2Q5/8/6PP/6K1 w - - 0 1", 7),
+    ("r1bqr3/ppp1B1kp/1b4p1/n2B4/3PQ1P1/2P5/P4P2/RN4K1 w - - 1 1", 7),
+    ("2q1nk1r/4Rp2/1ppp1P2/6Pp/3p1B2/3P3P/PPP1Q3/6K1 w - - 0 1", 9),
+    ("8/8/8/8/4k3/8/8/QR4K1 w - - 0 1", 9),
+    ("8/8/8/8/6k1/8/8/QR4K1 w - - 0 1", 9),
+]
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+    print("%-8s %22s %30s" % ("mate in", "proof-number search", "alpha-beta"))
+    for fen, plies in PUZZLES:
+        board = chess.Board(fen)
+        solver = MateSolver()
+        start = perf_counter()
+        line = solver.find_mate(board, plies)
+        solver_time = perf_counter() - start
+        if line is None or len(line) != plies:
+            print("%s: expected a mate in %d plies, found %s" % (fen, plies, line))
+            continue
+
+        generator = MoveGenerator()
+        start = perf_counter()
+        lines = generator.analyze(board, depth=plies, time=budget)
+        search_time = perf_counter() - start
+        # the search only reports a mate if it finished the full depth in time
+        found = lines and generator.stats["depth"] >= plies and lines[0].score >= generator.CHECKMATE - MAX_PLY
+        print("%-8d %7d nodes %7.3fs %10d nodes %7.2fs %s" % (
+            (plies + 1) // 2, solver.nodes, solver_time, generator.stats["nodes"], search_time,
+            "%.0fx" % (search_time / max(solver_time, 1e-6)) if found else "(no mate after depth %d)" % generator.stats["depth"]))
+
+
+if __name__ == '__main__':
+    main()
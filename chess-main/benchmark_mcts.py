@@ -0,0 +1,62 @@
+# Chess Program
+#
+# Measures how the playouts per second of the MCTS move generator (ChessHelpers/ChessMCTS.py)
+# scale with the number of worker processes, for leaves scored directly and for leaves
+# scored after a short random playout. Every run searches the same positions for a
+# fixed time with a fresh tree.
+#
+# > python benchmark_mcts.py [seconds per position] [max workers]
+#
+
+import os
+import sys
+
+import chess
+from ChessHelpers.ChessMCTS import MCTSGenerator
+
+POSITIONS = [
+    chess.STARTING_FEN,
+    "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+    "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP3PPP/R2QKB1R w KQ - 0 8",
+    "8/5pk1/6p1/8/3R4/6PP/r4P1K/8 w - - 0 40",
+]
+
+
+def rate(workers, rollout, seconds):
+    generator = MCTSGenerator(playouts=None, time=seconds, workers=workers, rollout=rollout)
+    playouts = elapsed = 0
+    try:
+        # the first search also starts the worker processes, don't count it
+        generator.analyze(chess.Board(), time=min(seconds, 1.0))
+        for fen in POSITIONS:
+            generator.new_game()
+            generator.analyze(chess.Board(fen))
+            playouts += generator.stats["playouts"]
+            elapsed += generator.stats["seconds"]
+    finally:
+        generator.close()
+    return playouts / elapsed
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    cores = os.cpu_count() or 1
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else cores
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+
+    print("%d cores" % cores)
+    for rollout in (0, 8):
+        print("rollout %d:" % rollout)
+        base = None
+        for workers in counts:
+            playouts = rate(workers, rollout, seconds)
+            base = base or playouts
+            print("  %2d workers %8.0f playouts/s  %.2fx" % (workers, playouts, playouts / base))
+
+
+if __name__ == '__main__':
+    main()
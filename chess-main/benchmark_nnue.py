@@ -0,0 +1,85 @@
+# Chess Program
+#
+# Benchmarks the NNUE evaluation (ChessHelpers/ChessNNUE.py, needs numpy):
+#
+#   1. evaluations per second when the accumulators are updated from the moves
+#      (incremental) and when they are added up again for every position (full refresh),
+#      on the leaves of a small search tree, in the order a search visits them
+#   2. nodes per second of a real search with the NNUE evaluation and with heuristic_2
+#
+# Without a weights file (CHESS_NNUE or ChessHelpers/nnue.npz) a material-only
+# network is built and written to ChessHelpers/nnue.npz first.
+#
+# > python benchmark_nnue.py [depth]
+#
+
+import os
+import sys
+from time import perf_counter
+
+import chess
+from ChessHelpers.ChessEngineHelper import MoveGenerator
+from ChessHelpers.ChessNNUE import Accumulators, load_network, material_network, DEFAULT_NETWORK, NNUE_ENV
+
+POSITIONS = [
+    chess.STARTING_FEN,
+    "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+    "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP3PPP/R2QKB1R w KQ - 0 8",
+    "8/5pk1/6p1/8/3R4/6PP/r4P1K/8 w - - 0 40",
+]
+
+
+# calls evaluate(board) on every leaf of a depth limited tree, returns the number of leaves
+def walk(board, depth, evaluate):
+    if depth == 0:
+        evaluate(board)
+        return 1
+    leaves = 0
+    for move in board.legal_moves:
+        board.push(move)
+        leaves += walk(board, depth - 1, evaluate)
+        board.pop()
+    return leaves
+
+
+def rate(name, evaluate, depth):
+    leaves = 0
+    start = perf_counter()
+    for fen in POSITIONS:
+        leaves += walk(chess.Board(fen), depth, evaluate)
+    elapsed = perf_counter() - start
+    print("%-24s %8d evaluations  %9.0f evaluations/s" % (name, leaves, leaves / elapsed))
+    return leaves / elapsed
+
+
+def search_rate(evaluation, depth):
+    generator = MoveGenerator()
+    generator.set_option("evaluation", evaluation)
+    nodes = 0
+    start = perf_counter()
+    for fen in POSITIONS:
+        generator.analyze(chess.Board(fen), depth=depth)
+        nodes += generator.stats["nodes"]
+    elapsed = perf_counter() - start
+    print("%-24s %8d nodes        %9.0f nodes/s" % ("search with " + evaluation, nodes, nodes / elapsed))
+
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    if not os.environ.get(NNUE_ENV) and not os.path.exists(DEFAULT_NETWORK):
+        print("no network found, writing a material-only network to %s" % DEFAULT_NETWORK)
+        material_network().save(DEFAULT_NETWORK)
+
+    network = load_network()
+    accumulators = Accumulators(network)
+    incremental = rate("incremental", accumulators.evaluate, depth)
+    full = rate("full refresh", network.evaluate_full, depth)
+    print("incremental updates are %.1fx faster (%d refreshes, %d updates)" %
+          (incremental / full, accumulators.refreshes, accumulators.updates))
+
+    search_rate("nnue", depth + 1)
+    search_rate("heuristic_2", depth + 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# Chess Program
+#
+# Compares search workers with private transposition tables against workers which
+# share one table in shared memory. Every worker plays through the same openings
+# (like concurrent games on a server), starting at a different one, so with a shared
+# table a worker often finds positions another worker has already searched.
+#
+# > python benchmark_shared_table.py [workers] [depth]
+#
+
+import sys
+import concurrent.futures
+from time import perf_counter
+
+import chess
+from ChessHelpers.ChessEngineHelper import MoveGenerator
+from ChessHelpers.ChessSharedTable import SharedTranspositionTable
+
+OPENINGS = [
+    "e2e4 e7e5 g1f3 b8c6",
+    "e2e4 c7c5 g1f3 d7d6",
+    "d2d4 d7d5 c2c4 e7e6",
+    "d2d4 g8f6 c2c4 g7g6",
+    "e2e4 e7e6 d2d4 d7d5",
+    "c2c4 e7e5 b1c3 g8f6",
+]
+
+_generator = None
+
+
+def init_worker(table_name, depth):
+    global _generator
+    table = SharedTranspositionTable(name=table_name) if table_name else None
+    _generator = MoveGenerator(table=table)
+    _generator.DEPTH = depth
+
+
+# search every position along one opening, returns (nodes, probes, hits)
+def search_opening(moves):
+    board = chess.Board()
+    nodes = probes = hits = 0
+    for uci in moves.split():
+        board.push_uci(uci)
+        _generator.analyze(board, 1, depth=_generator.DEPTH)
+        nodes += _generator.stats["nodes"]
+        probes += _generator.table.probes
+        hits += _generator.table.hits
+    return nodes, probes, hits
+
+
+def run(workers, depth, shared):
+    table = SharedTranspositionTable(create=True) if shared else None
+    # every worker goes through all openings, each starting at a different one
+    jobs = [OPENINGS[(w + i) % len(OPENINGS)] for i in range(len(OPENINGS)) for w in range(workers)]
+    start = perf_counter()
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, initializer=init_worker,
+                initargs=(table.name if table else None, depth)) as pool:
+            results = list(pool.map(search_opening, jobs))
+    finally:
+        if table:
+            table.close()
+    elapsed = perf_counter() - start
+    nodes = sum(r[0] for r in results)
+    probes = sum(r[1] for r in results)
+    hits = sum(r[2] for r in results)
+    return elapsed, nodes, hits / max(1, probes)
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    print("%d workers, depth %d, %d openings" % (workers, depth, len(OPENINGS)))
+    print("%-10s %9s %10s %9s" % ("table", "seconds", "nodes", "hit rate"))
+    baseline = None
+    for shared in (False, True):
+        elapsed, nodes, hit_rate = run(workers, depth, shared)
+        print("%-10s %9.2f %10d %8.1f%%" % ("shared" if shared else "private", elapsed, nodes, 100 * hit_rate))
+        if baseline is None:
+            baseline = nodes
+        else:
+            print("shared table searched %.0f%% fewer nodes" % (100 * (1 - nodes / baseline)))
+
+
+if __name__ == '__main__':
+    main()
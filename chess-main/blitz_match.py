@@ -0,0 +1,92 @@
+# Chess Program
+#
+# Plays engine vs engine games with a chess clock, without a window, to check the time
+# manager (ChessHelpers/ChessTimeManager.py): the engines should use their time without
+# ever losing on time. Reports the results, the flag losses, the average and longest
+# move, and the least time any engine had left.
+#
+# > python blitz_match.py [--games 4] [--time 60] [--increment 1] [--white alphabeta] [--black mcts]
+#
+# Engines: "alphabeta" (MoveGenerator, depth limited only by the clock), "mcts"
+# (MCTSGenerator) or a level name (easy, medium, hard).
+
+import argparse
+
+import chess
+from ChessHelpers.ChessEngineHelper import MoveGenerator
+from ChessHelpers.ChessLevels import LEVELS
+from ChessHelpers.ChessMCTS import MCTSGenerator
+from ChessHelpers.ChessTimeManager import GameClock, set_engine_clock
+
+OPENINGS = ["e2e4 e7e5", "d2d4 d7d5", "c2c4 e7e5", "e2e4 c7c5", "g1f3 g8f6"]
+MAX_PLIES = 300
+
+
+def create_engine(name):
+    if name == "mcts":
+        return MCTSGenerator().mcts_move
+    if name in LEVELS:
+        return MoveGenerator(name).mini_max_move
+    return MoveGenerator().mini_max_move
+
+
+def play_game(white, black, opening, initial, increment):
+    board = chess.Board()
+    for uci in opening.split():
+        board.push_uci(uci)
+    clock = GameClock(initial, increment)
+    moves = []
+    lowest = initial
+    while board.outcome() is None and board.ply() < MAX_PLIES:
+        player = white if board.turn == chess.WHITE else black
+        color = board.turn
+        clock.start(color)
+        set_engine_clock(player, clock.left(color), increment)
+        move = player(board)
+        moves.append(clock.press())
+        if clock.flagged is not None:
+            return ("0-1" if color == chess.WHITE else "1-0"), True, moves, 0.0
+        lowest = min(lowest, clock.remaining[color] - increment)
+        board.push(move)
+    outcome = board.outcome()
+    return (outcome.result() if outcome else "1/2-1/2"), False, moves, lowest
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Play timed engine games without a window")
+    parser.add_argument("--games", type=int, default=4)
+    parser.add_argument("--time", type=float, default=60, help="seconds per side")
+    parser.add_argument("--increment", type=float, default=1)
+    parser.add_argument("--white", default="alphabeta")
+    parser.add_argument("--black", default="alphabeta")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    score = 0.0
+    flags = 0
+    times = []
+    lowest = args.time
+    for i in range(args.games):
+        # alternate colors, each opening is played from both sides
+        first, second = (args.white, args.black) if i % 2 == 0 else (args.black, args.white)
+        opening = OPENINGS[(i // 2) % len(OPENINGS)]
+        result, flagged, moves, left = play_game(create_engine(first), create_engine(second),
+                                                 opening, args.time, args.increment)
+        points = {"1-0": 1.0, "0-1": 0.0}.get(result, 0.5)
+        score += points if i % 2 == 0 else 1 - points
+        flags += flagged
+        times.extend(moves)
+        lowest = min(lowest, left)
+        print("game %d: %s (white) - %s (black) %s%s, %d moves, average %.2fs, longest %.2fs" % (
+            i + 1, first, second, result, " on time" if flagged else "", len(moves),
+            sum(moves) / max(len(moves), 1), max(moves, default=0)))
+
+    print("\n%s %.1f - %.1f %s" % (args.white, score, args.games - score, args.black))
+    print("%d flag losses, average move %.2fs, longest move %.2fs, least time left %.2fs" % (
+        flags, sum(times) / max(len(times), 1), max(times, default=0), lowest))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,7 +6,10 @@ class Button():
 		self.font = font
 		self.base_color, self.hovering_color = base_color, hovering_color
 		self.text_input = text_input
-		self.text = self.font.render(self.text_input, True, self.base_color)
+		# render both states once, changeColor only swaps between them
+		self.base_text = self.font.render(self.text_input, True, self.base_color)
+		self.hovering_text = self.font.render(self.text_input, True, self.hovering_color)
+		self.text = self.base_text
 		if self.image is None:
 			self.image = self.text
 		self.rect = self.image.get_rect(center=(self.x_pos, self.y_pos))
@@ -22,8 +25,11 @@ class Button():
 			return True
 		return False
 
+	# returns True if the button needs to be redrawn
 	def changeColor(self, position):
-		if position[0] in range(self.rect.left, self.rect.right) and position[1] in range(self.rect.top, self.rect.bottom):
-			self.text = self.font.render(self.text_input, True, self.hovering_color)
+		old_text = self.text
+		if self.checkForInput(position):
+			self.text = self.hovering_text
 		else:
-			self.text = self.font.render(self.text_input, True, self.base_color)
\ No newline at end of file
+			self.text = self.base_text
+		return self.text is not old_text
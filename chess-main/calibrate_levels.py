@@ -0,0 +1,105 @@
+# Chess Program
+#
+# Calibrates the difficulty levels in ChessHelpers/ChessLevels.py:
+#
+#   1. searches a fixed set of positions with every level and reports the
+#      average nodes and the average/p90 time per move (for capacity planning)
+#   2. plays a small round robin between the levels and reports each level's score
+#
+# > python calibrate_levels.py [games per pairing]
+#
+
+import sys
+import itertools
+from time import perf_counter
+
+import chess
+from ChessHelpers.ChessEngineHelper import MoveGenerator
+from ChessHelpers.ChessLevels import LEVELS
+
+# a few typical positions: opening, middlegames, endgame
+POSITIONS = [
+    chess.STARTING_FEN,
+    "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+    "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP3PPP/R2QKB1R w KQ - 0 8",
+    "2r2rk1/pp1q1ppp/2n1pn2/3p4/3P4/P1NBPN2/1P3PPP/2RQ1RK1 b - - 0 14",
+    "8/5pk1/6p1/8/3R4/6PP/r4P1K/8 w - - 0 40",
+]
+
+# openings for the round robin, each one is played with both colors
+OPENINGS = ["e2e4 e7e5", "d2d4 d7d5", "c2c4 e7e5", "e2e4 c7c5", "g1f3 g8f6"]
+MAX_PLIES = 160
+
+
+def search(generator, board):
+    # same budgets as mini_max_move, but without the per move printout
+    lines = generator.analyze(board, multipv=1, depth=generator.DEPTH,
+                              time=generator.TIME_LIMIT, nodes=generator.NODE_LIMIT)
+    return lines[0].move if lines else generator.random_move(board)
+
+
+def measure_cost(name, level):
+    generator = MoveGenerator(level)
+    nodes = []
+    times = []
+    for fen in POSITIONS:
+        board = chess.Board(fen)
+        start = perf_counter()
+        search(generator, board)
+        times.append(perf_counter() - start)
+        nodes.append(generator.stats["nodes"])
+    times.sort()
+    p90 = times[min(len(times) - 1, int(0.9 * len(times)))]
+    print("%-8s avg nodes %8.0f   avg time %6.3fs   p90 time %6.3fs" %
+          (name, sum(nodes) / len(nodes), sum(times) / len(times), p90))
+
+
+def play_game(white, black, opening):
+    board = chess.Board()
+    for uci in opening.split():
+        board.push_uci(uci)
+    while board.outcome() is None and board.ply() < MAX_PLIES:
+        generator = white if board.turn == chess.WHITE else black
+        board.push(search(generator, board))
+    outcome = board.outcome()
+    if outcome is None or outcome.winner is None:
+        return 0.5
+    return 1.0 if outcome.winner == chess.WHITE else 0.0
+
+
+def round_robin(games):
+    scores = {name: 0.0 for name in LEVELS}
+    played = {name: 0 for name in LEVELS}
+    for a, b in itertools.combinations(LEVELS, 2):
+        result = 0.0
+        for i in range(games):
+            opening = OPENINGS[(i // 2) % len(OPENINGS)]
+            # alternate colors so neither level always gets white
+            if i % 2 == 0:
+                result += play_game(MoveGenerator(LEVELS[a]), MoveGenerator(LEVELS[b]), opening)
+            else:
+                result += 1 - play_game(MoveGenerator(LEVELS[b]), MoveGenerator(LEVELS[a]), opening)
+        print("%-8s vs %-8s %4.1f - %4.1f" % (a, b, result, games - result))
+        scores[a] += result
+        scores[b] += games - result
+        played[a] += games
+        played[b] += games
+
+    print()
+    for name in LEVELS:
+        print("%-8s %4.1f / %d (%.0f%%)" % (name, scores[name], played[name], 100 * scores[name] / played[name]))
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+
+    print("Cost per move:")
+    for name, level in LEVELS.items():
+        measure_cost(name, level)
+
+    print("\nStrength (%d games per pairing):" % games)
+    round_robin(games)
+
+
+if __name__ == '__main__':
+    main()
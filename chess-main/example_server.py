@@ -0,0 +1,28 @@
+# Chess Program
+#
+# Basic requirements:
+# > pip install python-chess
+#
+# Starts the headless game server on localhost. Connect with any TCP client
+# (e.g. `nc 127.0.0.1 8765`) and send one JSON command per line:
+#
+#   {"cmd": "new", "engine": "black", "clock": 300, "increment": 2}
+#   {"cmd": "move", "game": 1, "move": "e2e4"}
+#   {"cmd": "metrics"}
+#
+
+import asyncio
+from ChessHelpers.ChessServer import GameServer
+
+HOST = "127.0.0.1"
+PORT = 8765
+WORKERS = 4  # number of search processes shared by all games
+
+
+def main():
+    server = GameServer(workers=WORKERS)
+    asyncio.run(server.serve(HOST, PORT))
+
+
+if __name__ == '__main__':
+    main()
@@ -38,10 +38,11 @@ def main():
         #   the outcome of the game
         #
         # If you run this file as-is, our random move generator (white)
-        #   will play ten games against our greedy next best move algorithm (black)
+        #   will play ten games against our minimax algorithm (black)
+        #   (to watch many games at once, run watch_games.py)
         move_generator = ChessEngineHelper.MoveGenerator()
         outcome = play_chess(board, white=move_generator.random_move,
-                             black=move_generator.greedy_best_next_move)
+                             black=move_generator.mini_max_move)
         outcomes.append(outcome)
 
     # display all the game results
@@ -0,0 +1,50 @@
+# Chess Program
+#
+# Imports PGN files (or movetext like chess_moves.txt) into a binary game store
+# (see ChessHelpers/ChessGameStore.py), then shows the most played moves of the
+# starting position and how long looking them up took.
+#
+# > python import_games.py games games1.pgn [games2.pgn ...]
+#
+# Running it again with other files adds their games to the same store.
+#
+
+import sys
+from time import perf_counter
+
+import chess
+from ChessHelpers.ChessGameStore import GameStore, import_pgn
+
+
+def main():
+    if len(sys.argv) < 3:
+        sys.exit("usage: python import_games.py <store> <file.pgn> [more.pgn ...]")
+    path = sys.argv[1]
+
+    start = perf_counter()
+    handles = [open(name, encoding="utf-8-sig", errors="replace") for name in sys.argv[2:]]
+    try:
+        added, skipped = import_pgn(path, handles)
+    finally:
+        for handle in handles:
+            handle.close()
+    elapsed = perf_counter() - start
+
+    store = GameStore(path)
+    print("%d games imported (%d skipped) in %.1fs, %.0f games/s" %
+          (added, skipped, elapsed, added / max(elapsed, 1e-9)))
+    print("store: %d games, %d positions" % (len(store), store.entries))
+
+    board = chess.Board()
+    start = perf_counter()
+    stats = store.explore(board)
+    elapsed = perf_counter() - start
+    print("starting position, looked up in %.0f us:" % (elapsed * 1e6))
+    for move_stats in stats[:8]:
+        print("  %-6s %6d games   +%d =%d -%d" % (board.san(move_stats.move), move_stats.games,
+                                               move_stats.white_wins, move_stats.draws, move_stats.black_wins))
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
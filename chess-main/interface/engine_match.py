@@ -0,0 +1,148 @@
+# Engine Match
+#
+# Runs a game between two move generators on a worker thread, so the game is played
+# at the engines' own pace instead of one move per frame of the GUI. The GUI samples the
+# latest position at its own frame rate (see MatchScene in gui.py) and simply skips the
+# positions that came and went between two frames.
+#
+# The worker never shares the board it is playing on while an engine is thinking: the
+# engine searches a copy, and after every move the worker publishes a new MatchSnapshot
+# (the position, outcome, check and last moves). A snapshot is never changed after it is
+# published, so the renderer reads `latest` without any locking.
+#
+# Controls (thread safe, they take effect between two moves):
+#   pause / resume   stop playing after the current move
+#   step             play one move while paused
+#   fast             play the moves as fast as the engines can, otherwise every move
+#                    takes at least `move_delay` seconds so a person can follow the game
+#
+# While the match runs, the engines' event hook (ChessEngineHelper.set_event_hook) is the
+# match's stop flag: the engines don't run on the GUI thread, so they must not poll the
+# window's events, but they still give up their search at once when the match is stopped.
+
+import threading
+from time import perf_counter
+
+import chess
+from ChessHelpers import ChessEngineHelper
+from ChessHelpers.ChessTimeManager import set_engine_clock
+from interface.game_state import GameState
+
+MOVE_DELAY = 0.5  # seconds per move at normal speed
+
+
+class MatchSnapshot:
+    # what the GUI needs to draw a position, the same attributes draw_info reads from a GameState
+    def __init__(self, game, version):
+        self.version = version  # number of moves played in the match
+        self.board_fen = game.board.board_fen()
+        self.turn = game.board.turn
+        self.outcome = game.outcome
+        self.is_check = game.is_check
+        self.last_move_white = game.last_move_white
+        self.last_move_black = game.last_move_black
+
+    def is_over(self):
+        return self.outcome is not None
+
+
+class EngineMatch:
+    def __init__(self, board, white, black, clock=None, move_delay=MOVE_DELAY):
+        self.game = GameState(board)
+        self.players = {chess.WHITE: white, chess.BLACK: black}
+        self.clock = clock  # GameClock or None, only runs while an engine is thinking
+        self.move_delay = move_delay
+        self.paused = False
+        self.fast = False
+        self.steps = 0  # moves to play while paused
+        self.stopped = False
+        self.moves = 0
+        self.condition = threading.Condition()
+        self.latest = MatchSnapshot(self.game, 0)
+        self.thread = None
+        self.previous_hook = None
+
+    def start(self):
+        self.previous_hook = ChessEngineHelper._event_hook
+        ChessEngineHelper.set_event_hook(self.is_stopped)
+        self.thread = threading.Thread(target=self.run, name="engine match", daemon=True)
+        self.thread.start()
+
+    # stops the match (an engine in the middle of a search gives up) and waits for the worker
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+        if ChessEngineHelper._event_hook == self.is_stopped:
+            ChessEngineHelper.set_event_hook(self.previous_hook)
+
+    def is_stopped(self):
+        return self.stopped
+
+    '''
+    Controls
+    '''
+
+    def set_paused(self, paused):
+        with self.condition:
+            self.paused = paused
+            self.steps = 0
+            self.condition.notify_all()
+
+    def step(self):
+        with self.condition:
+            if self.paused:
+                self.steps += 1
+                self.condition.notify_all()
+
+    def set_fast(self, fast):
+        with self.condition:
+            self.fast = fast
+            self.condition.notify_all()
+
+    '''
+    Worker thread
+    '''
+
+    def run(self):
+        game = self.game
+        while not game.is_over():
+            with self.condition:
+                while self.paused and self.steps == 0 and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                stepping = self.paused
+                if stepping:
+                    self.steps -= 1
+
+            started = perf_counter()
+            color = game.board.turn
+            player = self.players[color]
+            if self.clock is not None:
+                self.clock.start(color)
+                # an engine with a time manager plans its move with the time it has left
+                set_engine_clock(player, self.clock.left(color), self.clock.increment)
+            # the engine searches a copy, the board itself only ever holds played moves
+            move = player(game.board.copy())
+            if move is False or self.stopped:
+                # the engine gave up its search because the match was stopped
+                return
+
+            with self.condition:
+                game.push(move)
+                if self.clock is not None:
+                    self.clock.press()
+                    if self.clock.flagged is not None:
+                        game.flag(self.clock.flagged)
+                self.moves += 1
+                self.latest = MatchSnapshot(game, self.moves)
+
+            # at normal speed, wait for the rest of the move's time (unless a move was
+            # stepped, or the speed or pause state changes while waiting)
+            with self.condition:
+                deadline = started + self.move_delay
+                while not (stepping or self.fast or self.paused or self.stopped) and perf_counter() < deadline:
+                    self.condition.wait(deadline - perf_counter())
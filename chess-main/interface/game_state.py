@@ -0,0 +1,92 @@
+# Game State
+#
+# Wraps the python-chess board used by the interfaces and caches everything the render
+# loop asks about the position. board.outcome() generates legal moves and replays the
+# move stack for repetition checks, so calling it every frame makes long games slower
+# to draw. Here it is computed once per ply, when a move is pushed, and the UI only
+# reads the cached values.
+#
+# The legal moves are also indexed by the square they start from: a bitmask of the
+# squares each piece can move to, plus the promotion choices for pawn moves. A dropped
+# piece is validated with a single bit test, and the same mask is used to highlight
+# where the dragged piece can go.
+
+import chess
+
+# termination of a game lost (or drawn) on time, python-chess has none for clocks
+TIME_FORFEIT = "TIME_FORFEIT"
+
+
+class GameState:
+    def __init__(self, board):
+        self.board = board
+        self.outcome = None
+        self.is_check = False
+        self.legal_moves = set()
+        self.targets = {}     # from square -> bitmask of legal destination squares
+        self.promotions = {}  # (from square, to square) -> legal promotion piece types
+        self.last_move_white = "None"
+        self.last_move_black = "None"
+        self.refresh()
+
+    def push(self, move):
+        self.board.push(move)
+        self.refresh()
+
+    def pop(self):
+        move = self.board.pop()
+        self.refresh()
+        return move
+
+    def is_over(self):
+        return self.outcome is not None
+
+    # `color` ran out of time: the game is lost, unless the opponent could never mate
+    def flag(self, color):
+        winner = None if self.board.has_insufficient_material(not color) else not color
+        self.outcome = chess.Outcome(TIME_FORFEIT, winner)
+        self.legal_moves = set()
+        self.targets = {}
+        self.promotions = {}
+
+    # recompute the cached position info, call this if the board is changed directly
+    def refresh(self):
+        board = self.board
+        self.outcome = board.outcome()
+        self.is_check = board.is_check()
+        self.legal_moves = set(board.legal_moves) if self.outcome is None else set()
+        self.targets = {}
+        self.promotions = {}
+        for move in self.legal_moves:
+            self.targets[move.from_square] = self.targets.get(move.from_square, 0) | chess.BB_SQUARES[move.to_square]
+            if move.promotion:
+                self.promotions.setdefault((move.from_square, move.to_square), []).append(move.promotion)
+
+        # the side not to move played the last move, the side to move the one before it
+        stack = board.move_stack
+        last = stack[-1].uci() if len(stack) >= 1 else "None"
+        previous = stack[-2].uci() if len(stack) >= 2 else "None"
+        if board.turn == chess.BLACK:
+            self.last_move_white, self.last_move_black = last, previous
+        else:
+            self.last_move_white, self.last_move_black = previous, last
+
+    # bitmask of the squares the piece on from_square can legally move to
+    def legal_targets(self, from_square):
+        return self.targets.get(from_square, 0)
+
+    # the pieces a pawn may promote to on this move (empty if it is not a promotion)
+    def promotion_choices(self, from_square, to_square):
+        return self.promotions.get((from_square, to_square), [])
+
+    # the legal move from one square to another, or None if there is none
+    # (a promotion needs one of the promotion_choices)
+    def find_move(self, from_square, to_square, promotion=None):
+        if not self.legal_targets(from_square) & chess.BB_SQUARES[to_square]:
+            return None
+        choices = self.promotion_choices(from_square, to_square)
+        if choices:
+            if promotion not in choices:
+                return None
+            return chess.Move(from_square, to_square, promotion)
+        return chess.Move(from_square, to_square)
@@ -15,12 +15,16 @@
 
 import sys
 import os
+from time import perf_counter
 import pygame
 import chess
 from button import Button
+from interface.game_state import GameState, TIME_FORFEIT
+from interface.engine_match import EngineMatch
+from interface import resources
 from ChessHelpers import ChessEngineHelper
-
-dep = 4
+from ChessHelpers.ChessLevels import EASY, MEDIUM, HARD
+from ChessHelpers.ChessTimeManager import GameClock, set_engine_clock
 
 # constants and configuration
 TILE_SIZE = 64
@@ -33,12 +37,17 @@ COLOR_BG = (22, 21, 18)
 COLOR_DRAW_LINE = (22, 21, 18)
 COLOR_DRAW_SELECT = (220, 10, 0, 50)
 COLOR_DRAW_DRAG = (0, 220, 0, 50)
+COLOR_DRAW_TARGET = (20, 85, 30)
+COLOR_PROMOTION_BG = (240, 240, 240)
+PROMOTION_PIECES = [chess.QUEEN, chess.KNIGHT, chess.ROOK, chess.BISHOP]
 ENABLE_ILLEGAL_MOVES = False  # allow white to make custom moves (for testing)
 IMAGE_PATH = "interface/images/"
+MENU_FPS = 30  # menus only redraw when a button changes, this just bounds input polling
+MATCH_FPS = 30  # engine vs engine games are sampled at this rate, whatever pace they are played at
+CLOCK_REDRAW = 0.1  # seconds between redraws of a running clock in an engine match
 
-BG = pygame.image.load("assets/Background.png")
-def get_font(size): # Returns Press-Start-2P in the desired size
-    return pygame.font.Font("assets/font.ttf", size)    
+def get_font(size): # Returns Press-Start-2P in the desired size (cached per size)
+    return resources.get_font(size)
 
 # create the board surface by drawing the tiles
 def create_board_surface():
@@ -122,16 +131,21 @@ def draw_pieces(screen, board, font, selected_piece):
             if piece:
                 selected = x == sx and y == sy
                 color, piece_type = piece
-                s1 = pygame.image.load(resource_path(IMAGE_PATH + color + "/" + piece_type + ".png")).convert_alpha()
-                s2 = pygame.image.load(resource_path(IMAGE_PATH + color + "/" + piece_type + ".png")).convert_alpha()
+                s1 = s2 = get_piece_image(color, piece_type)
                 if selected:
-                    s2.fill((255, 255, 255, 90), None, pygame.BLEND_RGBA_MULT)
+                    # the cached image is shared, fade a copy
+                    s1 = s1.copy()
                     s1.fill((255, 255, 255, 90), None, pygame.BLEND_RGBA_MULT)
+                    s2 = s1
                 pos = pygame.Rect(BOARD_POS[0] + x*TILE_SIZE + 1, BOARD_POS[1] + y*TILE_SIZE + 1, TILE_SIZE, TILE_SIZE)
                 screen.blit(s2, s2.get_rect(center=pos.center).move(1, 1))
                 screen.blit(s1, s1.get_rect(center=pos.center))
 
 
+def get_piece_image(color, piece_type):
+    return resources.get_image(resource_path(IMAGE_PATH + color + "/" + piece_type + ".png"), alpha=True)
+
+
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
     try:
@@ -143,6 +157,40 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
+# horrible math to convert board array position to chess.Square
+# I have to reverses the columns since my array starts at A8 not A1
+def square_at(x, y):
+    return (7 - y)*8 + x
+
+
+def position_of(square):
+    return chess.square_file(square), 7 - chess.square_rank(square)
+
+
+# mark every square the selected piece may move to (from the per-ply legal move index)
+def draw_targets(screen, targets):
+    for square in chess.scan_forward(targets):
+        x, y = position_of(square)
+        center = (BOARD_POS[0] + x * TILE_SIZE + TILE_SIZE // 2, BOARD_POS[1] + y * TILE_SIZE + TILE_SIZE // 2)
+        pygame.draw.circle(screen, COLOR_DRAW_TARGET, center, TILE_SIZE // 7)
+
+
+# the squares of the promotion picker: a column starting on the promotion square
+# and growing towards the middle of the board
+def promotion_rects(to_square, choices):
+    x, y = position_of(to_square)
+    step = 1 if y == 0 else -1
+    return [(pygame.Rect(BOARD_POS[0] + x * TILE_SIZE, BOARD_POS[1] + (y + i * step) * TILE_SIZE, TILE_SIZE, TILE_SIZE),
+             piece_type) for i, piece_type in enumerate(choices)]
+
+
+def draw_promotion(screen, to_square, choices, color):
+    for rect, piece_type in promotion_rects(to_square, choices):
+        pygame.draw.rect(screen, COLOR_PROMOTION_BG, rect)
+        image = get_piece_image(color, chess.piece_name(piece_type))
+        screen.blit(image, image.get_rect(center=rect.center))
+
+
 def draw_selector(screen, piece, x, y):
     if piece is not None:
         rect = (BOARD_POS[0] + x * TILE_SIZE, BOARD_POS[1] + y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
@@ -157,8 +205,7 @@ def draw_drag(screen, board, selected_piece, font):
             pygame.draw.rect(screen, COLOR_DRAW_DRAG, rect, 3)
 
         color, piece_type = selected_piece[0]
-        s1 = pygame.image.load(resource_path(IMAGE_PATH + color + "/" + piece_type + ".png")).convert_alpha()
-        s2 = pygame.image.load(resource_path(IMAGE_PATH + color + "/" + piece_type + ".png")).convert_alpha()
+        s1 = s2 = get_piece_image(color, piece_type)
 
         pos = pygame.Vector2(pygame.mouse.get_pos())
         screen.blit(s2, s2.get_rect(center=pos + pygame.Vector2((1, 1))))
@@ -168,59 +215,79 @@ def draw_drag(screen, board, selected_piece, font):
         pygame.draw.line(screen, pygame.Color(COLOR_DRAW_LINE), selected_rect.center, pos, 2)
         return x, y
 
-pygame.init()
-REPLAY_MOUSE_POS = pygame.mouse.get_pos()
-REPLAY_BUTTON = Button(image=pygame.image.load("assets/back3.png"), pos=(271, 590), 
-                            text_input="REPLAY", font=get_font(15), base_color="#d7fcd4", hovering_color="White")
+# pygame state, created by init_app() when the app starts rather than on import,
+# so the engine and headless tools never open a window just by importing this module
+w = TILE_SIZE*8 + BORDER*2  # width of window
+h = w + INFO_HEIGHT
+screen = None
+BG = None
+REPLAY_MOUSE_POS = None
+REPLAY_BUTTON = None
+
+
+def init_app():
+    global screen, BG, REPLAY_MOUSE_POS, REPLAY_BUTTON
+    if screen is not None:
+        return screen
+    pygame.init()
+    screen = pygame.display.set_mode((w, h))
+    #screen.fill("white")
+    BG = resources.get_image("assets/Background.png")
+
+    REPLAY_MOUSE_POS = pygame.mouse.get_pos()
+    REPLAY_BUTTON = Button(image=resources.get_image("assets/back3.png"), pos=(271, 590), 
+                                text_input="REPLAY", font=get_font(15), base_color="#d7fcd4", hovering_color="White")
                     
-for button in [REPLAY_BUTTON]:
-    button.changeColor(REPLAY_MOUSE_POS)
-    #button.update(screen) 
-
-def draw_info(screen, chess_board, font):
-    last_move_w = "White: "
-    last_move_b = "Black: "
-    ply = chess_board.ply()
-    turn = chess_board.turn
+    for button in [REPLAY_BUTTON]:
+        button.changeColor(REPLAY_MOUSE_POS)
+        #button.update(screen) 
+
+    # keep the window responsive while the engine is thinking
+    ChessEngineHelper.set_event_hook(poll_quit)
+    return screen
+
+
+# called by the engine during long searches, returns True if the window was closed
+def poll_quit():
+    for e in pygame.event.get():
+        if e.type == pygame.QUIT:
+            return True
+    return False
+
+def draw_info(screen, game, font, clock=None):
+    # everything shown here is cached on the game state once per ply
+    last_move_w = "White: " + game.last_move_white
+    last_move_b = "Black: " + game.last_move_black
                     
     #for button in [REPLAY_BUTTON]:
         #button.changeColor(REPLAY_MOUSE_POS)
         #button.update(screen)              
-       
-    if turn == chess.BLACK:
-        last_move_b += chess_board.move_stack[ply - 2].uci()
-        last_move_w += chess_board.peek().uci()
-    else:
-        if ply < 2:
-            last_move_w += "None"
-            last_move_b += "None"
-        else:
-            last_move_w += chess_board.move_stack[ply - 2].uci()
-            last_move_b += chess_board.peek().uci()
 
     black_win = white_win = checkmate = ""
-    outcome = chess_board.outcome()
+    outcome = game.outcome
     if outcome is not None:
         if outcome.winner is None:
             white_win = "Draw"
             black_win = "Draw"
-            button.update(screen)
+            REPLAY_BUTTON.update(screen)
         elif outcome.winner == chess.WHITE:
-            white_win = "White wins!"
+            white_win = "White wins on time!" if outcome.termination == TIME_FORFEIT else "White wins!"
             #checkmate = "Checkmate"
-            button.update(screen)
+            REPLAY_BUTTON.update(screen)
         else:
-            black_win = "Black wins!"
+            black_win = "Black wins on time!" if outcome.termination == TIME_FORFEIT else "Black wins!"
             #checkmate = "Checkmate"
-            button.update(screen)
+            REPLAY_BUTTON.update(screen)
+    elif game.is_check:
+        checkmate = "Check"
 
 
 
-    s1 = font.render(last_move_w, True, pygame.Color(COLOR_LIGHT))
-    s2 = font.render(last_move_b, True, pygame.Color(COLOR_DARK))
-    s3 = font.render(white_win, True, pygame.Color(COLOR_DRAW_DRAG))
-    s4 = font.render(black_win, True, pygame.Color(COLOR_DRAW_SELECT))
-    s5 = font.render(checkmate, True, pygame.Color('white'))
+    s1 = resources.render_text(font, last_move_w, pygame.Color(COLOR_LIGHT))
+    s2 = resources.render_text(font, last_move_b, pygame.Color(COLOR_DARK))
+    s3 = resources.render_text(font, white_win, pygame.Color(COLOR_DRAW_DRAG))
+    s4 = resources.render_text(font, black_win, pygame.Color(COLOR_DRAW_SELECT))
+    s5 = resources.render_text(font, checkmate, pygame.Color('white'))
 
     pos1 = pygame.Rect(BORDER, BORDER*3 + TILE_SIZE*8, TILE_SIZE*8, INFO_HEIGHT)
     pos2 = pygame.Rect(BORDER, BORDER*3 + TILE_SIZE*8, TILE_SIZE*8, INFO_HEIGHT)
@@ -233,20 +300,20 @@ def draw_info(screen, chess_board, font):
     screen.blit(s4, s2.get_rect(topright=pos4.topright))
     screen.blit(s5, s2.get_rect(midtop=pos5.midtop))
 
+    # the clocks, the running one highlighted
+    if clock is not None:
+        row = BORDER*3 + TILE_SIZE*8 + 50
+        for color, side in ((chess.WHITE, "topleft"), (chess.BLACK, "topright")):
+            text = ("White " if color == chess.WHITE else "Black ") + GameClock.format(clock.left(color))
+            surface = resources.render_text(font, text, pygame.Color('white' if clock.running == color else COLOR_DARK))
+            pos = pygame.Rect(BORDER, row, TILE_SIZE*8, INFO_HEIGHT)
+            screen.blit(surface, surface.get_rect(**{side: getattr(pos, side)}))
 
-# game loop
-# white and black can each be passed a move generator function
-# otherwise they both accept player moves through the UI
 
 #BG = pygame.image.load("assets/Background.png")
 #def get_font(size): # Returns Press-Start-2P in the desired size
     #return pygame.font.Font("assets/font.ttf", size)    
 
-w = TILE_SIZE*8 + BORDER*2  # width of window
-h = w + INFO_HEIGHT
-screen = pygame.display.set_mode((w, h))
-#screen.fill("white")
-
 '''def options():
     run_option = True
     while run_option:
@@ -289,199 +356,427 @@ screen = pygame.display.set_mode((w, h))
 
         pygame.display.update()'''
 
-def options():
-    run_option = True
-    while run_option:
-        OPTIONS_MOUSE_POS = pygame.mouse.get_pos()
-        board = chess.Board()
-        #move_generator = ChessEngineHelper.MoveGenerator()
+'''
+Scenes
+
+The app is a flat state machine with one scene per screen: menu, options, game and
+game over. Every frame the main loop hands the events to the current scene, and the
+scene returns the scene to show next (itself to stay, None to quit). Nothing calls
+back into the main loop, so a replay or a trip to the menu replaces the old game
+(which is then freed) instead of nesting another game loop on the stack.
+'''
+
+
+class App:
+    def __init__(self, white="player", black="player", chess_board=None, clock=None):
+        init_app()
+        pygame.display.set_caption("Chess UI")
+        # default opponents for the PLAY button, the first game is played on chess_board
+        self.white = white
+        self.black = black
+        # (initial seconds, increment) of every game, None for untimed games
+        self.time_control = clock
+        self.first_board = chess_board
+        self.font = pygame.font.SysFont('', 32)
+        self.clock = pygame.time.Clock()
+        # outcome of the last game played, returned when the window is closed
+        self.outcome = None
+        self.scene = MainMenuScene(self)
+
+    def new_board(self):
+        board = self.first_board if self.first_board is not None else chess.Board()
+        self.first_board = None
+        return board
+
+    # the scene for a game: engine vs engine games are played on a worker (MatchScene)
+    def game_scene(self, chess_board, white, black):
+        if white != "player" and black != "player":
+            return MatchScene(self, chess_board, white, black)
+        return GameScene(self, chess_board, white, black)
+
+    # run one frame of the current scene, returns False once the app should close
+    def step(self, events):
+        for e in events:
+            if e.type == pygame.QUIT:
+                if hasattr(self.scene, "close"):
+                    self.scene.close()
+                self.scene = None
+        if self.scene is not None:
+            self.scene = self.scene.frame(events)
+        return self.scene is not None
+
+    def run(self):
+        while self.step(pygame.event.get()):
+            self.clock.tick(self.scene.fps)
+        return self.outcome
+
+
+class MenuScene:
+    fps = MENU_FPS
+
+    def __init__(self, app, title="CHESS"):
+        # the scene is built once, frames only redraw when a button changes
+        self.app = app
+        self.title = get_font(50).render(title, True, "#b68f40")
+        self.title_rect = self.title.get_rect(center=(271, 71))
+        self.buttons = []
+        self.dirty = True
+
+    def add_button(self, text, y):
+        button = Button(image=resources.get_image("assets/Play Rect.png"), pos=(271, y), 
+                        text_input=text, font=get_font(35), base_color="#d7fcd4", hovering_color="White")
+        self.buttons.append(button)
+        return button
+
+    def frame(self, events):
+        mouse_pos = pygame.mouse.get_pos()
+        for button in self.buttons:
+            if button.changeColor(mouse_pos):
+                self.dirty = True
+
+        for event in events:
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                for button in self.buttons:
+                    if button.checkForInput(event.pos):
+                        return self.clicked(button)
+            if event.type == pygame.VIDEOEXPOSE:
+                self.dirty = True
+
+        if self.dirty:
+            self.draw(screen)
+            pygame.display.update()
+            self.dirty = False
+        return self
+
+    def draw(self, screen):
+        screen.blit(BG, (0, 0))
+        screen.blit(self.title, self.title_rect)
+        for button in self.buttons:
+            button.update(screen)
+
+
+class MainMenuScene(MenuScene):
+    def __init__(self, app):
+        MenuScene.__init__(self, app, "CHESS")
+        self.play_button = self.add_button("PLAY", 195)
+        self.options_button = self.add_button("OPTIONS", 324)
+        self.quit_button = self.add_button("QUIT", 454)
+
+    def clicked(self, button):
+        if button is self.play_button:
+            return self.app.game_scene(self.app.new_board(), self.app.white, self.app.black)
+        if button is self.options_button:
+            return OptionsScene(self.app)
+        return None
+
+
+class OptionsScene(MenuScene):
+    def __init__(self, app):
+        MenuScene.__init__(self, app, "OPTIONS")
+        # each level bounds the depth, nodes and time the engine may spend per move
+        self.levels = {
+            self.add_button("Easy", 195): EASY,
+            self.add_button("Medium", 324): MEDIUM,
+            self.add_button("Hard", 454): HARD,
+        }
+
+    def draw(self, screen):
         #screen.fill("white")
         #screen.fill("#3a0325")
         screen.fill("#2b021b")
-        
-        MENU_TEXT = get_font(50).render("OPTIONS", True, "#b68f40")
-        MENU_RECT = MENU_TEXT.get_rect(center=(271, 71))
-
-        LEVEL1_BUTTON = Button(image=pygame.image.load("assets/Play Rect.png"), pos=(271, 195), 
-                            text_input="Easy", font=get_font(35), base_color="#d7fcd4", hovering_color="White")
-        LEVEL2_BUTTON = Button(image=pygame.image.load("assets/Play Rect.png"), pos=(271, 324), 
-                            text_input="Medium", font=get_font(35), base_color="#d7fcd4", hovering_color="White")
-        LEVEL3_BUTTON = Button(image=pygame.image.load("assets/Play Rect.png"), pos=(271, 454), 
-                            text_input="Hard", font=get_font(35), base_color="#d7fcd4", hovering_color="White")
-
-        screen.blit(MENU_TEXT, MENU_RECT)
-        
-        for button in [LEVEL1_BUTTON, LEVEL2_BUTTON, LEVEL3_BUTTON]:
-            button.changeColor(OPTIONS_MOUSE_POS)
+        screen.blit(self.title, self.title_rect)
+        for button in self.buttons:
             button.update(screen)
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                if LEVEL1_BUTTON.checkForInput(OPTIONS_MOUSE_POS):
-                    dep = 1         
-                    play_chess(board, black=ChessEngineHelper.MoveGenerator().mini_max_move)
-                    pygame.quit()
-                    sys.exit()
-                if LEVEL2_BUTTON.checkForInput(OPTIONS_MOUSE_POS):
-                    play_chess(board, black=ChessEngineHelper.MoveGenerator().mini_max_move)
-                    pygame.quit()
-                    sys.exit()
-                if LEVEL3_BUTTON.checkForInput(OPTIONS_MOUSE_POS):
-                    play_chess(board, black=ChessEngineHelper.MoveGenerator().mini_max_move)
-                    pygame.quit()
-                    sys.exit()
-
-        pygame.display.update()
-
-
-def play_chess(chess_board, white="player", black="player"):
-    pygame.init()
-    font = pygame.font.SysFont('', 32)
-    pygame.display.set_caption("Chess UI")
-    #w = TILE_SIZE*8 + BORDER*2  # width of window
-    #h = w + INFO_HEIGHT
-    #screen = pygame.display.set_mode((w, h))
-    # convert the real chess board object to custom board array
-    board = create_board_from_fen(chess_board.board_fen())
-    board_surface = create_board_surface()
-    clock = pygame.time.Clock()
-    selected_piece = None
-    drop_pos = None
-    piece = x = y = None
-    
-    running = False
-    runmenu = True
-    
-    while runmenu and (not running):
-        screen.blit(BG, (0, 0))
+    def clicked(self, button):
+        level = self.levels[button]
+        return GameScene(self.app, chess.Board(), "player", ChessEngineHelper.MoveGenerator(level).mini_max_move)
 
-        MENU_MOUSE_POS = pygame.mouse.get_pos()
 
-        MENU_TEXT = get_font(50).render("CHESS", True, "#b68f40")
-        MENU_RECT = MENU_TEXT.get_rect(center=(271, 71))
+# game scene
+# white and black can each be passed a move generator function
+# otherwise they both accept player moves through the UI
+class GameScene:
+    fps = 60
+
+    def __init__(self, app, chess_board, white, black):
+        self.app = app
+        self.white = white
+        self.black = black
+        # convert the real chess board object to custom board array
+        self.board = create_board_from_fen(chess_board.board_fen())
+        # outcome, check and legal moves are computed once per ply instead of every frame
+        self.game = GameState(chess_board)
+        self.board_surface = create_board_surface()
+        self.back_button = Button(image=resources.get_image("assets/back3.png"), pos=(271, 554), 
+                                  text_input="MENU", font=get_font(15), base_color="#d7fcd4", hovering_color="White")
+        self.selected_piece = None
+        self.drop_pos = None
+        self.piece = self.x = self.y = None
+        # (from square, to square) while the player picks a piece to promote to
+        self.pending_promotion = None
+        # both sides' clocks, the side to move's clock starts right away
+        self.clock = None
+        if app.time_control is not None:
+            self.clock = GameClock(*app.time_control)
+            self.clock.start(chess_board.turn)
+
+    def frame(self, events):
+        game = self.game
+        chess_board = game.board
 
-        PLAY_BUTTON = Button(image=pygame.image.load("assets/Play Rect.png"), pos=(271, 195), 
-                            text_input="PLAY", font=get_font(35), base_color="#d7fcd4", hovering_color="White")
-        OPTIONS_BUTTON = Button(image=pygame.image.load("assets/Play Rect.png"), pos=(271, 324), 
-                            text_input="OPTIONS", font=get_font(35), base_color="#d7fcd4", hovering_color="White")
-        QUIT_BUTTON = Button(image=pygame.image.load("assets/Play Rect.png"), pos=(271, 454), 
-                            text_input="QUIT", font=get_font(35), base_color="#d7fcd4", hovering_color="White")
+        # don't try to play if the game is over
+        if self.clock is not None and self.clock.check_flag() is not None:
+            game.flag(self.clock.flagged)
+        if game.is_over():
+            self.app.outcome = game.outcome
+            return GameOverScene(self)
 
-        screen.blit(MENU_TEXT, MENU_RECT)
+        for e in events:
+            if e.type == pygame.MOUSEBUTTONDOWN and self.back_button.checkForInput(e.pos):
+                return MainMenuScene(self.app)
 
-        for button in [PLAY_BUTTON, OPTIONS_BUTTON, QUIT_BUTTON]:
-            button.changeColor(MENU_MOUSE_POS)
-            button.update(screen)
-        
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()      
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                if PLAY_BUTTON.checkForInput(MENU_MOUSE_POS):
-                    running = True
-                if OPTIONS_BUTTON.checkForInput(MENU_MOUSE_POS):
-                    #runmenu = False
-                    options()
-                if QUIT_BUTTON.checkForInput(MENU_MOUSE_POS):
-                    pygame.quit()
-                    sys.exit()
-
-        pygame.display.update()
-    
-    
-    while running:
-        events = pygame.event.get()
+        if chess_board.turn == chess.WHITE and self.white == "player" \
+                or chess_board.turn == chess.BLACK and self.black == "player":
+            self.handle_player_input(events)
+        else:
+            # generate and push a move to the real chess board
+            player = self.white if chess_board.turn == chess.WHITE else self.black
+            if self.clock is not None:
+                # an engine with a time manager plans its move with the time it has left
+                set_engine_clock(player, self.clock.left(chess_board.turn), self.clock.increment)
+            move = player(chess_board)
+            # the engine returns False if the window was closed while it was thinking
+            if move is False:
+                return None
+            self.push(move)
+            # update our array representation for the UI
+            self.board = create_board_from_fen(chess_board.board_fen())
+            # end of move generation
+
+        self.draw(screen)
+        pygame.display.flip()
+        return self
+
+    def handle_player_input(self, events):
+        game = self.game
+        self.piece, self.x, self.y = get_square_under_mouse(self.board)
         for e in events:
-            if e.type == pygame.QUIT:
-                return chess_board.outcome()
-        
-        # don't try to play if the game is over
-        outcome = chess_board.outcome()
-        
-        if outcome is None:
-
-            if chess_board.turn == chess.WHITE and white == "player" \
-                    or chess_board.turn == chess.BLACK and black == "player":
-                piece, x, y = get_square_under_mouse(board)
-                # events = pygame.event.get()
-                for e in events:
-                    if e.type == pygame.QUIT:
-                        return outcome
-                    if e.type == pygame.MOUSEBUTTONDOWN:
-                        if piece is not None:
-                            selected_piece = piece, x, y
-                        if BACK_BUTTON.checkForInput(BACK_MOUSE_POS):
-                            play_chess(chess.Board(), black=ChessEngineHelper.MoveGenerator().mini_max_move)
-                            pygame.quit()
-                            sys.exit()
-                        if REPLAY_BUTTON.checkForInput(REPLAY_MOUSE_POS):
-                            play_chess(chess.Board(), black=ChessEngineHelper.MoveGenerator().mini_max_move)
-                            pygame.quit()
-                            sys.exit()
-                    if e.type == pygame.MOUSEBUTTONUP:
-                        if drop_pos:
-                            piece, old_x, old_y = selected_piece
-                            new_x, new_y = drop_pos
-                            if new_x is not None and new_y is not None:
-                                # horrible math to convert board array position to chess.Square
-                                # I have to reverses the columns since my array starts at A8 not A1
-                                move = chess.Move(((7 - old_y)*8 + old_x), ((7 - new_y)*8 + new_x))
-                                move2 = chess.Move(((7 - old_y)*8 + old_x), ((7 - new_y)*8 + new_x), chess.QUEEN)
-                                # quick hack to enable pawn promotion
-                                if move2 in chess_board.legal_moves:
-                                    # push the move to the real chess board
-                                    chess_board.push(move2)
-                                    # update our array representation
-                                    board[int(old_y)][old_x] = None
-                                    board[int(new_y)][new_x] = ('white', 'queen')
-                                elif move in chess_board.legal_moves or ENABLE_ILLEGAL_MOVES:
-                                    # push the move to the real chess board
-                                    chess_board.push(move)
-                                    # update our array representation
-                                    board[int(old_y)][old_x] = None
-                                    board[new_y][new_x] = piece
-                                # this refresh will reset the board if a piece was dragged somewhere invalid
-                                board = create_board_from_fen(chess_board.board_fen())
-                        selected_piece = None
-                        drop_pos = None
-                    
-            else:
-                # generate and push a move to the real chess board
-                if chess_board.turn == chess.WHITE:
-                    move = white(chess_board)
-                    if move is False:
-                        return
-                    chess_board.push(move)
-                else:
-                    move = black(chess_board)
-                    if move is False:
-                        return
-                    chess_board.push(move)
-                # update our array representation for the UI
-                board = create_board_from_fen(chess_board.board_fen())
-                # end of move generation
-                
+            if self.pending_promotion is not None:
+                if e.type == pygame.MOUSEBUTTONDOWN:
+                    self.choose_promotion(e.pos)
+                continue
+            if e.type == pygame.MOUSEBUTTONDOWN:
+                if self.piece is not None:
+                    self.selected_piece = self.piece, self.x, self.y
+            if e.type == pygame.MOUSEBUTTONUP:
+                if self.drop_pos and self.selected_piece:
+                    piece, old_x, old_y = self.selected_piece
+                    new_x, new_y = self.drop_pos
+                    if new_x is not None and new_y is not None:
+                        from_square = square_at(old_x, old_y)
+                        to_square = square_at(new_x, new_y)
+                        # one lookup in the legal move index instead of generating legal moves
+                        if game.promotion_choices(from_square, to_square):
+                            # let the player pick the piece (under-promotion included)
+                            self.pending_promotion = from_square, to_square
+                        else:
+                            move = game.find_move(from_square, to_square)
+                            if move is None and ENABLE_ILLEGAL_MOVES:
+                                move = chess.Move(from_square, to_square)
+                            if move is not None:
+                                # push the move to the real chess board
+                                self.push(move)
+                        # this refresh will reset the board if a piece was dragged somewhere invalid
+                        self.board = create_board_from_fen(game.board.board_fen())
+                self.selected_piece = None
+                self.drop_pos = None
+
+    # play a move and hand the clock to the other side
+    def push(self, move):
+        self.game.push(move)
+        if self.clock is not None:
+            self.clock.press()
+            if self.clock.flagged is not None:
+                self.game.flag(self.clock.flagged)
+            elif not self.game.is_over():
+                self.clock.start(self.game.board.turn)
+
+    def promotion_choices(self):
+        choices = self.game.promotion_choices(*self.pending_promotion)
+        return [piece_type for piece_type in PROMOTION_PIECES if piece_type in choices]
+
+    # clicking a piece in the picker promotes to it, clicking anywhere else cancels
+    def choose_promotion(self, pos):
+        from_square, to_square = self.pending_promotion
+        choices = self.promotion_choices()
+        self.pending_promotion = None
+        for rect, piece_type in promotion_rects(to_square, choices):
+            if rect.collidepoint(pos):
+                self.push(self.game.find_move(from_square, to_square, piece_type))
+                self.board = create_board_from_fen(self.game.board.board_fen())
+                return
+
+    def draw(self, screen):
+        screen.fill(pygame.Color(COLOR_BG))
+        screen.blit(self.board_surface, BOARD_POS)
+        self.back_button.changeColor(pygame.mouse.get_pos())
+        self.back_button.update(screen)
+
+        draw_pieces(screen, self.board, self.app.font, self.selected_piece)
+
+        if self.selected_piece:
+            draw_targets(screen, self.game.legal_targets(square_at(self.selected_piece[1], self.selected_piece[2])))
+        if self.drop_pos:
+            draw_selector(screen, self.piece, self.x, self.y)
+        self.drop_pos = draw_drag(screen, self.board, self.selected_piece, self.app.font)
+        if self.pending_promotion is not None:
+            color = "white" if self.game.board.turn == chess.WHITE else "black"
+            draw_promotion(screen, self.pending_promotion[1], self.promotion_choices(), color)
+        draw_info(screen, self.game, self.app.font, self.clock)
+
+
+# engine vs engine: the game is played by an EngineMatch on a worker thread at the engines'
+# own pace, and every frame shows the latest position it has published (positions played
+# between two frames are never drawn). Space pauses and resumes, the right arrow (or N)
+# plays a single move while paused, and F toggles fast forward.
+class MatchScene(GameScene):
+    fps = MATCH_FPS
+
+    def __init__(self, app, chess_board, white, black):
+        GameScene.__init__(self, app, chess_board, white, black)
+        # the match runs the clock itself, only while an engine is thinking
+        if self.clock is not None:
+            self.clock = GameClock(*app.time_control)
+        for player in (white, black):
+            # a search stopped by an earlier match leaves the engine's QUIT flag set
+            engine = getattr(player, "__self__", None)
+            if hasattr(engine, "new_game"):
+                engine.new_game()
+        self.match = EngineMatch(chess_board, white, black, self.clock)
+        self.game = self.match.latest
+        self.drawn = None  # (snapshot version, status) on the screen, None to redraw
+        self.clock_drawn = 0.0
+        self.rate = (perf_counter(), 0, 0.0)  # moves per second: (since, moves then, rate)
+        self.match.start()
+
+    def close(self):
+        self.match.stop()
+
+    def frame(self, events):
+        match = self.match
+        for e in events:
+            if e.type == pygame.MOUSEBUTTONDOWN and self.back_button.checkForInput(e.pos):
+                self.close()
+                return MainMenuScene(self.app)
+            if e.type == pygame.KEYDOWN:
+                if e.key == pygame.K_SPACE:
+                    match.set_paused(not match.paused)
+                elif e.key in (pygame.K_RIGHT, pygame.K_n):
+                    match.step()
+                elif e.key == pygame.K_f:
+                    match.set_fast(not match.fast)
+            if e.type == pygame.VIDEOEXPOSE:
+                self.drawn = None
+
+        # sample the latest position, skipping whatever happened in between
+        snapshot = match.latest
+        if snapshot is not self.game:
+            self.game = snapshot
+            self.board = create_board_from_fen(snapshot.board_fen)
+        if snapshot.is_over():
+            self.close()
+            self.app.outcome = snapshot.outcome
+            return GameOverScene(self)
+
+        now = perf_counter()
+        since, moves, rate = self.rate
+        if now - since >= 1.0:
+            self.rate = (now, snapshot.version, (snapshot.version - moves) / (now - since))
+        status = self.status()
+        if self.back_button.changeColor(pygame.mouse.get_pos()):
+            self.drawn = None
+        clock_running = self.clock is not None and self.clock.running is not None
+        if self.drawn != (snapshot.version, status) or clock_running and now - self.clock_drawn >= CLOCK_REDRAW:
+            self.draw(screen)
+            pygame.display.flip()
+            self.drawn = (snapshot.version, status)
+            self.clock_drawn = now
+        return self
+
+    def status(self):
+        match = self.match
+        if match.paused:
+            mode = "Paused (space: resume, right: step)"
+        else:
+            mode = "Fast forward" if match.fast else "Playing"
+            mode += " %.1f moves/s (space: pause, f: %s)" % (self.rate[2], "normal" if match.fast else "fast")
+        return mode
 
-        
+    def draw(self, screen):
         screen.fill(pygame.Color(COLOR_BG))
-        screen.blit(board_surface, BOARD_POS)
-        BACK_MOUSE_POS = pygame.mouse.get_pos()
-        BACK_BUTTON = Button(image=pygame.image.load("assets/back3.png"), pos=(271, 554), 
-                            text_input="MENU", font=get_font(15), base_color="#d7fcd4", hovering_color="White")
-        for button in [BACK_BUTTON]:
-            button.changeColor(BACK_MOUSE_POS)
-            button.update(screen)
-        
-        draw_pieces(screen, board, font, selected_piece)
-        
-        if drop_pos:
-            draw_selector(screen, piece, x, y)
-        drop_pos = draw_drag(screen, board, selected_piece, font)
-        draw_info(screen, chess_board, font)
-             
-        pygame.display.flip()
-        clock.tick(60)
+        screen.blit(self.board_surface, BOARD_POS)
+        self.back_button.update(screen)
+        draw_pieces(screen, self.board, self.app.font, None)
+        draw_info(screen, self.game, self.app.font, self.clock)
+        surface = resources.render_text(get_font(8), self.status(), pygame.Color('white'))
+        screen.blit(surface, surface.get_rect(bottomleft=(BORDER, h - 4)))
+
+
+class GameOverScene:
+    fps = MENU_FPS
+
+    def __init__(self, game_scene):
+        # only keep what is needed to show the final position and to play again,
+        # the game scene itself (drag state, surfaces) is dropped
+        self.app = game_scene.app
+        self.white = game_scene.white
+        self.black = game_scene.black
+        self.game = game_scene.game
+        self.board = game_scene.board
+        self.board_surface = game_scene.board_surface
+        self.back_button = game_scene.back_button
+        self.clock = game_scene.clock
+        self.dirty = True
+
+    def frame(self, events):
+        mouse_pos = pygame.mouse.get_pos()
+        for button in [self.back_button, REPLAY_BUTTON]:
+            if button.changeColor(mouse_pos):
+                self.dirty = True
+
+        for e in events:
+            if e.type == pygame.MOUSEBUTTONDOWN:
+                if self.back_button.checkForInput(e.pos):
+                    return MainMenuScene(self.app)
+                if REPLAY_BUTTON.checkForInput(e.pos):
+                    # replay against the same opponent (and level), engines forget the last game
+                    for player in (self.white, self.black):
+                        engine = getattr(player, "__self__", None)
+                        if hasattr(engine, "new_game"):
+                            engine.new_game()
+                    return self.app.game_scene(chess.Board(), self.white, self.black)
+            if e.type == pygame.VIDEOEXPOSE:
+                self.dirty = True
+
+        if self.dirty:
+            screen.fill(pygame.Color(COLOR_BG))
+            screen.blit(self.board_surface, BOARD_POS)
+            self.back_button.update(screen)
+            draw_pieces(screen, self.board, self.app.font, None)
+            draw_info(screen, self.game, self.app.font, self.clock)
+            pygame.display.flip()
+            self.dirty = False
+        return self
+
+
+# white and black can each be passed a move generator function
+# otherwise they both accept player moves through the UI
+# (if both are move generators, the game is an engine match, see MatchScene)
+#
+# the app starts on the main menu, PLAY starts a game between white and black,
+# and the outcome of the last game is returned when the window is closed
+#
+# clock=(initial seconds, increment) plays with a chess clock, e.g. clock=(180, 2) for 3+2 blitz
+def play_chess(chess_board, white="player", black="player", clock=None):
+    return App(white, black, chess_board, clock).run()
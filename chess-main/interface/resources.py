@@ -0,0 +1,46 @@
+# Resources
+#
+# Caches for everything the interface would otherwise load or render over and over:
+# fonts per size, images per file and rendered text per (font, text, color).
+# pygame.font.Font() parses the font file and font.render() rasterizes the text, so
+# doing either every frame keeps the CPU busy even when nothing on screen changes.
+
+import pygame
+
+FONT_PATH = "assets/font.ttf"
+MAX_CACHED_TEXTS = 512
+
+_fonts = {}
+_images = {}
+_texts = {}
+
+
+def get_font(size, path=FONT_PATH):
+    key = (path, size)
+    font = _fonts.get(key)
+    if font is None:
+        font = _fonts[key] = pygame.font.Font(path, size)
+    return font
+
+
+# images are shared, copy them before drawing on them
+def get_image(path, alpha=False):
+    key = (path, alpha)
+    image = _images.get(key)
+    if image is None:
+        image = pygame.image.load(path)
+        if alpha:
+            image = image.convert_alpha()
+        _images[key] = image
+    return image
+
+
+def render_text(font, text, color):
+    key = (font, text, str(color))
+    surface = _texts.get(key)
+    if surface is None:
+        # move strings change every ply, don't let the cache grow forever
+        if len(_texts) >= MAX_CACHED_TEXTS:
+            _texts.clear()
+        surface = _texts[key] = font.render(text, True, color)
+    return surface
@@ -1,62 +1,364 @@
-# # Chess TUI
-# #
-# # This file contains a terminal user interface for displaying python-chess boards.
-# # Entering moves like this is very tedious, I definitely recommend using the GUI!
-# #
-# # Note: By default, my terminal in Pycharm did not display the board correctly with Jetbrains default font.
-# #   Courier New, Consolas, Lucida Sans Typewriter, everything else works fine.
-# #   (File -> Settings -> Editor -> Colors Scheme -> Console Font)
-# #
-
-# import chess
-
-# ENABLE_ILLEGAL_MOVES = False
-
-
-# # game loop
-# def play_chess(board, white="player", black="player"):
-#     while True:
-#         # find out if the game is over
-#         outcome = board.outcome()
-#         if outcome is None:
-
-#             if board.turn == chess.WHITE and white == "player" \
-#                     or board.turn == chess.BLACK and black == "player":
-
-#                 # print chess board to the terminal when it is a players turn
-#                 print()
-#                 print(board.unicode(invert_color=True))
-
-#                 # prompt the player for a move
-#                 legal_moves = list(board.legal_moves)
-#                 print("\nAvailable moves:")
-#                 for m in legal_moves:
-#                     print(m.uci(), end=", ")
-#                 if board.turn == chess.WHITE:
-#                     uci = input("\n\nWhite's move: ")
-#                 else:
-#                     uci = input("\n\nBlack's move: ")
-#                 move = chess.Move.from_uci(uci)
-
-#                 # attempt to make the move
-#                 if move in board.legal_moves or ENABLE_ILLEGAL_MOVES:
-#                     board.push(move)
-
-#             else:
-#                 # generate and push a move to the board
-#                 # generate and push a move to the real chess board
-#                 if board.turn == chess.WHITE:
-#                     move = white(board)
-#                     board.push(move)
-#                     print("White's move:", move.uci())
-#                 else:
-#                     move = black(board)
-#                     board.push(move)
-#                     print("Black's move:", move.uci())
-
-#         else:
-#             print("Game over!")
-#             print(outcome)
-#             print("\nFinal position:")
-#             print(board.unicode(invert_color=True))
-#             return outcome
+# Chess TUI
+#
+# This file contains the terminal user interfaces for python-chess boards:
+#
+#   play_chess   a single game in a plain terminal, line by line. Entering moves like
+#                this is very tedious, I definitely recommend using the GUI for playing!
+#   Spectator    a curses view of many bot games at once (see watch_games.py), for
+#                watching tournaments on a server without a display
+#
+# Note: By default, my terminal in Pycharm did not display the board correctly with Jetbrains default font.
+#   Courier New, Consolas, Lucida Sans Typewriter, everything else works fine.
+#   (File -> Settings -> Editor -> Colors Scheme -> Console Font)
+#
+# The spectator shows the games in a grid of small boards with the engine stats of the
+# last move (depth, nodes per second, evaluation) below each one. Arrow keys (or hjkl)
+# select a game, enter shows it alone with its moves, q quits.
+#
+# It has to stay cheap with dozens of boards, so nothing is redrawn that did not change:
+#   - only the games which received a move since the last frame are drawn again
+#   - every string written to the screen goes through put(), which remembers what is on
+#     each screen position and skips the write if it is already there, so a move only
+#     rewrites its few squares and the status lines
+#   - the whole screen is only cleared when the layout changes (resize, scrolling,
+#     switching between the grid and a single game)
+
+import curses
+import queue
+
+import chess
+
+ENABLE_ILLEGAL_MOVES = False
+
+CELL_WIDTH = 20  # a board is 16 columns wide (2 per square) plus a gap
+CELL_HEIGHT = 12  # 8 rows of board, 3 status lines and a gap
+FRAME_TIME = 100  # milliseconds between frames (and key checks)
+MESSAGES_PER_FRAME = 1000  # messages taken from the queue before drawing
+
+CHECKMATE = 1000  # MoveGenerator.CHECKMATE, mate scores are CHECKMATE - plies
+MAX_PLY = 64
+
+# color pairs
+LIGHT = 1
+DARK = 2
+MOVED_LIGHT = 3
+MOVED_DARK = 4
+
+
+# game loop
+def play_chess(board, white="player", black="player"):
+    while True:
+        # find out if the game is over
+        outcome = board.outcome()
+        if outcome is not None:
+            print("Game over!")
+            print(outcome)
+            print("\nFinal position:")
+            print(board.unicode(invert_color=True))
+            return outcome
+
+        if board.turn == chess.WHITE and white == "player" \
+                or board.turn == chess.BLACK and black == "player":
+            # print chess board to the terminal when it is a players turn
+            print()
+            print(board.unicode(invert_color=True))
+
+            # prompt the player for a move until it is a legal one
+            # (the legal moves are only listed after a wrong one)
+            while True:
+                uci = input("\n%s's move: " % ("White" if board.turn == chess.WHITE else "Black")).strip()
+                try:
+                    move = chess.Move.from_uci(uci)
+                except ValueError:
+                    move = None
+                if move is not None and (move in board.legal_moves or ENABLE_ILLEGAL_MOVES):
+                    break
+                print("Available moves:", ", ".join(m.uci() for m in board.legal_moves))
+            board.push(move)
+
+        else:
+            # generate and push a move to the real chess board
+            generator = white if board.turn == chess.WHITE else black
+            move = generator(board)
+            if move is False:
+                # the move generator was told to quit
+                return None
+            print("%s's move: %s" % ("White" if board.turn == chess.WHITE else "Black", move.uci()))
+            board.push(move)
+
+
+'''
+Spectator
+'''
+
+
+class GameView:
+    # what the spectator knows about one game, updated from the game's messages
+    def __init__(self, game_id, white, black, fen=chess.STARTING_FEN):
+        self.game_id = game_id
+        self.white = white
+        self.black = black
+        self.board = chess.Board(fen)
+        self.last_move = None
+        self.stats = {}  # depth, nps and score (for white) of the last engine move
+        self.result = None
+        self.reason = None
+        self.dirty = True  # changed since it was last drawn
+
+    def title(self):
+        return "#%d %s-%s" % (self.game_id, self.white, self.black)
+
+    def status(self):
+        stats = self.stats
+        if not stats:
+            return "waiting" if not self.board.move_stack else ""
+        return "d%d %s %s" % (stats.get("depth", 0), format_nps(stats.get("nps", 0)), format_score(stats.get("score", 0)))
+
+    def last_line(self):
+        if self.result is not None:
+            return "%s %s" % (self.result, self.reason or "")
+        move = self.board.peek() if self.board.move_stack else None
+        if move is None:
+            return ""
+        number = (self.board.ply() + 1) // 2
+        return "%d.%s %s" % (number, ".." if self.board.turn == chess.WHITE else "", move.uci())
+
+
+# evaluation for white in pawns, or "#3" / "#-3" for mates (in moves)
+def format_score(score):
+    if abs(score) > CHECKMATE - MAX_PLY:
+        moves = (int(round(CHECKMATE - abs(score))) + 1) // 2
+        return "#%d" % (moves if score > 0 else -moves)
+    return "%+.2f" % score
+
+
+def format_nps(nps):
+    if nps >= 10000:
+        return "%.0fk nps" % (nps / 1000)
+    if nps >= 1000:
+        return "%.1fk nps" % (nps / 1000)
+    return "%d nps" % nps
+
+
+class Spectator:
+    # messages (tuples) from the game runners:
+    #   ("start", game id, white name, black name, fen)
+    #   ("move", game id, uci, {"depth": ..., "nps": ..., "score": ... for white})
+    #   ("end", game id, result, reason)
+    def __init__(self, screen):
+        self.screen = screen
+        self.games = {}
+        self.order = []  # game ids in the order they started
+        self.selected = 0
+        self.top = 0  # first visible row of the grid
+        self.focus = False  # show the selected game alone
+        self.drawn = {}  # (y, x) -> (text, attribute) currently on the screen
+        self.layout = None
+        self.writes = 0  # strings actually written, to check the diff rendering
+        self.colors = False
+
+    def handle(self, message):
+        kind, game_id = message[0], message[1]
+        if kind == "start":
+            self.games[game_id] = GameView(game_id, message[2], message[3], message[4])
+            self.order.append(game_id)
+            return
+        view = self.games.get(game_id)
+        if view is None:
+            return
+        if kind == "move":
+            view.last_move = chess.Move.from_uci(message[2])
+            view.board.push(view.last_move)
+            view.stats = message[3] or {}
+        elif kind == "end":
+            view.result = message[2]
+            view.reason = message[3]
+        view.dirty = True
+
+    '''
+    Main loop: take the waiting messages, handle the keys, draw what changed
+    '''
+
+    def run(self, messages):
+        curses.curs_set(0)
+        self.screen.timeout(FRAME_TIME)
+        self.screen.keypad(True)
+        if curses.has_colors():
+            curses.start_color()
+            curses.use_default_colors()
+            curses.init_pair(LIGHT, curses.COLOR_BLACK, curses.COLOR_WHITE)
+            curses.init_pair(DARK, curses.COLOR_BLACK, curses.COLOR_CYAN)
+            curses.init_pair(MOVED_LIGHT, curses.COLOR_BLACK, curses.COLOR_YELLOW)
+            curses.init_pair(MOVED_DARK, curses.COLOR_BLACK, curses.COLOR_GREEN)
+            self.colors = True
+        while True:
+            for _ in range(MESSAGES_PER_FRAME):
+                try:
+                    message = messages.get_nowait()
+                except (queue.Empty, EOFError, OSError):
+                    break
+                self.handle(message)
+            self.draw()
+            key = self.screen.getch()
+            if key in (ord("q"), ord("Q")):
+                return
+            self.handle_key(key)
+
+    def handle_key(self, key):
+        if key == -1 or not self.order:
+            return
+        columns = self.columns()
+        if key in (curses.KEY_RIGHT, ord("l")):
+            self.select(self.selected + 1)
+        elif key in (curses.KEY_LEFT, ord("h")):
+            self.select(self.selected - 1)
+        elif key in (curses.KEY_DOWN, ord("j")):
+            self.select(self.selected + columns)
+        elif key in (curses.KEY_UP, ord("k")):
+            self.select(self.selected - columns)
+        elif key == curses.KEY_NPAGE:
+            self.select(self.selected + columns * self.rows())
+        elif key == curses.KEY_PPAGE:
+            self.select(self.selected - columns * self.rows())
+        elif key in (curses.KEY_ENTER, 10, 13, ord(" ")):
+            self.focus = not self.focus
+            self.layout = None
+        elif key == curses.KEY_RESIZE:
+            self.layout = None
+
+    def select(self, index):
+        index = max(0, min(len(self.order) - 1, index))
+        if index == self.selected:
+            return
+        # the old and the new selection change their titles
+        self.games[self.order[self.selected]].dirty = True
+        self.games[self.order[index]].dirty = True
+        self.selected = index
+        if self.focus:
+            self.layout = None
+        # scroll the grid so the selection stays visible
+        row = index // self.columns()
+        if row < self.top:
+            self.top = row
+            self.layout = None
+        elif row >= self.top + self.rows():
+            self.top = row - self.rows() + 1
+            self.layout = None
+
+    def columns(self):
+        return max(1, self.screen.getmaxyx()[1] // CELL_WIDTH)
+
+    def rows(self):
+        return max(1, (self.screen.getmaxyx()[0] - 1) // CELL_HEIGHT)
+
+    '''
+    Drawing
+    '''
+
+    # writes a string unless exactly this string is already on the screen there
+    def put(self, y, x, text, attribute=0):
+        height, width = self.screen.getmaxyx()
+        if y >= height or x >= width:
+            return
+        text = text[:width - x]
+        if self.drawn.get((y, x)) == (text, attribute):
+            return
+        self.drawn[(y, x)] = (text, attribute)
+        self.writes += 1
+        try:
+            self.screen.addstr(y, x, text, attribute)
+        except curses.error:
+            # writing the bottom right corner moves the cursor off the screen
+            pass
+
+    def draw(self):
+        layout = (self.screen.getmaxyx(), self.top, self.focus, len(self.order))
+        if layout != self.layout:
+            # start from a blank screen and draw every game again
+            self.layout = layout
+            self.screen.erase()
+            self.drawn = {}
+            for view in self.games.values():
+                view.dirty = True
+
+        self.draw_header()
+        if self.focus and self.order:
+            view = self.games[self.order[self.selected]]
+            if view.dirty:
+                self.draw_game(view, 1, 0)
+                self.draw_details(view, 1, CELL_WIDTH + 4)
+                view.dirty = False
+        else:
+            columns = self.columns()
+            first = self.top * columns
+            for index in range(first, min(len(self.order), first + columns * self.rows())):
+                view = self.games[self.order[index]]
+                if view.dirty:
+                    row, column = divmod(index - first, columns)
+                    self.draw_game(view, 1 + row * CELL_HEIGHT, column * CELL_WIDTH)
+                    view.dirty = False
+        self.screen.noutrefresh()
+        curses.doupdate()
+
+    def draw_header(self):
+        views = self.games.values()
+        results = [view.result for view in views]
+        text = "%d games, %d running  +%d =%d -%d   arrows: select  enter: zoom  q: quit" % (
+            len(results), results.count(None), results.count("1-0"), results.count("1/2-1/2"),
+            results.count("0-1"))
+        self.put(0, 0, text.ljust(self.screen.getmaxyx()[1] - 1))
+
+    def draw_game(self, view, y, x):
+        board = view.board
+        moved = (view.last_move.from_square, view.last_move.to_square) if view.last_move else ()
+        for square in chess.SQUARES:
+            piece = board.piece_at(square)
+            text = (piece.symbol() if piece else " ") + " "
+            light = (chess.square_file(square) + chess.square_rank(square)) % 2 == 1
+            if self.colors:
+                pair = (MOVED_LIGHT if light else MOVED_DARK) if square in moved else (LIGHT if light else DARK)
+                attribute = curses.color_pair(pair)
+            else:
+                # without colors: dark squares are dots, the last move is bold
+                text = text if piece or light else ". "
+                attribute = curses.A_BOLD if square in moved else 0
+            self.put(y + 7 - chess.square_rank(square), x + 2 * chess.square_file(square), text, attribute)
+
+        selected = self.order and view.game_id == self.order[self.selected]
+        width = CELL_WIDTH - 2
+        self.put(y + 8, x, view.title()[:width].ljust(width), curses.A_REVERSE if selected else 0)
+        self.put(y + 9, x, view.status()[:width].ljust(width))
+        self.put(y + 10, x, view.last_line()[:width].ljust(width))
+
+    def draw_details(self, view, y, x):
+        width = max(0, self.screen.getmaxyx()[1] - x - 1)
+        self.put(y, x, ("White: %s   Black: %s" % (view.white, view.black))[:width].ljust(width))
+        stats = view.stats
+        line = "depth %d, %s, eval %s" % (stats.get("depth", 0), format_nps(stats.get("nps", 0)),
+                                        format_score(stats.get("score", 0))) if stats else ""
+        self.put(y + 1, x, line[:width].ljust(width))
+        # the last moves that fit, as numbered pairs
+        board = view.board.root()
+        pairs = []
+        for move in view.board.move_stack:
+            san = board.san(move)
+            if board.turn == chess.WHITE:
+                pairs.append("%d. %s" % (board.fullmove_number, san))
+            else:
+                pairs.append((pairs.pop() if pairs else "%d..." % board.fullmove_number) + " " + san)
+            board.push(move)
+        lines = self.screen.getmaxyx()[0] - y - 4
+        for i, text in enumerate(pairs[-lines:] if lines > 0 else []):
+            self.put(y + 3 + i, x, text[:width].ljust(width))
+        if view.result is not None:
+            self.put(y + 3 + min(len(pairs), max(lines, 0)), x,
+                     ("%s %s" % (view.result, view.reason or ""))[:width].ljust(width), curses.A_BOLD)
+
+
+def spectate(messages):
+    """ Shows the games of a message queue (see Spectator) until q is pressed """
+    def run(screen):
+        spectator = Spectator(screen)
+        spectator.run(messages)
+        return spectator
+    return curses.wrapper(run)
@@ -0,0 +1,60 @@
+# Chess Program
+#
+# Plays won endgames engine vs engine and reports whether the winning side converts them
+# or lets them slip into a draw by repetition or the fifty-move rule. Without repetition
+# detection in the search the engine shuffles back and forth in positions like these,
+# because every move keeps the same (winning) score.
+#
+# > python play_endgames.py [--depth 3] [--contempt 0]
+
+import argparse
+import contextlib
+import io
+
+import chess
+from ChessHelpers.ChessEngineHelper import MoveGenerator
+
+ENDGAMES = [
+    ("queen", "8/8/3k4/8/8/8/1Q6/4K3 w - - 0 1"),
+    ("rook", "8/8/8/4k3/8/8/8/R3K3 w - - 0 1"),
+    ("two rooks", "8/8/8/3k4/8/8/8/R3K2R w - - 0 1"),
+    ("queen vs rook", "8/8/3k4/8/3r4/8/1Q6/4K3 w - - 0 1"),
+]
+MAX_PLIES = 200
+
+
+def play(fen, depth, contempt):
+    board = chess.Board(fen)
+    engine = MoveGenerator()
+    engine.DEPTH = depth
+    engine.set_option("contempt", contempt)
+    # keep the engine's per move report out of the table
+    with contextlib.redirect_stdout(io.StringIO()):
+        while not board.is_game_over(claim_draw=True) and board.ply() < MAX_PLIES:
+            board.push(engine.mini_max_move(board))
+    if board.is_checkmate():
+        return "mate", board.ply()
+    if board.can_claim_threefold_repetition():
+        return "repetition", board.ply()
+    if board.can_claim_fifty_moves():
+        return "fifty moves", board.ply()
+    outcome = board.outcome()
+    return (outcome.termination.name.lower() if outcome else "unfinished"), board.ply()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that won endgames are converted")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--contempt", type=float, default=0.0)
+    args = parser.parse_args()
+
+    converted = 0
+    for name, fen in ENDGAMES:
+        result, plies = play(fen, args.depth, args.contempt)
+        converted += result == "mate"
+        print("%-14s %-12s after %d plies" % (name, result, plies))
+    print("\n%d of %d endgames converted" % (converted, len(ENDGAMES)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+# Chess Program
+#
+# Generates training data: plays MoveGenerator vs MoveGenerator games in a pool of worker
+# processes and appends every searched position (board, side to move, search score, best
+# move, game result) to a binary file in the format of ChessHelpers/ChessTrainingData.py,
+# which can be read back as a memory mapped numpy array:
+#
+# > python selfplay.py selfplay.data --games 1000 --workers 4 --depth 3
+# > python -c "from ChessHelpers.ChessTrainingData import load_records; print(load_records('selfplay.data')[:5])"
+#
+# Every game starts with --random-plies random moves, so the games (and positions) differ
+# even though the engine itself is deterministic. The positions of the random opening are
+# not recorded. Games that reach --max-plies are adjudicated as draws.
+#
+# The file is only appended to, so a stopped run can simply be started again to add more
+# games. Throughput is reported as positions per hour per core.
+
+import os
+import sys
+import random
+import argparse
+import concurrent.futures
+from time import perf_counter
+
+import chess
+from ChessHelpers.ChessEngineHelper import MoveGenerator
+from ChessHelpers.ChessTrainingData import TrainingDataWriter, pack_record, with_result, RESULTS
+
+REPORT_EVERY = 10.0  # seconds
+
+_generator = None
+
+
+def init_worker(level, depth):
+    global _generator
+    _generator = MoveGenerator(level)
+    _generator.DEPTH = depth
+    _generator.TIME_LIMIT = None
+    _generator.NODE_LIMIT = None
+
+
+def random_opening(rng, plies):
+    # random legal moves, again from the start if the game ends on the way
+    while True:
+        board = chess.Board()
+        for _ in range(plies):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+        if not board.is_game_over():
+            return board
+
+
+def play_game(seed, random_plies, max_plies):
+    """ Runs in a worker: returns (packed records, result, busy seconds) """
+    start = perf_counter()
+    board = random_opening(random.Random(seed), random_plies)
+    _generator.new_game()
+    records = []
+    while not board.is_game_over(claim_draw=True) and board.ply() < max_plies:
+        lines = _generator.analyze(board, 1, depth=_generator.DEPTH)
+        records.append(pack_record(board, lines[0].score, lines[0].move))
+        board.push(lines[0].move)
+    outcome = board.outcome(claim_draw=True)
+    result = outcome.result() if outcome else "1/2-1/2"
+    records = [with_result(record, RESULTS[result]) for record in records]
+    return records, result, perf_counter() - start
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Write self-play training positions")
+    parser.add_argument("output", help="training data file, appended to if it exists")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--level", default="medium", help="difficulty level for the heuristic")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--random-plies", type=int, default=8, help="random opening moves")
+    parser.add_argument("--max-plies", type=int, default=300, help="longer games are drawn")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the first game (default: random)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    seed = args.seed if args.seed is not None else random.randrange(1 << 30)
+    writer = TrainingDataWriter(args.output)
+    counts = {"games": 0, "positions": 0, "busy": 0.0, "1-0": 0, "0-1": 0, "1/2-1/2": 0}
+    start = last_report = perf_counter()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                                initargs=(args.level, args.depth)) as pool:
+        futures = [pool.submit(play_game, seed + i, args.random_plies, args.max_plies)
+                   for i in range(args.games)]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                records, result, busy = future.result()
+                writer.append_game(records)
+                counts["games"] += 1
+                counts["positions"] += len(records)
+                counts["busy"] += busy
+                counts[result] += 1
+                now = perf_counter()
+                if now - last_report > REPORT_EVERY:
+                    last_report = now
+                    report(counts, now - start, args.workers)
+        except KeyboardInterrupt:
+            # keep the finished games
+            for future in futures:
+                future.cancel()
+            print("interrupted", file=sys.stderr)
+        finally:
+            writer.close()
+
+    report(counts, perf_counter() - start, args.workers)
+    print("%s now holds %d positions" % (args.output, writer.records), file=sys.stderr)
+
+
+def report(counts, elapsed, workers):
+    print("%d games (+%d =%d -%d), %d positions, %.0f positions/hour per core, worker utilization %.0f%%" %
+          (counts["games"], counts["1-0"], counts["1/2-1/2"], counts["0-1"], counts["positions"],
+           counts["positions"] * 3600 / max(elapsed * workers, 1e-9),
+           100 * counts["busy"] / max(elapsed * workers, 1e-9)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
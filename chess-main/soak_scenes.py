@@ -0,0 +1,98 @@
+# Chess Program
+#
+# Soak test for the GUI scene manager: plays many engine vs engine games
+# through the real scenes (menu -> game -> game over -> replay / menu) with no
+# window, and checks that memory stays flat instead of growing with every replay.
+#
+# > python soak_scenes.py [replays]
+#
+# The memory after the first CHECK_EVERY replays (the warm up) is the baseline, so at
+# least twice as many replays are needed to see whether memory grows. The default 50
+# replays take about 3 minutes.
+
+import os
+import sys
+import gc
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # no window needed
+
+import pygame
+from ChessHelpers import ChessEngineHelper
+from interface import gui
+
+CHECK_EVERY = 25
+MAX_GROWTH = 512 * 1024  # bytes of python memory allowed to accumulate after warm up
+
+
+def click(button):
+    return [pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=button.rect.center)]
+
+
+def rss():
+    # resident memory of this process in bytes (Linux only, 0 elsewhere)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def stack_depth():
+    frame = sys._getframe()
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+def play_until_game_over(app):
+    if isinstance(app.scene, gui.MatchScene):
+        # engine vs engine games are played on a worker, don't wait between the moves
+        app.scene.match.set_fast(True)
+    while not isinstance(app.scene, gui.GameOverScene):
+        if not app.step(pygame.event.get()):
+            raise RuntimeError("app closed unexpectedly")
+
+
+def main():
+    replays = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    warm_up = min(CHECK_EVERY, replays)
+    generator = ChessEngineHelper.MoveGenerator()
+    app = gui.App(white=generator.random_move, black=generator.random_move)
+
+    tracemalloc.start()
+    app.step(click(app.scene.play_button))
+    baseline = None
+    for i in range(1, replays + 1):
+        play_until_game_over(app)
+        if i % 2:
+            app.step(click(gui.REPLAY_BUTTON))
+        else:
+            # go through the main menu every other game
+            app.step(click(app.scene.back_button))
+            app.step(click(app.scene.play_button))
+
+        if i % CHECK_EVERY == 0 or i == warm_up:
+            gc.collect()
+            current, _ = tracemalloc.get_traced_memory()
+            if i == warm_up:
+                baseline = current  # after warm up (caches filled)
+            # the stack depth must not grow either (no game loop nested in another)
+            print("replay %4d: python memory %8.1f KB (%+.1f KB), rss %6.1f MB, stack depth %d" %
+                  (i, current / 1024, (current - baseline) / 1024, rss() / 2 ** 20, stack_depth()))
+
+    if replays == warm_up:
+        print("OK: %d replays, too few to check the memory growth after warm up" % replays)
+        return
+    gc.collect()
+    growth = tracemalloc.get_traced_memory()[0] - baseline
+    if growth > MAX_GROWTH:
+        print("FAIL: memory grew by %.1f KB over %d replays" % (growth / 1024, replays))
+        sys.exit(1)
+    print("OK: memory flat over %d replays (%+.1f KB)" % (replays, growth / 1024))
+
+
+if __name__ == '__main__':
+    main()
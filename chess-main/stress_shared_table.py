@@ -0,0 +1,113 @@
+# Chess Program
+#
+# Stress test for the shared memory transposition table: several writer processes
+# keep overwriting a deliberately tiny table while reader processes probe it. Every
+# entry is derived from its key, so a reader can tell a correct hit from a corrupted
+# one. A torn write (a reader seeing half of an old entry and half of a new one) must
+# always be rejected by the XOR check and never returned as a hit.
+#
+# > python stress_shared_table.py [seconds] [writers] [readers]
+#
+
+import sys
+import random
+import multiprocessing
+from time import perf_counter
+
+import chess
+from ChessHelpers.ChessSharedTable import SharedTranspositionTable, decode_move, encode_move
+
+TABLE_SIZE = 256  # small, so writers collide on the same slots all the time
+KEYS = 4096
+SEED = 1
+
+
+def key_pool():
+    rng = random.Random(SEED)
+    return [rng.getrandbits(64) | 1 for _ in range(KEYS)]
+
+
+# the entry every writer stores for a key: (depth, flag, score, move)
+def expected(key):
+    from_square, to_square = key >> 32 & 63, key >> 38 & 63
+    move = chess.Move(from_square, to_square) if from_square != to_square else None
+    return key % 100, key >> 8 & 3, float(key >> 16 & 0xFFF), decode_move(encode_move(move))
+
+
+def writer(name, seconds, seed):
+    table = SharedTranspositionTable(name=name)
+    keys = key_pool()
+    rng = random.Random(seed)
+    stores = 0
+    end = perf_counter() + seconds
+    while perf_counter() < end:
+        for _ in range(1000):
+            key = rng.choice(keys)
+            depth, flag, score, move = expected(key)
+            table.store(key, depth, flag, score, move)
+        stores += 1000
+        if rng.random() < 0.01:
+            table.new_search()  # mix generations so replacement by age is exercised too
+    table.close()
+    return stores
+
+
+def reader(name, seconds, seed):
+    table = SharedTranspositionTable(name=name)
+    keys = key_pool()
+    known = set(keys)
+    rng = random.Random(seed)
+    counts = {"probes": 0, "hits": 0, "corrupt": 0, "torn": 0}
+    end = perf_counter() + seconds
+    while perf_counter() < end:
+        for _ in range(1000):
+            key = rng.choice(keys)
+            entry = table.probe(key)
+            if entry is not None:
+                counts["hits"] += 1
+                if entry != expected(key):
+                    counts["corrupt"] += 1
+
+            # look at a raw slot: both words must belong to one stored key (or be empty),
+            # anything else is a torn write caught in the middle
+            index = (rng.randrange(table.size) + 1) * 2
+            first, data = table.words[index], table.words[index + 1]
+            if data and first ^ data not in known:
+                counts["torn"] += 1
+        counts["probes"] += 1000
+    table.close()
+    return counts
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    writers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    readers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+    table = SharedTranspositionTable(create=True, size=TABLE_SIZE)
+    try:
+        with multiprocessing.Pool(writers + readers) as pool:
+            stores = [pool.apply_async(writer, (table.name, seconds, i)) for i in range(writers)]
+            probes = [pool.apply_async(reader, (table.name, seconds, 1000 + i)) for i in range(readers)]
+            stores = sum(result.get() for result in stores)
+            totals = {"probes": 0, "hits": 0, "corrupt": 0, "torn": 0}
+            for result in probes:
+                for name, count in result.get().items():
+                    totals[name] += count
+    finally:
+        table.close()
+
+    print("%d writers, %d readers, %.0f s" % (writers, readers, seconds))
+    print("stores      %10d" % stores)
+    print("probes      %10d" % totals["probes"])
+    print("hits        %10d  (%.1f%%)" % (totals["hits"], 100 * totals["hits"] / max(1, totals["probes"])))
+    print("torn slots  %10d  seen in the middle of a write, rejected by the XOR check" % totals["torn"])
+    print("corrupt     %10d" % totals["corrupt"])
+    if totals["corrupt"]:
+        print("FAIL: a probe returned an entry that does not belong to its key")
+        sys.exit(1)
+    print("OK: no corrupt entries returned")
+
+
+if __name__ == '__main__':
+    main()
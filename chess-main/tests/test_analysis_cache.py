@@ -0,0 +1,46 @@
+# Analysis cache tests
+#
+# > python -m pytest -q tests
+
+import chess
+import chess.polyglot
+from ChessHelpers.ChessAnalysisCache import AnalysisCache, HEADER, RECORD, BUCKET_SIZE
+from ChessHelpers.ChessEngineHelper import MoveGenerator
+
+
+def test_store_and_probe(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "analysis.cache"), records=64)
+    move = chess.Move.from_uci("g1f3")
+    cache.store(12345, 6, 0.35, move)
+    assert cache.probe(12345) == (6, 0.35, move)
+    assert cache.probe(54321) is None
+    cache.close()
+
+
+def test_torn_record_is_a_miss(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "analysis.cache"), records=64)
+    buckets = 64 // BUCKET_SIZE
+    # two positions in the same bucket, then the data word of the first one is overwritten
+    # by the second one's, as if a reader saw only half of a write
+    first, second = 7, 7 + buckets
+    cache.store(first, 5, 1.5, chess.Move.from_uci("e2e4"))
+    cache.store(second, 9, -3.25, chess.Move.from_uci("d2d4"))
+    slot = HEADER.size + (first % buckets) * BUCKET_SIZE * RECORD.size
+    checked, _ = RECORD.unpack_from(cache.map, slot)
+    _, data = RECORD.unpack_from(cache.map, slot + RECORD.size)
+    RECORD.pack_into(cache.map, slot, checked, data)
+    assert cache.probe(first) is None
+    assert cache.probe(second) == (9, -3.25, chess.Move.from_uci("d2d4"))
+    cache.close()
+
+
+def test_cache_hit_is_quiet(tmp_path, capsys):
+    cache = AnalysisCache(str(tmp_path / "analysis.cache"), records=64, min_depth=1)
+    board = chess.Board()
+    cache.store(chess.polyglot.zobrist_hash(board), 3, 0.5, chess.Move.from_uci("b1c3"))
+    generator = MoveGenerator(cache=cache)
+    generator.DEPTH = 2
+    assert generator.mini_max_move(board) == chess.Move.from_uci("b1c3")
+    assert capsys.readouterr().out == ""
+    assert generator.stats["cached"] and generator.stats["depth"] == 3
+    cache.close()
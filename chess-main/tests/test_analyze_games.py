@@ -0,0 +1,50 @@
+# Bulk analysis tests
+#
+# > python -m pytest -q tests
+
+import io
+import re
+
+import chess
+import chess.engine
+import chess.pgn
+
+import analyze_games
+
+SCHOLARS_MATE = "1. e4 e5 2. Bc4 Nc6 3. Qh5 Nf6 4. Qxf7# 1-0"
+
+
+def annotate(movetext, depth=2):
+    analyze_games.init_worker("medium", depth, None)
+    (headers, positions, pgn_game), _ = next(analyze_games.read_pgn(io.StringIO(movetext)))
+    results = [analyze_games.evaluate_position(fen) for fen, _ in positions]
+    out = io.StringIO()
+    analyze_games.write_pgn(out, (headers, positions, pgn_game), results)
+    return chess.pgn.read_game(io.StringIO(out.getvalue())), results
+
+
+def test_pgn_eval_is_of_the_position_after_the_move():
+    game, results = annotate(SCHOLARS_MATE)
+    nodes = [game] + list(game.mainline())
+    # one evaluation per position: the start, after every move and the final (mate) position
+    assert len(results) == len(nodes)
+    for node, (score, _, _, _, _) in zip(nodes, results):
+        assert node.eval() is not None, node
+        mate = analyze_games.mate_in(score)
+        if node.is_end():
+            # black to move is mated
+            assert node.eval().relative == chess.engine.Mate(0)
+        elif mate is not None:
+            assert node.eval().white().mate() == mate, node
+        else:
+            assert node.eval().white().score() == round(score * 100), node
+
+
+def test_pgn_best_is_the_engine_move_before_the_move_played():
+    game, results = annotate(SCHOLARS_MATE)
+    for before, node in zip(results, game.mainline()):
+        best = re.search(r"best (\S+)", node.comment)
+        if before[1] == node.move.uci():
+            assert best is None, node
+        else:
+            assert best is not None and best.group(1) == before[1], node
@@ -0,0 +1,47 @@
+# Chess Heuristics tests
+#
+# > python -m pytest -q tests
+
+import random
+
+import chess
+from ChessHelpers.ChessHeuristics import Heuristics
+
+
+# positions from random games (with a fixed seed), checkmates and stalemates included
+def random_positions(games=20, plies=80, seed=1):
+    rng = random.Random(seed)
+    positions = []
+    for _ in range(games):
+        board = chess.Board()
+        for _ in range(plies):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+            positions.append(board.copy(stack=False))
+    return positions
+
+
+def test_heuristic_2_is_antisymmetric():
+    # the search scores every leaf for the side to move, so a position must score
+    # exactly the negative for the other side
+    heuristics = Heuristics()
+    board = chess.Board()
+    board.push_san("Nf3")
+    positions = [chess.Board(), board] + random_positions()
+    for board in positions:
+        for white in (True, False):
+            assert heuristics.heuristic_2(board, white) == -heuristics.heuristic_2(board, not white), board.fen()
+
+
+def test_features_match_heuristic_2():
+    # tune_weights.py fits the weights to the features, they must add up to the heuristic
+    heuristics = Heuristics()
+    for board in random_positions(games=5):
+        if board.is_game_over():
+            continue
+        for white in (True, False):
+            score = sum(weight * feature for weight, feature in
+                        zip(heuristics.weight_vector(), heuristics.features(board, white)))
+            assert abs(score - heuristics.heuristic_2(board, white)) < 1e-9, board.fen()
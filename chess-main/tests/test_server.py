@@ -0,0 +1,66 @@
+# Chess Server tests
+#
+# > python -m pytest -q tests
+
+import asyncio
+import os
+
+from ChessHelpers import ChessServer
+from ChessHelpers.ChessServer import GameServer, MAX_ATTEMPTS
+
+
+# stand-ins for search_worker (module level, so the worker processes can run them)
+def failing_search(*args):
+    raise RuntimeError("search failed")
+
+
+def dying_search(*args):
+    os._exit(1)
+
+
+# starts a server with a game where the bot (white) is to move, returns the events
+# until the first one of `last` and whether the server still holds the game
+async def engine_events(last=("move",), **options):
+    server = GameServer(workers=1, **options)
+    await server.start()
+    events = asyncio.Queue()
+    received = []
+    try:
+        session = await server.new_game(events.put, engine="white")
+        while not received or received[-1]["event"] not in last:
+            received.append(await asyncio.wait_for(events.get(), timeout=30))
+        return received, session.game_id in server.games
+    finally:
+        await server.stop()
+
+
+async def first_engine_move(**options):
+    events, _ = await engine_events(**options)
+    return events[-1]
+
+
+def test_untimed_game_searches_for_the_move_budget():
+    # without a level the worker's depth is not capped, the budget limits the search
+    event = asyncio.run(first_engine_move(default_budget=0.5, shared_table=False))
+    assert event["event"] == "move", event
+    assert event["depth"] > 1
+
+
+def test_failed_searches_are_retried_then_the_game_is_aborted(monkeypatch):
+    monkeypatch.setattr(ChessServer, "search_worker", failing_search)
+    events, open_game = asyncio.run(engine_events(last=("move", "aborted"), shared_table=False))
+    assert [event["event"] for event in events] == ["created"] + ["error"] * MAX_ATTEMPTS + ["aborted"]
+    assert not open_game
+
+
+def test_dead_worker_gets_a_new_pool(monkeypatch):
+    monkeypatch.setattr(ChessServer, "search_worker", dying_search)
+    pools = []
+    new_pool = GameServer._new_pool
+    monkeypatch.setattr(GameServer, "_new_pool", lambda server: pools.append(new_pool(server)) or pools[-1])
+    events, open_game = asyncio.run(engine_events(last=("move", "aborted"), shared_table=False))
+    # every search ran (and died) on a fresh pool instead of failing on the broken one
+    assert [event["attempt"] for event in events if event["event"] == "error"] == list(range(1, MAX_ATTEMPTS + 1))
+    assert len(pools) == 1 + MAX_ATTEMPTS
+    assert events[-1]["event"] == "aborted"
+    assert not open_game
@@ -0,0 +1,27 @@
+# Transposition table tests
+#
+# > python -m pytest -q tests
+
+import chess
+from ChessHelpers.ChessSharedTable import SharedTranspositionTable
+from ChessHelpers.ChessTranspositionTable import TranspositionTable, LOWER_BOUND
+
+SCORES = [0, 0.5, -0.25, 0.6 + 0.25 * 3, 39.85, -12.35, 3 / 5 * 7 + 1 / 4, 1000 - 7, -(1000 - 12), 1000 + 40]
+
+
+def test_shared_and_local_tables_return_the_same_scores():
+    local = TranspositionTable(size=64)
+    shared = SharedTranspositionTable(size=64, create=True)
+    try:
+        move = chess.Move.from_uci("e7e8q")
+        for i, score in enumerate(SCORES):
+            key = (i + 1) * 0x9E3779B97F4A7C15 & (1 << 64) - 1
+            for table in (local, shared):
+                table.new_search()
+                table.store(key, 5, LOWER_BOUND, score, move)
+            depth, flag, stored, stored_move = local.probe(key)
+            assert shared.probe(key) == (depth, flag, stored, stored_move) == (5, LOWER_BOUND, stored, move)
+            # rounded to centipawns
+            assert abs(stored - score) <= 0.005
+    finally:
+        shared.close()
@@ -0,0 +1,201 @@
+# Chess Program
+#
+# Tunes the weights of heuristic #2 (see ChessHelpers/ChessHeuristics.py) on game results,
+# "Texel style": the evaluation of a position, squashed by a sigmoid, should predict the
+# result of the game it was played in. Needs numpy:
+#
+# > pip install numpy
+# > python tune_weights.py games.pgn [more.pgn positions.epd ...] [--out weights.json]
+#
+# 1. The positions are streamed from the files and turned into feature rows (the terms
+#    of heuristic #2 for the side to move) plus the result for the side to move, written
+#    to a flat float32 file next to the first input (<input>.features). Later runs reuse it.
+#    EPD positions need their result as an operation, e.g. c9 "1-0".
+# 2. The feature file is memory mapped and read in batches, so it can be larger than RAM.
+#    Every 10th position is kept aside for validation.
+# 3. The weights are fitted with mini-batch gradient descent (Adam) on the logistic loss,
+#    starting from the hand-picked weights, and written to ChessHelpers/heuristic_weights.json,
+#    which Heuristics loads at startup.
+
+import os
+import sys
+import argparse
+from time import perf_counter
+
+import numpy as np
+import chess
+import chess.pgn
+from ChessHelpers.ChessHeuristics import Heuristics, FEATURES, DEFAULT_WEIGHTS
+
+COLUMNS = len(FEATURES) + 1  # features, then the result for the side to move
+SKIP_PLIES = 8  # opening moves say little about the result
+CHUNK = 65536  # rows written at once while extracting
+VALIDATION_EVERY = 10
+RESULTS = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}
+
+
+'''
+Feature extraction
+'''
+
+
+# yields (board, result for white) for the positions of every game
+def positions_from_pgn(handle):
+    while True:
+        game = chess.pgn.read_game(handle)
+        if game is None:
+            return
+        result = RESULTS.get(game.headers.get("Result"))
+        if result is None:
+            continue
+        board = game.board()
+        for ply, move in enumerate(game.mainline_moves()):
+            if ply >= SKIP_PLIES:
+                yield board, result
+            board.push(move)
+
+
+def positions_from_epd(handle):
+    for line in handle:
+        line = line.strip()
+        if not line:
+            continue
+        board, operations = chess.Board.from_epd(line)
+        result = RESULTS.get(operations.get("c9"))
+        if result is not None:
+            yield board, result
+
+
+def extract(paths, features_path, heuristics):
+    start = perf_counter()
+    count = 0
+    rows = []
+    with open(features_path + ".tmp", "wb") as out:
+        for path in paths:
+            with open(path, encoding="utf-8-sig", errors="replace") as handle:
+                positions = positions_from_epd(handle) if path.lower().endswith(".epd") else positions_from_pgn(handle)
+                for board, result in positions:
+                    # quiet positions only: in check the static evaluation means little
+                    if board.is_check():
+                        continue
+                    white = board.turn == chess.WHITE
+                    rows.append(heuristics.features(board, white) + [result if white else 1 - result])
+                    if len(rows) == CHUNK:
+                        np.asarray(rows, dtype=np.float32).tofile(out)
+                        count += len(rows)
+                        rows = []
+                        print("%d positions, %.0f positions/s" % (count, count / (perf_counter() - start)))
+        if rows:
+            np.asarray(rows, dtype=np.float32).tofile(out)
+            count += len(rows)
+    os.replace(features_path + ".tmp", features_path)
+    elapsed = perf_counter() - start
+    print("extracted %d positions in %.1fs, %.0f positions/s" % (count, elapsed, count / max(elapsed, 1e-9)))
+
+
+'''
+Fitting
+'''
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+# batches of (features, results) from the memory mapped file, training or validation rows
+def batches(data, batch_size, validation):
+    for start in range(0, len(data), batch_size):
+        block = np.asarray(data[start:start + batch_size])
+        index = np.arange(start, start + len(block))
+        keep = (index % VALIDATION_EVERY == 0) == validation
+        yield block[keep, :-1], block[keep, -1]
+
+
+# mean logistic loss and squared error of the predictions
+def evaluate(data, weights, scale, batch_size, validation=True):
+    loss = error = 0.0
+    count = 0
+    for x, y in batches(data, batch_size, validation):
+        p = np.clip(sigmoid(scale * (x @ weights)), 1e-7, 1 - 1e-7)
+        loss += -np.sum(y * np.log(p) + (1 - y) * np.log(1 - p))
+        error += np.sum((p - y) ** 2)
+        count += len(y)
+    return loss / max(count, 1), error / max(count, 1)
+
+
+# the sigmoid scale which fits the current weights best: the weights are in "pawns",
+# the scale turns them into win probabilities and stays fixed while the weights move
+def fit_scale(data, weights, batch_size):
+    best = None
+    for scale in np.geomspace(0.01, 10, 61):
+        loss, _ = evaluate(data, weights, scale, batch_size, validation=False)
+        if best is None or loss < best[0]:
+            best = (loss, scale)
+    return best[1]
+
+
+def fit(data, weights, scale, epochs, batch_size, rate):
+    # Adam
+    m = np.zeros_like(weights)
+    v = np.zeros_like(weights)
+    step = 0
+    for epoch in range(epochs):
+        start = perf_counter()
+        for x, y in batches(data, batch_size, validation=False):
+            if not len(y):
+                continue
+            p = sigmoid(scale * (x @ weights))
+            gradient = scale * (x.T @ (p - y)) / len(y)
+            step += 1
+            m = 0.9 * m + 0.1 * gradient
+            v = 0.999 * v + 0.001 * gradient ** 2
+            weights = weights - rate * (m / (1 - 0.9 ** step)) / (np.sqrt(v / (1 - 0.999 ** step)) + 1e-8)
+        loss, error = evaluate(data, weights, scale, batch_size)
+        print("epoch %3d: validation loss %.5f, error %.5f (%.1fs)" % (epoch + 1, loss, error, perf_counter() - start))
+    return weights
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tune the heuristic weights on game results")
+    parser.add_argument("inputs", nargs="+", help="PGN files, or EPD files with c9 result operations")
+    parser.add_argument("--out", default=DEFAULT_WEIGHTS, help="weights file to write")
+    parser.add_argument("--features", help="feature file (default: <first input>.features)")
+    parser.add_argument("--extract", action="store_true", help="extract the features again")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=1 << 16)
+    parser.add_argument("--rate", type=float, default=0.05)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # start from the hand-picked weights, not from a previous tuning run
+    heuristics = Heuristics(defaults=True)
+    features_path = args.features or args.inputs[0] + ".features"
+    if args.extract or not os.path.exists(features_path):
+        extract(args.inputs, features_path, heuristics)
+
+    data = np.memmap(features_path, dtype=np.float32, mode="r")
+    data = data.reshape(-1, COLUMNS)
+    if len(data) < VALIDATION_EVERY:
+        sys.exit("not enough positions to tune on")
+    print("%d positions (%d for validation)" % (len(data), (len(data) + VALIDATION_EVERY - 1) // VALIDATION_EVERY))
+
+    weights = np.asarray(heuristics.weight_vector(), dtype=np.float64)
+    scale = fit_scale(data, weights, args.batch)
+    before = evaluate(data, weights, scale, args.batch)
+    print("sigmoid scale %.3f, validation loss %.5f, error %.5f before tuning" % (scale, before[0], before[1]))
+
+    weights = fit(data, weights, scale, args.epochs, args.batch, args.rate)
+    after = evaluate(data, weights, scale, args.batch)
+    print("validation loss %.5f -> %.5f, error %.5f -> %.5f" % (before[0], after[0], before[1], after[1]))
+    for name, old, new in zip(FEATURES, heuristics.weight_vector(), weights):
+        print("  %-18s %7.3f -> %7.3f" % (name, old, new))
+
+    heuristics.set_weight_vector(weights)
+    heuristics.save_weights(args.out)
+    print("weights written to %s" % args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# Chess Program
+#
+# Plays a tournament of bot games in worker processes and shows all of them at once in
+# the terminal with the curses spectator (interface/tui.py), for watching engine games on
+# a server without a display:
+#
+# > python watch_games.py [--games 24] [--workers 4] [--white medium] [--black easy]
+#
+# Every game starts with a few random moves, so the games differ. The workers send a
+# message for every move (with the depth, nodes per second and evaluation of the search)
+# through a queue, and the spectator draws whatever changed. Games waiting for a free
+# worker are shown as empty boards. Press q to stop watching (and playing).
+
+import os
+import sys
+import random
+import argparse
+import multiprocessing
+import concurrent.futures
+from time import perf_counter
+
+import chess
+from ChessHelpers.ChessEngineHelper import MoveGenerator
+from ChessHelpers.ChessLevels import LEVELS
+from interface.tui import spectate
+
+MAX_PLIES = 300
+
+
+def init_worker():
+    # anything printed by a worker would end up in the middle of the curses screen
+    sys.stdout = open(os.devnull, "w")
+
+
+def opening(seed, plies):
+    rng = random.Random(seed)
+    board = chess.Board()
+    while True:
+        board.reset()
+        for _ in range(plies):
+            board.push(rng.choice(list(board.legal_moves)))
+            if board.is_game_over():
+                break
+        if not board.is_game_over():
+            return board
+
+
+def play_watched_game(game_id, fen, white, black, messages, stop):
+    """ Runs in a worker: plays a game and reports every move to the spectator """
+    board = chess.Board(fen)
+    engines = {chess.WHITE: MoveGenerator(white), chess.BLACK: MoveGenerator(black)}
+    while not board.is_game_over(claim_draw=True) and board.ply() < MAX_PLIES:
+        if stop.is_set():
+            return None
+        engine = engines[board.turn]
+        start = perf_counter()
+        lines = engine.analyze(board, 1, depth=engine.DEPTH, time=engine.TIME_LIMIT, nodes=engine.NODE_LIMIT)
+        elapsed = perf_counter() - start
+        line = lines[0]
+        white_score = line.score if board.turn == chess.WHITE else -line.score
+        messages.put(("move", game_id, line.move.uci(), {
+            "depth": line.depth, "nps": engine.stats["nodes"] / max(elapsed, 1e-9), "score": white_score}))
+        board.push(line.move)
+    outcome = board.outcome(claim_draw=True)
+    result = outcome.result() if outcome else "1/2-1/2"
+    reason = outcome.termination.name.lower().replace("_", " ") if outcome else "adjudicated"
+    messages.put(("end", game_id, result, reason))
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Watch many bot games at once in the terminal")
+    parser.add_argument("--games", type=int, default=24)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--white", default="medium", choices=sorted(LEVELS))
+    parser.add_argument("--black", default="medium", choices=sorted(LEVELS))
+    parser.add_argument("--random-plies", type=int, default=6, help="random opening moves")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    seed = args.seed if args.seed is not None else random.randrange(1 << 30)
+    manager = multiprocessing.Manager()
+    messages = manager.Queue()
+    stop = manager.Event()
+    pool = concurrent.futures.ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker)
+    futures = []
+    for game_id in range(1, args.games + 1):
+        fen = opening(seed + game_id, args.random_plies).fen()
+        # the spectator shows every game from the start, even before a worker picks it up
+        messages.put(("start", game_id, args.white, args.black, fen))
+        futures.append(pool.submit(play_watched_game, game_id, fen, args.white, args.black, messages, stop))
+
+    try:
+        spectate(messages)
+    finally:
+        # stop playing when the spectator is closed: the running games end after their
+        # current move, the others never start
+        stop.set()
+        pool.shutdown(cancel_futures=True)
+        manager.shutdown()
+
+    results = [future.result() for future in futures if not future.cancelled() and future.result() is not None]
+    print("%d of %d games finished: +%d =%d -%d" % (
+        len(results), args.games, results.count("1-0"), results.count("1/2-1/2"), results.count("0-1")))
+
+
+if __name__ == '__main__':
+    main()